@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for contract rendering (Jinja) and PDF generation (ReportLab)
+
+Usage:
+    python benchmark_contracts.py --save benchmark_baseline.json
+    python benchmark_contracts.py --baseline benchmark_baseline.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+CLAUSE_COUNTS = [0, 10, 100, 1000]
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 20.0  # percent slower than baseline that counts as a regression
+DEFAULT_MIN_DELTA_MS = 1.0  # ignore timer noise on sub-millisecond renders
+
+
+def make_synthetic_contract(clause_count, with_risk_assessment=True):
+    """Build contract_data with `clause_count` selected clauses drawn from the clause library"""
+    from bulk_contract_generator import parse_booking_row
+    from enhanced_yacht_generator_v3_fixed import build_contract_data, get_clause_database
+
+    library = [dict(clause, category=category)
+               for category, clauses in get_clause_database().items()
+               for clause in clauses]
+    selected_clauses = [
+        dict(clause, name=f"{clause['name']} #{i + 1}")
+        for i, clause in zip(range(clause_count), itertools.cycle(library))
+    ]
+
+    inputs, _ = parse_booking_row({
+        'contract_id': f"BENCH{clause_count:04d}",
+        'start_date': '2025-08-01',
+        'end_date': '2025-08-15',
+        'agreement_date': '2025-07-01',
+        'risk_factors': 'High Season Charter;Remote Destinations',
+        'special_requests': 'Private chef for dietary restrictions\nHelicopter landing capability',
+    })
+    contract_data = build_contract_data(inputs, selected_clauses=selected_clauses)
+    if not with_risk_assessment:
+        contract_data['risk_assessment'] = None
+    return contract_data
+
+
+def time_call(func, repeat):
+    """Median and minimum wall time of `repeat` calls, in milliseconds"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': statistics.median(timings), 'min_ms': min(timings)}, result
+
+
+def peak_memory_kb(func):
+    """Peak traced memory of a single call, in KB (measured separately from timing)"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(clause_count, with_risk_assessment, repeat):
+    """Benchmark Jinja rendering and PDF generation for one synthetic contract size"""
+    from enhanced_yacht_generator_v3_fixed import get_contract_template, generate_pdf_bytes
+
+    contract_data = make_synthetic_contract(clause_count, with_risk_assessment)
+    template = get_contract_template()
+
+    def render():
+        return template.render(**contract_data)
+
+    render_time, contract_html = time_call(render, repeat)
+
+    def build_pdf():
+        # generate_pdf_bytes is the in-memory core of generate_pdf_contract; its progress prints are muted
+        with contextlib.redirect_stdout(io.StringIO()):
+            return generate_pdf_bytes(contract_html, contract_data)
+
+    pdf_time, pdf_bytes = time_call(build_pdf, repeat)
+
+    return {
+        'case': f"clauses={clause_count},risk={'yes' if with_risk_assessment else 'no'}",
+        'clauses': clause_count,
+        'risk_assessment': with_risk_assessment,
+        'render': dict(render_time, peak_kb=peak_memory_kb(render)),
+        'pdf': dict(pdf_time, peak_kb=peak_memory_kb(build_pdf)),
+        'html_kb': len(contract_html.encode('utf-8')) / 1024,
+        'pdf_kb': len(pdf_bytes) / 1024,
+    }
+
+
+def run_benchmarks(clause_counts=CLAUSE_COUNTS, repeat=DEFAULT_REPEAT):
+    """Run every size with and without risk assessment and return the result document"""
+    results = []
+    for clause_count in clause_counts:
+        for with_risk_assessment in (True, False):
+            result = run_case(clause_count, with_risk_assessment, repeat)
+            results.append(result)
+            print(f"  {result['case']:<24} render {result['render']['median_ms']:8.2f} ms "
+                  f"({result['render']['peak_kb']:8.1f} KB) | pdf {result['pdf']['median_ms']:9.2f} ms "
+                  f"({result['pdf']['peak_kb']:9.1f} KB)")
+    return {
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_to_baseline(current, baseline, threshold=DEFAULT_THRESHOLD, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """Return regressions where a median time grew more than `threshold` percent (and `min_delta_ms`) over the baseline"""
+    baseline_cases = {result['case']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_cases.get(result['case'])
+        if not previous:
+            continue
+        for phase in ('render', 'pdf'):
+            before = previous[phase]['median_ms']
+            after = result[phase]['median_ms']
+            change = ((after - before) / before * 100) if before else 0.0
+            if change > threshold and after - before > min_delta_ms:
+                regressions.append({'case': result['case'], 'phase': phase,
+                                    'baseline_ms': before, 'current_ms': after, 'change_pct': change})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark contract rendering and PDF generation")
+    parser.add_argument("--sizes", type=int, nargs="+", default=CLAUSE_COUNTS, help="Selected clause counts to benchmark")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per case (median is reported)")
+    parser.add_argument("--save", help="Write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--baseline", help="Compare against a previously saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Regression threshold in percent")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    print("⏱️ Contract Rendering Benchmarks")
+    print("=" * 60)
+    current = run_benchmarks(args.sizes, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"\n💾 Results saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(current, baseline, args.threshold, args.min_delta_ms)
+        print(f"\n📊 Compared with baseline from {baseline.get('generated_at', 'unknown')}")
+        if regressions:
+            for regression in regressions:
+                print(f"❌ {regression['case']} {regression['phase']}: {regression['baseline_ms']:.2f} ms → "
+                      f"{regression['current_ms']:.2f} ms (+{regression['change_pct']:.1f}%)")
+            return 1
+        print(f"✅ No regressions above {args.threshold:.0f}%")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Headless bulk contract generation for booking batches (CSV or JSONL)
+
+Usage:
+    python bulk_contract_generator.py bookings.csv --output-dir contracts_out --workers 4
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Form defaults from the Contract Generator page, used for any column a row leaves out
+DEFAULT_CONTRACT_INPUTS = {
+    'vessel_name': 'M/Y Excellence',
+    'yacht_type': 'Motor Yacht',
+    'length_overall': 45.0,
+    'beam': 8.5,
+    'draft': 2.5,
+    'official_number': 'IMO1234567',
+    'flag_state': 'Marshall Islands',
+    'guest_capacity': 12,
+    'crew_capacity': 8,
+    'engine_power': 2400,
+    'max_speed': 22,
+    'cruising_speed': 16,
+    'start_date': None,
+    'end_date': None,
+    'charter_duration': None,
+    'daily_rate': 15000,
+    'currency': 'EUR',
+    'operational_area': 'Mediterranean Sea - French and Italian Riviera, Monaco, Corsica',
+    'delivery_location': 'Port Hercules, Monaco',
+    'return_location': 'Port Hercules, Monaco',
+    'lessor_name': 'Monaco Elite Charters Ltd.',
+    'lessor_address': '12 Quai Antoine 1er\n98000 Monaco\nPrincipality of Monaco',
+    'lessor_contact': 'Captain Jean-Luc Moreau',
+    'lessor_email': 'charters@monacoelite.mc',
+    'lessor_phone': '+377 93 30 15 15',
+    'lessee_name': 'Mr. & Mrs. Richardson',
+    'lessee_address': '45 Berkeley Square\nLondon W1J 5AT\nUnited Kingdom',
+    'lessee_contact': 'James Richardson',
+    'lessee_email': 'j.richardson@email.com',
+    'lessee_phone': '+44 20 7629 1234',
+    'payment_schedule_1': 50,
+    'payment_timing': 'upon delivery',
+    'security_deposit': 150000,
+    'deposit_method': 'Bank Transfer',
+    'fuel_policy': 'Return Full',
+    'additional_costs': [],
+    'hull_insurance': 25000000,
+    'liability_insurance': 50000000,
+    'risk_factors': [],
+    'charter_experience': 'First Time',
+    'special_requests': '',
+    'governing_law': 'Monaco',
+    'cancellation_policy': 'Standard (90/60/30 days)',
+    'force_majeure': True,
+    'weather_clause': True,
+    'crew_standards': True,
+    'template_name': 'Enhanced Standard',
+    'version_number': '1.0',
+    'agreement_date': None,
+    'broker_info': 'Monaco Yacht Brokers',
+    'broker_commission': 10.0,
+    'contract_language': 'English',
+    'contract_id': None,
+}
+
+FLOAT_FIELDS = {'length_overall', 'beam', 'draft', 'broker_commission'}
+INT_FIELDS = {'guest_capacity', 'crew_capacity', 'engine_power', 'max_speed', 'cruising_speed',
+              'charter_duration', 'daily_rate', 'payment_schedule_1', 'payment_schedule_2',
+              'security_deposit', 'hull_insurance', 'liability_insurance'}
+DATE_FIELDS = {'start_date', 'end_date', 'agreement_date'}
+LIST_FIELDS = {'additional_costs', 'risk_factors'}
+BOOL_FIELDS = {'force_majeure', 'weather_clause', 'crew_standards'}
+
+
+def read_booking_rows(path):
+    """Stream booking rows from a CSV or JSONL file one at a time
+
+    JSONL lines that are not valid JSON are yielded as ValueError instances,
+    so one bad line fails that row instead of the whole run.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield ValueError(f"invalid JSON: {e.msg}")
+        else:
+            for row in csv.DictReader(f):
+                yield row
+
+
+def parse_booking_row(row):
+    """Convert a raw CSV/JSONL row into the input dict expected by build_contract_data"""
+    inputs = dict(DEFAULT_CONTRACT_INPUTS)
+    selected_clauses = []
+
+    for key, value in row.items():
+        if key is None or value is None or value == '':
+            continue
+        if key == 'selected_clauses':
+            selected_clauses = json.loads(value) if isinstance(value, str) else value
+        elif key in FLOAT_FIELDS:
+            inputs[key] = float(value)
+        elif key in INT_FIELDS:
+            inputs[key] = int(float(value))
+        elif key in DATE_FIELDS:
+            inputs[key] = datetime.date.fromisoformat(value) if isinstance(value, str) else value
+        elif key in LIST_FIELDS:
+            inputs[key] = [item.strip() for item in value.split(';') if item.strip()] if isinstance(value, str) else list(value)
+        elif key in BOOL_FIELDS:
+            inputs[key] = value if isinstance(value, bool) else str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+        else:
+            inputs[key] = value
+
+    today = datetime.date.today()
+    inputs['start_date'] = inputs['start_date'] or today
+    inputs['end_date'] = inputs['end_date'] or inputs['start_date']
+    inputs['agreement_date'] = inputs['agreement_date'] or today
+    return inputs, selected_clauses
+
+
+def render_booking(row_number, row, output_dir, track_memory=False):
+    """Render one booking to HTML, PDF and JSON in output_dir (runs inside a worker process)"""
+    from enhanced_yacht_generator_v3_fixed import build_contract_data, render_contract_to_file, generate_pdf_contract
+
+    started = time.perf_counter()
+    try:
+        inputs, selected_clauses = parse_booking_row(row)
+        contract_data = build_contract_data(inputs, selected_clauses=selected_clauses)
+
+        # HTML is streamed straight to disk; the PDF is built from contract_data
+        base_name = f"yacht_contract_{contract_data['contract_id']}"
+        html_stats = render_contract_to_file(contract_data, os.path.join(output_dir, f"{base_name}.html"),
+                                             track_memory=track_memory)
+        generate_pdf_contract(None, os.path.join(output_dir, f"{base_name}.pdf"), contract_data)
+        with open(os.path.join(output_dir, f"contract_data_{contract_data['contract_id']}.json"), 'w', encoding='utf-8') as f:
+            json.dump(contract_data, f, indent=2, default=str)
+
+        return {'row': row_number, 'contract_id': contract_data['contract_id'],
+                'seconds': time.perf_counter() - started, 'error': None,
+                'html_peak_memory_bytes': html_stats['peak_memory_bytes']}
+    except Exception as e:
+        return {'row': row_number, 'contract_id': None,
+                'seconds': time.perf_counter() - started, 'error': str(e),
+                'html_peak_memory_bytes': None}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    index = max(math.ceil(pct / 100 * len(values)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def generate_bulk_contracts(input_path, output_dir, workers=None, max_pending=None, track_memory=False):
+    """Fan booking rows out over a process pool and return a throughput summary"""
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    # Bound the number of in-flight rows so large batches are streamed, not loaded up front
+    max_pending = max_pending or workers * 4
+
+    results = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for row_number, row in enumerate(read_booking_rows(input_path), 1):
+            if isinstance(row, Exception):
+                results.append({'row': row_number, 'contract_id': None, 'seconds': 0.0, 'error': str(row),
+                                'html_peak_memory_bytes': None})
+                continue
+            pending.add(executor.submit(render_booking, row_number, row, output_dir, track_memory))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+        for future in pending:
+            results.append(future.result())
+    elapsed = time.perf_counter() - started
+
+    timings = sorted(r['seconds'] for r in results if not r['error'])
+    failures = [r for r in results if r['error']]
+    peaks = [r['html_peak_memory_bytes'] for r in results if r['html_peak_memory_bytes'] is not None]
+    return {
+        'total_rows': len(results),
+        'generated': len(timings),
+        'failed': len(failures),
+        'failures': sorted(failures, key=lambda r: r['row']),
+        'elapsed_seconds': elapsed,
+        'contracts_per_second': len(timings) / elapsed if elapsed else 0.0,
+        'p50_seconds': statistics.median(timings) if timings else 0.0,
+        'p95_seconds': percentile(timings, 95),
+        'workers': workers,
+        'max_html_peak_memory_bytes': max(peaks) if peaks else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate yacht charter contracts in bulk from CSV or JSONL bookings")
+    parser.add_argument("input", help="Booking batch file (.csv or .jsonl)")
+    parser.add_argument("-o", "--output-dir", default="bulk_contracts", help="Directory for HTML, PDF and JSON output")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--track-memory", action="store_true", help="Report peak memory of each streamed HTML render")
+    args = parser.parse_args(argv)
+
+    summary = generate_bulk_contracts(args.input, args.output_dir, workers=args.workers, track_memory=args.track_memory)
+
+    print("=" * 60)
+    print(f"📄 Contracts generated: {summary['generated']}/{summary['total_rows']} ({summary['workers']} workers)")
+    print(f"⏱️ Elapsed: {summary['elapsed_seconds']:.2f}s | Throughput: {summary['contracts_per_second']:.2f} contracts/sec")
+    print(f"📊 Per contract: p50 {summary['p50_seconds'] * 1000:.1f} ms | p95 {summary['p95_seconds'] * 1000:.1f} ms")
+    if summary['max_html_peak_memory_bytes'] is not None:
+        print(f"🧠 Peak HTML render memory: {summary['max_html_peak_memory_bytes'] / 1024:.1f} KB")
+    for failure in summary['failures']:
+        print(f"❌ Row {failure['row']}: {failure['error']}")
+
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Streaming clause import for vendor clause packs (JSON array, JSONL or CSV)
+
+Rows are parsed one at a time, validated against the clause schema of the
+built-in catalog and written to the clause store in batched transactions.
+
+Usage:
+    python clause_import.py clause_pack.jsonl --batch-size 500
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+
+from clause_store import ClauseStore, clause_doc_id
+
+IMPORT_BATCH_SIZE = 500
+JSON_CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ROWS = 100  # every rejected or updating row is counted; only the first ones are listed
+CSV_FIELD_SIZE_LIMIT = 16 * 1024 * 1024  # clause content can be far longer than the csv module's 128 KB default
+MAX_JSON_ELEMENT_SIZE = CSV_FIELD_SIZE_LIMIT  # larger array elements are treated as malformed, not read on
+
+# Clause schema of the built-in catalog: field -> default for rows that leave it out
+# (name, content and category are required)
+CLAUSE_DEFAULTS = {
+    'version': '1.0',
+    'jurisdiction': ['International'],
+    'language': 'English',
+    'usage_count': 0,
+    'rating': 4.0,
+    'status': 'Active',
+    'complexity': 'Standard',
+    'last_updated': None,  # import date
+    'author': 'Imported',
+    'variables': [],
+    'applicable_to': ['All charter types'],
+    'legal_notes': '',
+    'related_clauses': [],
+    'risk_level': 'Medium',
+}
+REQUIRED_FIELDS = ('name', 'content', 'category')
+LIST_FIELDS = {'jurisdiction', 'variables', 'applicable_to', 'related_clauses'}
+RISK_LEVELS = ('Low', 'Medium', 'High', 'Critical')
+
+JSON_CLAUSES_KEY = re.compile(r'"clauses"\s*:\s*\[')
+
+
+def _may_be_truncated(error, buffer):
+    """Whether a JSON decode error could come from the buffer ending mid-element
+
+    A cut-off element fails either in an unterminated string or within the
+    last token (at most a few characters, e.g. '-Infinity' or a \\uXXXX escape)
+    before the end of the buffer; anything else is malformed JSON.
+    """
+    return error.msg.startswith('Unterminated string') or len(buffer) - error.pos < 10
+
+
+def iter_json_array(stream, chunk_size=JSON_CHUNK_SIZE):
+    """Yield the elements of a JSON array read incrementally from a text stream
+
+    The array may be the whole document or the "clauses" member of an object
+    ({"clauses": [...]}). Only the element being decoded is held in memory
+    beyond the current chunk. More data is read for an element only when its
+    decode error could be caused by the chunk ending mid-element, so a
+    malformed element fails at once rather than after reading the rest of the
+    file; elements over MAX_JSON_ELEMENT_SIZE characters fail as well.
+    """
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size)
+    eof = not buffer
+
+    def fill(position):
+        nonlocal buffer, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        return 0
+
+    # Find the opening bracket of the clause array
+    position = 0
+    while True:
+        stripped = buffer.lstrip()
+        if stripped.startswith('['):
+            position = len(buffer) - len(stripped) + 1
+            break
+        match = JSON_CLAUSES_KEY.search(buffer) if stripped.startswith('{') else None
+        if match:
+            position = match.end()
+            break
+        if eof or (stripped and stripped[0] not in '[{'):
+            raise ValueError('expected a JSON array of clauses or an object with a "clauses" array')
+        fill(0)
+
+    expect_value = True
+    first = True
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n':
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                raise ValueError("unexpected end of JSON data (unterminated array)")
+            position = fill(position)
+            continue
+        if buffer[position] == ']' and (first or not expect_value):
+            return
+        if not expect_value:
+            if buffer[position] != ',':
+                raise ValueError(f"expected ',' or ']' in JSON array, found {buffer[position]!r}")
+            position += 1
+            expect_value = True
+            continue
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if eof or not _may_be_truncated(e, buffer):
+                raise ValueError(f"invalid JSON in clause array: {e.msg}") from None
+            if len(buffer) - position > MAX_JSON_ELEMENT_SIZE:
+                raise ValueError(f"clause array element exceeds {MAX_JSON_ELEMENT_SIZE} characters") from None
+            position = fill(position)
+            continue
+        # A number or literal cut off at the chunk boundary decodes "successfully"; read on to be sure
+        if end == len(buffer) and not eof:
+            position = fill(position)
+            continue
+        yield element
+        position = end
+        expect_value = first = False
+
+
+def read_clause_rows(stream, file_name):
+    """Stream raw clause rows from a text stream; the format follows the file extension (.json, .jsonl/.ndjson, .csv)
+
+    JSONL lines that are not valid JSON and CSV records the csv module cannot
+    read are yielded as ValueError instances, so one bad row rejects that row
+    instead of the whole import.
+    """
+    extension = os.path.splitext(file_name.lower())[1]
+    if extension in ('.jsonl', '.ndjson'):
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield ValueError(f"invalid JSON: {e.msg}")
+    elif extension == '.csv':
+        csv.field_size_limit(max(csv.field_size_limit(), CSV_FIELD_SIZE_LIMIT))
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                row = ValueError(f"invalid CSV: {e}")
+            yield row
+    elif extension == '.json':
+        yield from iter_json_array(stream)
+    else:
+        raise ValueError(f"unsupported clause file type '{extension}' (use .json, .jsonl or .csv)")
+
+
+def validate_clause(row, default_category=None):
+    """Clause dict in the catalog schema for a raw row; raises ValueError naming the first problem
+
+    Empty CSV cells count as missing; list fields accept lists or ';'-separated
+    text. Fields outside the schema are dropped.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("row is not an object")
+    row = {key: value for key, value in row.items() if key is not None and value not in (None, '')}
+    if default_category and 'category' not in row:
+        row['category'] = default_category
+
+    clause = {}
+    for field in REQUIRED_FIELDS:
+        value = row.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"missing {field}")
+        clause[field] = value.strip() if field != 'content' else value
+
+    for field, default in CLAUSE_DEFAULTS.items():
+        value = row.get(field, default)
+        if field in LIST_FIELDS:
+            if isinstance(value, str):
+                value = [item.strip() for item in value.split(';') if item.strip()]
+            if not isinstance(value, (list, tuple)) or not all(isinstance(item, str) for item in value):
+                raise ValueError(f"{field} must be a list of text values")
+            value = list(value)
+        elif field == 'usage_count':
+            try:
+                value = int(float(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"usage_count must be a whole number, got {value!r}") from None
+            if value < 0:
+                raise ValueError("usage_count cannot be negative")
+        elif field == 'rating':
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"rating must be a number, got {value!r}") from None
+            if not 0 <= value <= 5:
+                raise ValueError(f"rating must be between 0 and 5, got {value}")
+        elif field == 'risk_level':
+            if value not in RISK_LEVELS:
+                raise ValueError(f"risk_level must be one of {', '.join(RISK_LEVELS)}, got {value!r}")
+        elif value is None:
+            value = datetime.date.today().isoformat()
+        else:
+            value = str(value)
+        clause[field] = value
+    return clause
+
+
+def import_clauses(rows, store, batch_size=IMPORT_BATCH_SIZE, default_category=None, on_batch=None):
+    """Validate rows and save them to the store as custom clauses, one transaction per batch
+
+    on_batch(summary) runs after every committed batch (e.g. to update search
+    indexes or a progress bar). Rows that fail validation, rows repeating the
+    category and name of an earlier row in the same import, and rows taking
+    the name of a library clause in their category are counted and skipped. Rows replacing a custom clause already in the store are saved
+    and counted as 'updated' rather than 'imported'. Returns a summary with
+    rows/sec, the rejected rows and the updating rows.
+
+    If the file cannot be read past some point (e.g. malformed JSON array
+    data), the import stops there: the rows before it are still saved, as
+    batches are committed as they fill, and summary['error'] says where and
+    why it stopped.
+
+    Repeats are found through the category and name of every row imported so
+    far, kept as 64-bit digests, so this bookkeeping grows by roughly 100 bytes
+    per row.
+    """
+    summary = {'total_rows': 0, 'imported': 0, 'updated': 0, 'rejected': 0, 'rejections': [], 'updates': [],
+               'batches': 0, 'elapsed_seconds': 0.0, 'rows_per_second': 0.0, 'error': None}
+    started = time.perf_counter()
+    batch = []  # (row number, doc_id, clause)
+    first_rows = {}  # digest of doc_id -> row that introduced it in this import
+
+    def reject(row_number, error):
+        summary['rejected'] += 1
+        if len(summary['rejections']) < MAX_REPORTED_ROWS:
+            summary['rejections'].append({'row': row_number, 'error': error})
+
+    def flush():
+        # Custom clauses may not take the name of a library clause in the same category
+        collisions = store.library_collisions(clause for _, _, clause in batch)
+        for row_number, _, clause in batch:
+            if clause_doc_id('library', clause) in collisions:
+                reject(row_number, f"a library clause named '{clause['name']}' already exists in {clause['category']}")
+        batch[:] = [entry for entry in batch if clause_doc_id('library', entry[2]) not in collisions]
+        existing = store.existing(doc_id for _, doc_id, _ in batch)
+        if batch:
+            store.save_custom_batch([clause for _, _, clause in batch])
+        for row_number, doc_id, clause in batch:
+            if doc_id not in existing:
+                summary['imported'] += 1
+                continue
+            summary['updated'] += 1
+            if len(summary['updates']) < MAX_REPORTED_ROWS:
+                summary['updates'].append({'row': row_number, 'category': clause['category'], 'name': clause['name']})
+        summary['batches'] += 1
+        batch.clear()
+        summary['elapsed_seconds'] = time.perf_counter() - started
+        summary['rows_per_second'] = summary['total_rows'] / summary['elapsed_seconds'] if summary['elapsed_seconds'] else 0.0
+        if on_batch:
+            on_batch(summary)
+
+    rows = iter(rows)
+    row_number = 0
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        except ValueError as e:
+            summary['error'] = f"stopped after row {row_number}: {e}"
+            break
+        row_number += 1
+        summary['total_rows'] += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            clause = validate_clause(row, default_category)
+            doc_id = clause_doc_id('custom', clause)
+            digest = int.from_bytes(hashlib.blake2b(doc_id.encode('utf-8'), digest_size=8).digest(), 'big')
+            if digest in first_rows:
+                raise ValueError(f"duplicate of row {first_rows[digest]} ('{clause['name']}' in {clause['category']})")
+            first_rows[digest] = row_number
+            batch.append((row_number, doc_id, clause))
+        except ValueError as e:
+            reject(row_number, str(e))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    # Library name collisions are found per batch, after later rows may have been rejected
+    summary['rejections'].sort(key=lambda rejection: rejection['row'])
+
+    summary['elapsed_seconds'] = time.perf_counter() - started
+    summary['rows_per_second'] = summary['total_rows'] / summary['elapsed_seconds'] if summary['elapsed_seconds'] else 0.0
+    return summary
+
+
+def import_clause_file(binary_stream, file_name, store, **kwargs):
+    """import_clauses for an uploaded or opened binary file, decoded as it is read (a UTF-8 BOM is skipped)"""
+    stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    try:
+        return import_clauses(read_clause_rows(stream, file_name), store, **kwargs)
+    finally:
+        stream.detach()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a clause pack (JSON array, JSONL or CSV) into the clause store")
+    parser.add_argument("input", help="Clause file (.json, .jsonl or .csv)")
+    parser.add_argument("--db", default=os.environ.get("CLAUSE_STORE_FILE")
+                        or os.path.join(os.path.dirname(os.path.abspath(__file__)), "clause_library.db"),
+                        help="Clause store database file (default: $CLAUSE_STORE_FILE or clause_library.db next to the app)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Clauses written per transaction")
+    parser.add_argument("--category", help="Category for rows without one (default: reject them)")
+    args = parser.parse_args(argv)
+
+    store = ClauseStore(args.db)
+    with open(args.input, 'rb') as f:
+        summary = import_clause_file(f, args.input, store, batch_size=args.batch_size, default_category=args.category)
+    store.close()
+
+    print("=" * 60)
+    print(f"📥 Clauses imported: {summary['imported']}/{summary['total_rows']} in {summary['batches']} batches")
+    if summary['updated']:
+        print(f"♻️ Existing custom clauses updated: {summary['updated']}")
+    for update in summary['updates']:
+        print(f"   Row {update['row']}: {update['category']} / {update['name']}")
+    print(f"⏱️ Elapsed: {summary['elapsed_seconds']:.2f}s | Throughput: {summary['rows_per_second']:.0f} rows/sec")
+    if summary['rejected']:
+        print(f"⚠️ Rejected rows: {summary['rejected']}")
+    for rejection in summary['rejections']:
+        print(f"❌ Row {rejection['row']}: {rejection['error']}")
+    if summary['error']:
+        print(f"🛑 Import {summary['error']} (clauses saved before that are kept)")
+
+    return 1 if summary['rejected'] or summary['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,983 @@
+#!/usr/bin/env python3
+"""
+Clause search indexes for the clause library (library, custom and versioned clauses)
+"""
+
+import heapq
+import json
+import math
+import re
+import threading
+import uuid
+import zlib
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+", re.IGNORECASE | re.ASCII)
+
+# Query syntax: "exact phrases", NEAR/n operators and plain words
+QUERY_PARTS = re.compile(r'"([^"]*)"?|\bNEAR/(\d+)\b|([^\s"]+)')
+
+# Clause fields covered by the search index
+SEARCH_FIELDS = ('name', 'content', 'category', 'legal_notes', 'applicable_to')
+
+# BM25F parameters - a hit in the clause name counts most, legal notes least
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'applicable_to': 1.2, 'content': 1.0, 'legal_notes': 0.8}
+FIELD_LENGTH_NORMALIZATION = {'name': 0.5, 'category': 0.3, 'applicable_to': 0.5, 'content': 0.75, 'legal_notes': 0.75}
+BM25_K1 = 1.2
+
+# Query words that carry no meaning on their own; they are ignored unless the query has nothing else
+STOPWORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of',
+    'on', 'or', 'shall', 'such', 'that', 'the', 'this', 'to', 'with'
+})
+MIN_PREFIX_LENGTH = 3  # shorter query terms only match whole words
+FUZZY_MIN_LENGTH = 4  # shorter query terms are never treated as misspellings
+
+# Near-duplicate detection: MinHash over word shingles, banded for locality-sensitive hashing.
+# 16 bands of 8 rows make clauses above ~0.7 Jaccard similarity very likely to share a bucket;
+# candidates are then confirmed against DUPLICATE_THRESHOLD with the full signature
+SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+DUPLICATE_THRESHOLD = 0.8
+_MINHASH_PRIME = (1 << 31) - 1
+_minhash_rng = np.random.default_rng(20250801)
+_MINHASH_A = _minhash_rng.integers(1, _MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_MINHASH_B = _minhash_rng.integers(0, _MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+# Facets with a bitmap per value, and the value assumed when a clause leaves the field out
+FACET_DEFAULTS = {
+    'category': 'Custom Clauses',
+    'jurisdiction': 'International',
+    'status': 'Active',
+    'complexity': 'Standard',
+    'risk_level': 'Medium',
+    'language': 'English'
+}
+
+
+class QueryPlan(NamedTuple):
+    """A parsed search query: every word, plus the phrase and proximity constraints"""
+    words: tuple
+    phrases: tuple  # (term, ...) that must appear consecutively
+    nears: tuple  # (term, term, n) that must appear within n words of each other
+
+
+class SearchHit(NamedTuple):
+    """Lightweight search result; the clause record and snippet are resolved only when displayed"""
+    doc_id: str
+    relevance: float
+    source: str
+
+    def rank(self):
+        """Sort key giving a total order: best match first, ties broken by doc_id"""
+        return (-self.relevance, self.doc_id)
+
+
+def top_hits(hits, offset=0, limit=None, cursor=None):
+    """One page of hits in rank order, selected with a bounded heap instead of a full sort
+
+    With a cursor (the rank() of the last hit on the previous page) only hits
+    ranked after it are considered and offset is ignored, so deep pages cost
+    O(n log limit). Returns (page, cursor for the next page or None).
+    """
+    if cursor is not None:
+        cursor = tuple(cursor)
+        hits = [hit for hit in hits if hit.rank() > cursor]
+        offset = 0
+    if limit is None:
+        page = sorted(hits, key=SearchHit.rank)[offset:]
+        return page, None
+    page = heapq.nsmallest(offset + limit, hits, key=SearchHit.rank)[offset:]
+    remaining = len(hits) - offset - len(page)
+    return page, (page[-1].rank() if page and remaining > 0 else None)
+
+
+def token_spans(text):
+    """(token, start, end) for each lowercase word token of a string, with offsets into the string
+
+    Lists such as applicable_to are joined first.
+    """
+    if not text:
+        return []
+    if isinstance(text, (list, tuple)):
+        text = ' '.join(str(item) for item in text)
+    return [(match.group().lower(), match.start(), match.end()) for match in TOKEN_PATTERN.finditer(str(text))]
+
+
+def tokenize(text):
+    """Lowercase word tokens of a string (lists such as applicable_to are joined first)"""
+    return [token for token, _, _ in token_spans(text)]
+
+
+def parse_query(query):
+    """Split a query into its words, "exact phrases" and `word NEAR/n word` proximity constraints"""
+    words = []
+    phrases = []
+    nears = []
+    previous = None
+    near_distance = None
+    for match in QUERY_PARTS.finditer(query):
+        phrase, distance, word = match.groups()
+        if distance is not None:
+            near_distance = int(distance) if previous else None
+            continue
+        tokens = tokenize(phrase if phrase is not None else word)
+        if not tokens:
+            continue
+        if phrase is not None and len(tokens) > 1:
+            phrases.append(tuple(tokens))
+        if near_distance is not None:
+            nears.append((previous[-1], tokens[0], near_distance))
+            near_distance = None
+        previous = tokens
+        words.extend(tokens)
+    return QueryPlan(tuple(words), tuple(phrases), tuple(nears))
+
+
+def query_terms(query):
+    """Distinct, meaningful terms of a search query (operators and quotes are dropped)"""
+    terms = list(dict.fromkeys(parse_query(query).words))
+    return [term for term in terms if term not in STOPWORDS] or terms
+
+
+def normalize_query(query):
+    """Cache key form of a query: its meaningful terms, deduplicated and sorted, then any constraints"""
+    plan = parse_query(query)
+    parts = sorted(query_terms(query))
+    parts.extend(f'"{" ".join(phrase)}"' for phrase in sorted(set(plan.phrases)))
+    parts.extend(f"{a} NEAR/{distance} {b}" for a, b, distance in sorted({(min(a, b), max(a, b), distance)
+                                                                          for a, b, distance in plan.nears}))
+    return ' '.join(parts)
+
+
+def facet_values(clause, facet):
+    """Values of a clause for one facet (jurisdiction is multi-valued)"""
+    value = clause.get(facet) or FACET_DEFAULTS[facet]
+    return [str(item) for item in value] if isinstance(value, (list, tuple)) else [str(value)]
+
+
+def iter_bits(bitmap):
+    """Positions of the set bits of an integer bitmap"""
+    while bitmap:
+        low_bit = bitmap & -bitmap
+        yield low_bit.bit_length() - 1
+        bitmap ^= low_bit
+
+
+def clause_signature(clause):
+    """Cheap content signature used to detect added or edited clauses"""
+    return hash(json.dumps(dict(clause), sort_keys=True, default=str))
+
+
+def trigrams(term):
+    """Character trigrams of a term, padded so its first and last letters are weighted too"""
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(term):
+    """Typos tolerated in a query term: none below FUZZY_MIN_LENGTH letters, two from eight"""
+    if len(term) < FUZZY_MIN_LENGTH:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (an adjacent swap is one edit), or limit + 1 past limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class TrigramIndex:
+    """Character-trigram index over a vocabulary: trigram -> {terms}, for typo-tolerant lookup
+
+    Candidates must share enough trigrams with the query term to be within the
+    allowed edits (one edit changes at most four trigrams), so only a handful of
+    terms are ever compared by edit distance.
+    """
+
+    def __init__(self, terms=()):
+        self.grams = {}
+        for term in terms:
+            self.add(term)
+
+    def add(self, term):
+        for gram in trigrams(term):
+            self.grams.setdefault(gram, set()).add(term)
+
+    def remove(self, term):
+        for gram in trigrams(term):
+            terms = self.grams.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self.grams[gram]
+
+    def similar(self, term, limit=None):
+        """Indexed terms within `limit` edits of term (max_edits(term) by default), closest first"""
+        limit = max_edits(term) if limit is None else limit
+        if not limit:
+            return []
+        grams = trigrams(term)
+        shared = {}
+        for gram in grams:
+            for candidate in self.grams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        required = max(1, len(grams) - 4 * limit)
+        matches = []
+        for candidate, count in shared.items():
+            if count >= required and candidate != term:
+                distance = edit_distance(term, candidate, limit)
+                if distance <= limit:
+                    matches.append((distance, candidate))
+        return [candidate for _, candidate in sorted(matches)]
+
+
+def shingles(text):
+    """Distinct SHINGLE_SIZE-word shingles of a text (the whole text when it is shorter)"""
+    tokens = tokenize(text)
+    size = min(SHINGLE_SIZE, len(tokens))
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)} if tokens else set()
+
+
+def shingle_similarity(first_text, second_text):
+    """Exact Jaccard similarity of two texts' shingle sets (what MinHash signatures estimate)"""
+    first, second = shingles(first_text), shingles(second_text)
+    return len(first & second) / len(first | second) if first or second else 0.0
+
+
+def minhash_signature(text):
+    """MinHash signature of a text's shingles (None for text without words)
+
+    Signatures agree in a fraction of positions that estimates the Jaccard
+    similarity of the two shingle sets.
+    """
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) % _MINHASH_PRIME for shingle in shingles(text)),
+                         dtype=np.uint64)
+    if not len(hashes):
+        return None
+    return ((_MINHASH_A[:, None] * hashes[None, :] + _MINHASH_B[:, None]) % _MINHASH_PRIME).min(axis=1)
+
+
+class MinHashIndex:
+    """Locality-sensitive hash buckets over MinHash signatures: band -> {band hash: {doc_ids}}
+
+    Only documents sharing a bucket in some band are compared, so finding
+    near-duplicates does not need every pair of documents.
+    """
+
+    def __init__(self, bands=LSH_BANDS):
+        self.rows = MINHASH_PERMUTATIONS // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(len(self.buckets))]
+
+    def add(self, doc_id, text):
+        self.remove(doc_id)
+        signature = minhash_signature(text)
+        if signature is None:
+            return
+        self.signatures[doc_id] = signature
+        for buckets, key in zip(self.buckets, self._keys(signature)):
+            buckets.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        signature = self.signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        for buckets, key in zip(self.buckets, self._keys(signature)):
+            docs = buckets[key]
+            docs.discard(doc_id)
+            if not docs:
+                del buckets[key]
+
+    @staticmethod
+    def similarity(first, second):
+        """Estimated Jaccard similarity of two signatures"""
+        return float(np.count_nonzero(first == second)) / len(first)
+
+    def similar(self, text, threshold=DUPLICATE_THRESHOLD):
+        """[(similarity, doc_id)] of indexed documents near-duplicating text, most similar first"""
+        signature = minhash_signature(text)
+        if signature is None:
+            return []
+        candidates = set()
+        for buckets, key in zip(self.buckets, self._keys(signature)):
+            candidates.update(buckets.get(key, ()))
+        matches = [(self.similarity(signature, self.signatures[doc_id]), doc_id) for doc_id in candidates]
+        return sorted((match for match in matches if match[0] >= threshold), key=lambda match: (-match[0], match[1]))
+
+    def duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        """[(similarity, doc_id, doc_id)] for every near-duplicate pair, most similar first"""
+        compared = set()
+        pairs = []
+        for buckets in self.buckets:
+            for docs in buckets.values():
+                if len(docs) < 2:
+                    continue
+                ordered = sorted(docs)
+                for i, first in enumerate(ordered):
+                    for second in ordered[i + 1:]:
+                        if (first, second) in compared:
+                            continue
+                        compared.add((first, second))
+                        similarity = self.similarity(self.signatures[first], self.signatures[second])
+                        if similarity >= threshold:
+                            pairs.append((similarity, first, second))
+        return sorted(pairs, key=lambda pair: (-pair[0], pair[1], pair[2]))
+
+
+class ClauseIndex:
+    """Inverted index over clause fields: term -> {doc_id: {field: term frequency}}
+
+    Documents can be added, replaced and removed one at a time, so the index is
+    kept current as clauses change instead of being rebuilt. A trigram index
+    over the vocabulary follows the same updates for typo-tolerant expansion,
+    and a positional index (term -> {doc_id: {field: [positions]}}, plus the
+    character offsets of content tokens) answers phrase and proximity
+    constraints and places snippets. MinHash buckets over clause content
+    follow the updates too, for near-duplicate checks.
+    """
+
+    def __init__(self):
+        self.index_id = uuid.uuid4().hex
+        self.documents = {}  # doc_id -> (clause, source)
+        self.postings = {}
+        self.trigrams = TrigramIndex()
+        self.minhashes = MinHashIndex()
+        self.positions = {}
+        self._content_offsets = {}  # doc_id -> ([token starts], [token ends])
+        self.field_lengths = {}  # doc_id -> {field: token count}
+        self.field_length_totals = dict.fromkeys(SEARCH_FIELDS, 0)
+        self.facets = {facet: {} for facet in FACET_DEFAULTS}  # facet -> {value: bitmap of slots}
+        self.slots = {}  # doc_id -> bit position in the facet bitmaps
+        self._slot_docs = []
+        self._doc_facets = {}
+        self._free_slots = []
+        self._all_slots = 0
+        self.generation = 0
+        self.revision = None  # last change-set revision applied from an external store
+        self._doc_terms = {}
+        self._signatures = {}
+        self._vocabulary = None
+        self._term_matrix = None
+        self._similarity_matrix = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.documents
+
+    def add(self, doc_id, clause, source='library'):
+        """Index a clause under doc_id, replacing any previous version of it"""
+        with self._lock:
+            if doc_id in self.documents:
+                self._remove(doc_id)
+
+            doc_terms = set()
+            lengths = {}
+            for field in SEARCH_FIELDS:
+                spans = token_spans(clause.get(field))
+                for position, (term, _, _) in enumerate(spans):
+                    if term not in self.postings:
+                        self._vocabulary = None
+                        self.trigrams.add(term)
+                    fields = self.postings.setdefault(term, {}).setdefault(doc_id, {})
+                    fields[field] = fields.get(field, 0) + 1
+                    self.positions.setdefault(term, {}).setdefault(doc_id, {}).setdefault(field, []).append(position)
+                    doc_terms.add(term)
+                if field == 'content':
+                    self._content_offsets[doc_id] = ([start for _, start, _ in spans], [end for _, _, end in spans])
+                lengths[field] = len(spans)
+                self.field_length_totals[field] += len(spans)
+
+            self._doc_terms[doc_id] = doc_terms
+            self.field_lengths[doc_id] = lengths
+            self.minhashes.add(doc_id, clause.get('content'))
+
+            slot = self._free_slots.pop() if self._free_slots else len(self._slot_docs)
+            if slot == len(self._slot_docs):
+                self._slot_docs.append(None)
+            self._slot_docs[slot] = doc_id
+            self.slots[doc_id] = slot
+            self._all_slots |= 1 << slot
+            doc_facets = {facet: facet_values(clause, facet) for facet in self.facets}
+            for facet, doc_values in doc_facets.items():
+                values = self.facets[facet]
+                for value in doc_values:
+                    values[value] = values.get(value, 0) | 1 << slot
+            self._doc_facets[doc_id] = doc_facets
+            self.documents[doc_id] = (clause, source)
+            self._signatures[doc_id] = clause_signature(clause)
+            self.generation += 1
+
+    def remove(self, doc_id):
+        """Drop a clause from the index (no-op if it is not indexed)"""
+        with self._lock:
+            if doc_id in self.documents:
+                self._remove(doc_id)
+                self.generation += 1
+
+    def _remove(self, doc_id):
+        for term in self._doc_terms.pop(doc_id, ()):
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(doc_id, None)
+            self.positions[term].pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+                del self.positions[term]
+                self.trigrams.remove(term)
+                self._vocabulary = None
+        for field, length in self.field_lengths.pop(doc_id).items():
+            self.field_length_totals[field] -= length
+        slot = self.slots.pop(doc_id)
+        mask = ~(1 << slot)
+        for facet, doc_values in self._doc_facets.pop(doc_id).items():
+            values = self.facets[facet]
+            for value in doc_values:
+                values[value] &= mask
+                if not values[value]:
+                    del values[value]
+        self._all_slots &= mask
+        self._slot_docs[slot] = None
+        self._free_slots.append(slot)
+        del self.documents[doc_id]
+        self._content_offsets.pop(doc_id, None)
+        self._signatures.pop(doc_id, None)
+        self.minhashes.remove(doc_id)
+
+    def sync(self, entries):
+        """Bring the index in line with (doc_id, clause, source) entries, touching only what changed"""
+        changed = 0
+        with self._lock:
+            seen = set()
+            for doc_id, clause, source in entries:
+                seen.add(doc_id)
+                if self._signatures.get(doc_id) != clause_signature(clause) or self.documents[doc_id][1] != source:
+                    self.add(doc_id, clause, source)
+                    changed += 1
+            for doc_id in [doc_id for doc_id in self.documents if doc_id not in seen]:
+                self.remove(doc_id)
+                changed += 1
+        return changed
+
+    def apply(self, written, removed=(), revision=None):
+        """Apply a change set from a clause store: (doc_id, clause, source) written and doc_ids removed
+
+        revision records how far the index has caught up, so the next change
+        set can start from there.
+        """
+        with self._lock:
+            for doc_id in removed:
+                self.remove(doc_id)
+            for doc_id, clause, source in written:
+                self.add(doc_id, clause, source)
+            if revision is not None:
+                self.revision = revision
+        return len(written) + len(removed)
+
+    def vocabulary(self):
+        """Sorted list of indexed terms (rebuilt only after the term set changes)"""
+        with self._lock:
+            if self._vocabulary is None:
+                self._vocabulary = sorted(self.postings)
+            return self._vocabulary
+
+    def expand(self, term):
+        """Indexed terms matching a query term: the term itself plus terms it is a prefix of
+
+        A term that matches nothing is treated as a misspelling and expands to
+        the indexed terms within max_edits(term) edits of it.
+        """
+        if len(term) < MIN_PREFIX_LENGTH:
+            return [term] if term in self.postings else []
+        vocabulary = self.vocabulary()
+        matches = []
+        position = bisect_left(vocabulary, term)
+        while position < len(vocabulary) and vocabulary[position].startswith(term):
+            matches.append(vocabulary[position])
+            position += 1
+        return matches or self.trigrams.similar(term)
+
+    def expand_query(self, query):
+        """{query_term: [indexed terms]} for the meaningful terms of a query"""
+        terms = query_terms(query) if isinstance(query, str) else query
+        with self._lock:
+            return {query_term: self.expand(query_term) for query_term in terms}
+
+    def match(self, query):
+        """Postings for the query terms only: {doc_id: {indexed_term: {field: tf}}}"""
+        matches = {}
+        with self._lock:
+            for expansions in self.expand_query(query).values():
+                for term in expansions:
+                    for doc_id, fields in self.postings[term].items():
+                        matches.setdefault(doc_id, {})[term] = fields
+        return matches
+
+    def candidates(self, query):
+        """(doc_id, clause, source) for every clause containing at least one query term"""
+        with self._lock:
+            return [(doc_id,) + self.documents[doc_id] for doc_id in self.match(query)]
+
+    def substring_candidates(self, query):
+        """(doc_id, clause, source) for every clause whose text contains the query or one of its words
+
+        A plain case-insensitive substring scan over the search fields, so short
+        fragments, infixes and stopwords match as they did before the index existed.
+        """
+        query_lower = query.strip().lower()
+        needles = set(query_lower.split())
+        if query_lower:
+            needles.add(query_lower)
+        if not needles:
+            return []
+        with self._lock:
+            documents = list(self.documents.items())
+        matches = []
+        for doc_id, (clause, source) in documents:
+            text = '\n'.join(' '.join(value) if isinstance(value, (list, tuple)) else str(value or '')
+                             for value in (clause.get(field) for field in SEARCH_FIELDS)).lower()
+            if any(needle in text for needle in needles):
+                matches.append((doc_id, clause, source))
+        return matches
+
+    def has_phrase(self, doc_id, phrase):
+        """Whether the phrase terms occur consecutively, in order, within one field of a document"""
+        for field, starts in self.positions.get(phrase[0], {}).get(doc_id, {}).items():
+            following = [set(self.positions.get(term, {}).get(doc_id, {}).get(field, ())) for term in phrase[1:]]
+            if any(all(start + offset in positions for offset, positions in enumerate(following, 1))
+                   for start in starts):
+                return True
+        return False
+
+    def has_near(self, doc_id, first, second, distance):
+        """Whether two terms occur within `distance` words of each other (either order) in one field"""
+        second_fields = self.positions.get(second, {}).get(doc_id, {})
+        for field, first_positions in self.positions.get(first, {}).get(doc_id, {}).items():
+            second_positions = second_fields.get(field, ())
+            i = j = 0
+            while i < len(first_positions) and j < len(second_positions):
+                if abs(first_positions[i] - second_positions[j]) <= distance:
+                    return True
+                if first_positions[i] < second_positions[j]:
+                    i += 1
+                else:
+                    j += 1
+        return False
+
+    def satisfies(self, doc_id, plan):
+        """Whether a document meets every phrase and NEAR constraint of a parsed query"""
+        with self._lock:
+            return (all(self.has_phrase(doc_id, phrase) for phrase in plan.phrases)
+                    and all(self.has_near(doc_id, *near) for near in plan.nears))
+
+    def snippet_terms(self, query):
+        """{query_term: [indexed terms]} whose content positions place the snippets of a query"""
+        terms = query_terms(query) + [term for phrase in parse_query(query).phrases for term in phrase]
+        return self.expand_query(list(dict.fromkeys(terms)))
+
+    def snippet(self, doc_id, query, max_length=150, terms=None):
+        """Excerpt of a clause's content around the densest cluster of query term hits
+
+        Hits come from the stored term positions and the excerpt is cut at stored
+        token offsets, so the content is never lowercased or searched again. Pass
+        terms=snippet_terms(query) to share the query expansion across results.
+        """
+        with self._lock:
+            content = str(self.documents[doc_id][0].get('content') or '')
+            if not content:
+                return "No content available"
+            starts, ends = self._content_offsets[doc_id]
+            terms = self.snippet_terms(query) if terms is None else terms
+            hits = sorted((position, query_term)
+                          for query_term, indexed_terms in terms.items()
+                          for term in indexed_terms if term in self.positions
+                          for position in self.positions[term].get(doc_id, {}).get('content', ()))
+        if not hits:
+            return content[:max_length]
+
+        # Sliding window over the hits: most distinct query terms, then most hits, within max_length
+        best = None
+        first = 0
+        window_terms = {}
+        for last, (position, query_term) in enumerate(hits):
+            window_terms[query_term] = window_terms.get(query_term, 0) + 1
+            while first < last and ends[position] - starts[hits[first][0]] > max_length:
+                dropped = hits[first][1]
+                window_terms[dropped] -= 1
+                if not window_terms[dropped]:
+                    del window_terms[dropped]
+                first += 1
+            score = (len(window_terms), last - first)
+            if best is None or score > best[0]:
+                best = (score, first, last)
+        _, first, last = best
+        window_start, window_end = starts[hits[first][0]], ends[hits[last][0]]
+
+        # Spread the spare length around the window, a third of it before, and cut at word boundaries
+        spare = max(0, max_length - (window_end - window_start))
+        end = min(len(content), max(window_start - spare // 3, 0) + max_length)
+        start = max(0, min(window_start - spare // 3, end - max_length))
+        if end < window_end:
+            return content[window_start:window_start + max_length]
+        if start > 0:
+            start = starts[bisect_left(starts, start)]
+        if end < len(content):
+            end = ends[bisect_right(ends, end) - 1]
+        return content[start:end]
+
+    def bitmap(self, doc_ids):
+        """Bitmap with the slots of the given documents set"""
+        bitmap = 0
+        for doc_id in doc_ids:
+            bitmap |= 1 << self.slots[doc_id]
+        return bitmap
+
+    def documents_in(self, bitmap):
+        """doc_ids whose slots are set in a bitmap"""
+        return [self._slot_docs[slot] for slot in iter_bits(bitmap)]
+
+    def filter_bitmap(self, filters, skip_facet=None):
+        """Slots passing facet filters ({facet: [values]}): any value within a facet, every facet"""
+        with self._lock:
+            bitmap = self._all_slots
+            for facet, selected in (filters or {}).items():
+                if facet == skip_facet or facet not in self.facets or not selected:
+                    continue
+                values = self.facets[facet]
+                allowed = 0
+                for value in selected:
+                    allowed |= values.get(value, 0)
+                bitmap &= allowed
+            return bitmap
+
+    def facet_counts(self, bitmap, filters=None):
+        """{facet: {value: count}} within a result bitmap
+
+        Each facet is counted with the other facets' filters applied but not its
+        own, so the counts show what selecting another value would return.
+        """
+        with self._lock:
+            counts = {}
+            for facet, values in self.facets.items():
+                base = bitmap & self.filter_bitmap(filters, skip_facet=facet)
+                # bin().count() rather than int.bit_count(), which needs Python 3.10
+                counts[facet] = {value: bin(base & value_bitmap).count('1') for value, value_bitmap in values.items()}
+            return counts
+
+    def facet_search(self, doc_ids, filters=None):
+        """Apply facet filters to matched documents: (doc_ids passing every filter, facet counts)"""
+        with self._lock:
+            matched = self.bitmap(doc_id for doc_id in doc_ids if doc_id in self.slots)
+            allowed = matched & self.filter_bitmap(filters)
+            return set(self.documents_in(allowed)), self.facet_counts(matched, filters)
+
+    def term_matrix(self, scorer=None):
+        """BM25F term-document matrix of this index, rebuilt only after the index changed"""
+        scorer = scorer or BM25FScorer()
+        with self._lock:
+            matrix = self._term_matrix
+            if matrix is None or matrix.generation != self.generation or matrix.scorer.params != scorer.params:
+                matrix = self._term_matrix = TermDocumentMatrix(self, scorer)
+            return matrix
+
+    def similarity_matrix(self):
+        """TF-IDF similarity matrix of this index, rebuilt after changes reusing unchanged clause vectors"""
+        with self._lock:
+            matrix = self._similarity_matrix
+            if matrix is None or matrix.generation != self.generation:
+                matrix = self._similarity_matrix = SimilarityMatrix(self, previous=matrix)
+            return matrix
+
+
+class BM25FScorer:
+    """BM25F ranking over one or more index layers
+
+    Field term frequencies are length-normalized per field and weighted before
+    saturation. A query term that expands to several indexed terms scores each
+    of them. Corpus statistics (document count, document frequency, average
+    field lengths) are pooled over all layers, so a session's custom clauses are
+    ranked on the same scale as the shared library.
+    """
+
+    def __init__(self, field_weights=None, field_b=None, k1=BM25_K1):
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self.field_b = field_b or FIELD_LENGTH_NORMALIZATION
+        self.k1 = k1
+        self.params = (tuple(sorted(self.field_weights.items())), tuple(sorted(self.field_b.items())), k1)
+
+    def idf(self, doc_count, document_frequency):
+        return math.log(1 + (doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def relevance(self, score, normalizer):
+        """BM25F score as a percentage of the best score the query terms could reach"""
+        return min(round(score / normalizer * 100, 1), 100.0) if normalizer else 0.0
+
+    def search(self, indexes, query, stats_indexes=()):
+        """Return (relevance, doc_id, clause, source) for every matching clause, unsorted
+
+        stats_indexes contribute corpus statistics without being scored.
+        """
+        terms = query_terms(query)
+        layers = []
+        doc_count = 0
+        length_totals = dict.fromkeys(SEARCH_FIELDS, 0)
+        document_frequency = {}
+        query_expansions = {term: set() for term in terms}
+        for index in tuple(indexes) + tuple(stats_indexes):
+            with index._lock:
+                expansions = index.expand_query(terms)
+                for query_term, indexed_terms in expansions.items():
+                    query_expansions[query_term].update(indexed_terms)
+                for term in {term for indexed_terms in expansions.values() for term in indexed_terms}:
+                    document_frequency[term] = document_frequency.get(term, 0) + len(index.postings[term])
+                doc_count += len(index)
+                for field, total in index.field_length_totals.items():
+                    length_totals[field] += total
+                if index not in stats_indexes:
+                    matches = index.match(terms)
+                    layers.append((matches,
+                                   {doc_id: index.field_lengths[doc_id] for doc_id in matches},
+                                   {doc_id: index.documents[doc_id] for doc_id in matches}))
+
+        if not doc_count:
+            return []
+
+        average_lengths = {field: (total / doc_count) or 1.0 for field, total in length_totals.items()}
+        idf = {term: self.idf(doc_count, df) for term, df in document_frequency.items()}
+        normalizer = sum(max((idf[term] for term in indexed_terms), default=self.idf(doc_count, 0))
+                         for indexed_terms in query_expansions.values())
+
+        results = []
+        for matches, lengths, documents in layers:
+            for doc_id, term_fields in matches.items():
+                score = sum(idf[term] * self.saturate(fields, lengths[doc_id], average_lengths)
+                            for term, fields in term_fields.items())
+                results.append((self.relevance(score, normalizer), doc_id) + documents[doc_id])
+        return results
+
+    def saturate(self, fields, lengths, average_lengths):
+        """Saturated, field-weighted term frequency of one term in one document ({field: tf})"""
+        weighted_tf = 0.0
+        for field, tf in fields.items():
+            b = self.field_b[field]
+            normalization = 1 - b + b * lengths[field] / average_lengths[field]
+            weighted_tf += self.field_weights[field] * tf / normalization
+        return weighted_tf / (self.k1 + weighted_tf)
+
+
+class TermDocumentMatrix:
+    """Sparse BM25F term-document matrix over a snapshot of a ClauseIndex (CSR, one row per term)
+
+    Each stored value is the full BM25F contribution of a term to a document
+    (idf times saturated weighted tf), so scoring is a sparse product of a
+    query-term matrix with this matrix. Rows are sorted by term, which makes
+    every prefix expansion a contiguous row range; misspelled query terms fall
+    back to the rows of similar terms from a trigram index of the snapshot.
+    """
+
+    def __init__(self, index, scorer=None):
+        self.scorer = scorer or BM25FScorer()
+        with index._lock:
+            self.generation = index.generation
+            self.doc_ids = list(index.documents)
+            self.documents = [index.documents[doc_id] for doc_id in self.doc_ids]
+            self.terms = list(index.vocabulary())
+            self.rows = {term: row for row, term in enumerate(self.terms)}
+            self.trigrams = TrigramIndex(self.terms)
+            doc_count = len(self.doc_ids)
+            columns = {doc_id: column for column, doc_id in enumerate(self.doc_ids)}
+            average_lengths = {field: (total / doc_count if doc_count else 0) or 1.0
+                               for field, total in index.field_length_totals.items()}
+
+            indptr = [0]
+            indices = []
+            data = []
+            idf = []
+            for term in self.terms:
+                postings = index.postings[term]
+                term_idf = self.scorer.idf(doc_count, len(postings))
+                for doc_id, fields in postings.items():
+                    indices.append(columns[doc_id])
+                    data.append(term_idf * self.scorer.saturate(fields, index.field_lengths[doc_id], average_lengths))
+                indptr.append(len(indices))
+                idf.append(term_idf)
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.data = np.array(data, dtype=np.float64)
+        self.idf = np.array(idf, dtype=np.float64)
+        self.missing_idf = self.scorer.idf(len(self.doc_ids), 0)
+
+    @property
+    def shape(self):
+        return len(self.terms), len(self.doc_ids)
+
+    def term_rows(self, query_term):
+        """Rows of the indexed terms a query term expands to (see ClauseIndex.expand)"""
+        if len(query_term) < MIN_PREFIX_LENGTH:
+            return [self.rows[query_term]] if query_term in self.rows else []
+        start = bisect_left(self.terms, query_term)
+        stop = bisect_left(self.terms, query_term + '\U0010ffff')
+        if stop > start:
+            return list(range(start, stop))
+        return [self.rows[term] for term in self.trigrams.similar(query_term)]
+
+    def score_batch(self, queries):
+        """Relevance matrix of shape (len(queries), documents) from one sparse matrix product"""
+        query_rows = []
+        term_rows_selected = []
+        normalizers = np.zeros(len(queries))
+        for query_number, query in enumerate(queries):
+            for query_term in query_terms(query):
+                term_rows = self.term_rows(query_term)
+                normalizers[query_number] += self.idf[term_rows].max() if term_rows else self.missing_idf
+                query_rows.extend([query_number] * len(term_rows))
+                term_rows_selected.extend(term_rows)
+
+        query_rows = np.array(query_rows, dtype=np.int64)
+        rows = np.array(term_rows_selected, dtype=np.int64)
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+
+        # Gather every stored value of every selected row in one pass
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        cells = np.repeat(query_rows, counts) * len(self.doc_ids) + self.indices[offsets]
+        scores = np.bincount(cells, weights=self.data[offsets], minlength=len(queries) * len(self.doc_ids))
+        scores = scores.reshape(len(queries), len(self.doc_ids))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relevance = np.where(normalizers[:, None] > 0, scores / normalizers[:, None] * 100, 0.0)
+        return np.minimum(np.round(relevance, 1), 100.0)
+
+    def top_k(self, queries, k=10, batch_size=512):
+        """(relevance, doc_id) lists of the k best documents per query, scoring queries in batches"""
+        results = []
+        for batch_start in range(0, len(queries), batch_size):
+            scores = self.score_batch(queries[batch_start:batch_start + batch_size])
+            keep = min(k, scores.shape[1])
+            if not keep:
+                results.extend([] for _ in range(len(scores)))
+                continue
+            best = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            for row, columns in zip(scores, best):
+                columns = columns[np.argsort(-row[columns], kind='stable')]
+                results.append([(float(row[column]), self.doc_ids[column]) for column in columns if row[column] > 0])
+        return results
+
+    def search(self, query):
+        """(relevance, doc_id, clause, source) for every matching document, unsorted"""
+        scores = self.score_batch([query])[0]
+        return [(float(scores[column]), self.doc_ids[column]) + self.documents[column]
+                for column in np.flatnonzero(scores)]
+
+
+class SimilarityMatrix:
+    """TF-IDF cosine similarity over a snapshot of a ClauseIndex (SMART lnc.ltc weighting)
+
+    Clause vectors use field-weighted log term frequencies with cosine
+    normalization and no idf, so each clause's vector depends on that clause
+    alone: a new snapshot recomputes only clauses whose signature changed and
+    reuses the rest from the previous one. IDF is applied to the query vector
+    instead (see tfidf_query). Stored term-major (CSR, one row per term) like
+    TermDocumentMatrix, so a query only reads the rows of its own terms.
+    """
+
+    def __init__(self, index, previous=None):
+        cached = previous.vectors if previous is not None else {}
+        self.recomputed = 0
+        with index._lock:
+            self.generation = index.generation
+            self.doc_ids = list(index.documents)
+            self.documents = [index.documents[doc_id] for doc_id in self.doc_ids]
+            self.vectors = {}  # doc_id -> (signature, {term: normalized weight})
+            for doc_id in self.doc_ids:
+                signature = index._signatures[doc_id]
+                vector = cached.get(doc_id)
+                if vector is None or vector[0] != signature:
+                    weights = {term: self.term_weight(index.postings[term][doc_id]) for term in index._doc_terms[doc_id]}
+                    norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+                    vector = (signature, {term: weight / norm for term, weight in weights.items()})
+                    self.recomputed += 1
+                self.vectors[doc_id] = vector
+
+            self.rows = {}
+            indptr = [0]
+            indices = []
+            data = []
+            columns = {doc_id: column for column, doc_id in enumerate(self.doc_ids)}
+            for row, term in enumerate(index.vocabulary()):
+                self.rows[term] = row
+                for doc_id in index.postings[term]:
+                    indices.append(columns[doc_id])
+                    data.append(self.vectors[doc_id][1][term])
+                indptr.append(len(indices))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.data = np.array(data, dtype=np.float64)
+
+    @staticmethod
+    def term_weight(fields):
+        """Log-scaled, field-weighted frequency of one term in one clause ({field: tf})"""
+        return 1 + math.log(sum(FIELD_WEIGHTS[field] * tf for field, tf in fields.items()))
+
+    def document_frequency(self, term):
+        row = self.rows.get(term)
+        return 0 if row is None else int(self.indptr[row + 1] - self.indptr[row])
+
+    def search(self, query_vector):
+        """(similarity, doc_id, clause, source) for every clause sharing a term with a query vector, unsorted"""
+        scores = np.zeros(len(self.doc_ids))
+        for term, weight in query_vector.items():
+            row = self.rows.get(term)
+            if row is not None:
+                start, stop = self.indptr[row], self.indptr[row + 1]
+                scores[self.indices[start:stop]] += weight * self.data[start:stop]
+        return [(min(float(scores[column]), 1.0), self.doc_ids[column]) + self.documents[column]
+                for column in np.flatnonzero(scores)]
+
+
+def tfidf_query(text, matrices):
+    """Unit-length query vector ({term: weight}) of a text, with idf pooled over similarity matrices
+
+    Terms no clause contains are left out, as they cannot change the ranking.
+    """
+    counts = {}
+    for term in tokenize(text):
+        if term not in STOPWORDS:
+            counts[term] = counts.get(term, 0) + 1
+    doc_count = sum(len(matrix.doc_ids) for matrix in matrices)
+    weights = {}
+    for term, tf in counts.items():
+        document_frequency = sum(matrix.document_frequency(term) for matrix in matrices)
+        if document_frequency:
+            weights[term] = (1 + math.log(tf)) * math.log(1 + doc_count / document_frequency)
+    norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+    return {term: weight / norm for term, weight in weights.items()}
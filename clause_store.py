@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Persistent clause repository (SQLite in WAL mode with an FTS5 content index)
+
+Library, custom and versioned clauses live in one table, so they survive
+restarts and are shared by every session and process using the same file.
+Every write bumps a store-wide revision; in-memory indexes catch up by
+applying changes(since=their revision) instead of reloading everything.
+
+Only the latest version of a modified library clause is a live clause row;
+its full history is kept in clause_history as periodic snapshots with word
+deltas in between.
+"""
+
+import contextlib
+import datetime
+import difflib
+import json
+import queue
+import re
+import sqlite3
+import threading
+
+from clause_search import FACET_DEFAULTS, facet_values, parse_query, query_terms
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('revision', 0);
+
+CREATE TABLE IF NOT EXISTS clauses (
+    id INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    parent_key TEXT,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    risk_level TEXT NOT NULL,
+    complexity TEXT NOT NULL,
+    language TEXT NOT NULL,
+    content TEXT NOT NULL,
+    legal_notes TEXT NOT NULL,
+    data TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_clauses_category ON clauses (category, source);
+CREATE INDEX IF NOT EXISTS idx_clauses_status ON clauses (status);
+CREATE INDEX IF NOT EXISTS idx_clauses_risk_level ON clauses (risk_level);
+CREATE INDEX IF NOT EXISTS idx_clauses_revision ON clauses (revision);
+CREATE INDEX IF NOT EXISTS idx_clauses_parent_key ON clauses (parent_key);
+
+CREATE TABLE IF NOT EXISTS clause_jurisdictions (
+    clause_id INTEGER NOT NULL REFERENCES clauses (id) ON DELETE CASCADE,
+    jurisdiction TEXT NOT NULL,
+    PRIMARY KEY (clause_id, jurisdiction)
+);
+CREATE INDEX IF NOT EXISTS idx_clause_jurisdictions ON clause_jurisdictions (jurisdiction);
+
+CREATE TABLE IF NOT EXISTS deleted_clauses (
+    doc_id TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deleted_clauses_revision ON deleted_clauses (revision);
+
+CREATE TABLE IF NOT EXISTS clause_history (
+    parent_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    base_position INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    content TEXT,
+    delta TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (parent_key, position)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS clauses_fts USING fts5 (
+    name, content, legal_notes, content='clauses', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS clauses_fts_insert AFTER INSERT ON clauses BEGIN
+    INSERT INTO clauses_fts (rowid, name, content, legal_notes) VALUES (new.id, new.name, new.content, new.legal_notes);
+END;
+CREATE TRIGGER IF NOT EXISTS clauses_fts_delete AFTER DELETE ON clauses BEGIN
+    INSERT INTO clauses_fts (clauses_fts, rowid, name, content, legal_notes)
+    VALUES ('delete', old.id, old.name, old.content, old.legal_notes);
+END;
+CREATE TRIGGER IF NOT EXISTS clauses_fts_update AFTER UPDATE ON clauses BEGIN
+    INSERT INTO clauses_fts (clauses_fts, rowid, name, content, legal_notes)
+    VALUES ('delete', old.id, old.name, old.content, old.legal_notes);
+    INSERT INTO clauses_fts (rowid, name, content, legal_notes) VALUES (new.id, new.name, new.content, new.legal_notes);
+END;
+"""
+
+# bm25() column weights for name, content and legal notes (same order as the FTS5 table)
+FTS_COLUMN_WEIGHTS = (3.0, 1.0, 0.8)
+
+# Version history keeps a full snapshot at least every this many versions, so
+# rebuilding any version replays at most SNAPSHOT_INTERVAL - 1 deltas
+SNAPSHOT_INTERVAL = 8
+
+TEXT_PIECES = re.compile(r'\s+|\S+')
+
+
+def text_pieces(text):
+    """Words and the whitespace between them; joining the pieces restores the text exactly"""
+    return TEXT_PIECES.findall(text or '')
+
+
+def text_delta(old, new):
+    """Word-level delta turning old into new: [start, end] copies old pieces, a string is inserted text"""
+    old_pieces = text_pieces(old)
+    new_pieces = text_pieces(new)
+    delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_pieces, new_pieces, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append(''.join(new_pieces[j1:j2]))
+    return delta
+
+
+def apply_delta(old, delta):
+    old_pieces = text_pieces(old)
+    return ''.join(''.join(old_pieces[op[0]:op[1]]) if isinstance(op, list) else op for op in delta)
+
+
+def text_changes(old, new):
+    """Word-level (tag, old_text, new_text) runs between two texts; tag is equal, replace, delete or insert"""
+    old_pieces = text_pieces(old)
+    new_pieces = text_pieces(new)
+    return [(tag, ''.join(old_pieces[i1:i2]), ''.join(new_pieces[j1:j2]))
+            for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_pieces, new_pieces, autojunk=False).get_opcodes()]
+
+
+def clause_doc_id(source, clause, parent_key=None, position=None):
+    """Stable id of a clause, shared by the store and the search indexes"""
+    if source == 'version':
+        return f"version/{parent_key}/{position}"
+    return f"{source}/{clause.get('category') or FACET_DEFAULTS['category']}/{clause.get('name')}"
+
+
+def fts_query(query):
+    """FTS5 MATCH expression for a search query: any term (prefix match), plus its phrase and NEAR constraints"""
+    plan = parse_query(query)
+    terms = ' OR '.join(f'"{term}"*' for term in query_terms(query))
+    constraints = [f'"{" ".join(phrase)}"' for phrase in plan.phrases]
+    constraints.extend(f'NEAR("{first}" "{second}", {distance})' for first, second, distance in plan.nears)
+    return ' AND '.join([f"({terms})"] * bool(terms) + constraints)
+
+
+class ClauseStore:
+    """SQLite clause repository with a small connection pool
+
+    Connections are opened on demand, at most pool_size at a time, and reused;
+    each is used by one thread at a time. Writes run in BEGIN IMMEDIATE
+    transactions, so concurrent writers (other sessions or processes) queue on
+    the database lock instead of failing mid-way.
+    """
+
+    def __init__(self, path, pool_size=4, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._counters = {'connections_opened': 0, 'checkouts': 0}
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        self._counters['connections_opened'] += 1
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a pooled connection (autocommit mode; see transaction() for writes)"""
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            self._counters['checkouts'] += 1
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Write transaction yielding (connection, revision); the store revision is bumped once per transaction"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'revision'")
+                revision = conn.execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()[0]
+                yield conn, revision
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        """Close idle pooled connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def revision(self):
+        with self.connection() as conn:
+            return conn.execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()[0]
+
+    def _write(self, conn, revision, doc_id, clause, source, parent_key=None):
+        clause = dict(clause)
+        facets = {facet: facet_values(clause, facet) for facet in FACET_DEFAULTS}
+        clause_id = conn.execute(
+            """INSERT INTO clauses (doc_id, source, parent_key, category, name, status, risk_level, complexity,
+                                    language, content, legal_notes, data, revision, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (doc_id) DO UPDATE SET
+                   source = excluded.source, parent_key = excluded.parent_key, category = excluded.category,
+                   name = excluded.name, status = excluded.status, risk_level = excluded.risk_level,
+                   complexity = excluded.complexity, language = excluded.language, content = excluded.content,
+                   legal_notes = excluded.legal_notes, data = excluded.data, revision = excluded.revision,
+                   updated_at = excluded.updated_at
+               RETURNING id""",
+            (doc_id, source, parent_key, facets['category'][0], str(clause.get('name') or ''),
+             facets['status'][0], facets['risk_level'][0], facets['complexity'][0], facets['language'][0],
+             str(clause.get('content') or ''), str(clause.get('legal_notes') or ''),
+             json.dumps(clause, default=str), revision, datetime.datetime.now().isoformat(timespec='seconds'))
+        ).fetchone()[0]
+        conn.execute("DELETE FROM clause_jurisdictions WHERE clause_id = ?", (clause_id,))
+        conn.executemany("INSERT OR IGNORE INTO clause_jurisdictions (clause_id, jurisdiction) VALUES (?, ?)",
+                         [(clause_id, jurisdiction) for jurisdiction in facets['jurisdiction']])
+        conn.execute("DELETE FROM deleted_clauses WHERE doc_id = ?", (doc_id,))
+
+    def _delete(self, conn, revision, doc_id):
+        if conn.execute("DELETE FROM clauses WHERE doc_id = ?", (doc_id,)).rowcount:
+            conn.execute("INSERT OR REPLACE INTO deleted_clauses (doc_id, revision) VALUES (?, ?)", (doc_id, revision))
+            return True
+        return False
+
+    def seed(self, catalog):
+        """Load the built-in catalog ({category: [clause]}) as library clauses
+
+        Runs in full only on first use; afterwards only library clauses that
+        differ from the catalog are rewritten, and ones it no longer lists are
+        removed. Returns the number of clauses written or removed.
+        """
+        entries = {}
+        for category, clauses in catalog.items():
+            for clause in clauses:
+                clause = dict(clause, category=category)
+                entries[clause_doc_id('library', clause)] = json.dumps(clause, default=str)
+        with self.connection() as conn:
+            stored = {row['doc_id']: row['data'] for row in
+                      conn.execute("SELECT doc_id, data FROM clauses WHERE source = 'library'")}
+        changed = [doc_id for doc_id, data in entries.items() if stored.get(doc_id) != data]
+        removed = [doc_id for doc_id in stored if doc_id not in entries]
+        if not changed and not removed:
+            return 0
+        with self.transaction() as (conn, revision):
+            for doc_id in changed:
+                self._write(conn, revision, doc_id, json.loads(entries[doc_id]), 'library')
+            for doc_id in removed:
+                self._delete(conn, revision, doc_id)
+        return len(changed) + len(removed)
+
+    def save_custom(self, clause, previous_doc_id=None):
+        """Create or update a custom clause (renaming it when previous_doc_id differs); returns its doc_id
+
+        Custom clauses are keyed by category and name, so creating a clause (no
+        previous_doc_id) or renaming one onto a name already used in the category
+        raises ValueError instead of overwriting the other clause. Names of
+        library clauses in the category are rejected the same way.
+        """
+        doc_id = clause_doc_id('custom', clause)
+        with self.transaction() as (conn, revision):
+            self._check_library_name(conn, clause)
+            if doc_id != previous_doc_id and conn.execute("SELECT 1 FROM clauses WHERE doc_id = ?", (doc_id,)).fetchone():
+                raise ValueError(f"a custom clause named '{clause.get('name')}' already exists in {clause.get('category')}")
+            if previous_doc_id and previous_doc_id != doc_id:
+                self._delete(conn, revision, previous_doc_id)
+            self._write(conn, revision, doc_id, clause, 'custom')
+        return doc_id
+
+    def save_custom_batch(self, clauses):
+        """Create or update many custom clauses in one transaction (one revision); returns their doc_ids
+
+        Raises ValueError, saving none of them, if any clause takes the name of a
+        library clause in its category (see library_collisions).
+        """
+        doc_ids = []
+        with self.transaction() as (conn, revision):
+            for clause in clauses:
+                self._check_library_name(conn, clause)
+                doc_id = clause_doc_id('custom', clause)
+                self._write(conn, revision, doc_id, clause, 'custom')
+                doc_ids.append(doc_id)
+        return doc_ids
+
+    def _check_library_name(self, conn, clause):
+        if conn.execute("SELECT 1 FROM clauses WHERE doc_id = ?", (clause_doc_id('library', clause),)).fetchone():
+            raise ValueError(f"a library clause named '{clause.get('name')}' already exists in {clause.get('category')}")
+
+    def library_collisions(self, clauses):
+        """doc_ids of the library clauses that custom clauses with these categories and names would shadow"""
+        return self.existing(clause_doc_id('library', clause) for clause in clauses)
+
+    def existing(self, doc_ids):
+        """The subset of doc_ids that are stored"""
+        doc_ids = list(doc_ids)
+        found = set()
+        with self.connection() as conn:
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start:start + 500]
+                found.update(row['doc_id'] for row in conn.execute(
+                    f"SELECT doc_id FROM clauses WHERE doc_id IN ({', '.join('?' * len(chunk))})", chunk))
+        return found
+
+    def add_version(self, parent_key, clause):
+        """Append a modified version of a library clause; returns its doc_id
+
+        The new version replaces the previous one as the live clause row. Its
+        history entry is a word delta against the previous version, or a full
+        snapshot when the delta chain reaches SNAPSHOT_INTERVAL or the delta
+        would not be smaller than the text.
+        """
+        clause = dict(clause)
+        content = str(clause.get('content') or '')
+        fields = json.dumps({key: value for key, value in clause.items() if key != 'content'}, default=str)
+        with self.transaction() as (conn, revision):
+            previous = conn.execute(
+                """SELECT h.position, h.base_position, c.doc_id, c.content FROM clause_history h
+                   LEFT JOIN clauses c ON c.parent_key = h.parent_key AND c.source = 'version'
+                   WHERE h.parent_key = ? ORDER BY h.position DESC LIMIT 1""", (parent_key,)
+            ).fetchone()
+            position = previous['position'] + 1 if previous else 0
+            delta = None
+            if previous and previous['content'] is not None and position - previous['base_position'] < SNAPSHOT_INTERVAL:
+                delta = json.dumps(text_delta(previous['content'], content))
+                if len(delta) >= len(content):
+                    delta = None
+            conn.execute(
+                """INSERT INTO clause_history (parent_key, position, base_position, version, fields, content, delta, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (parent_key, position, previous['base_position'] if delta else position,
+                 str(clause.get('version', '')), fields, None if delta else content, delta,
+                 datetime.datetime.now().isoformat(timespec='seconds'))
+            )
+            if previous and previous['doc_id']:
+                self._delete(conn, revision, previous['doc_id'])
+            doc_id = clause_doc_id('version', clause, parent_key, position)
+            self._write(conn, revision, doc_id, clause, 'version', parent_key)
+        return doc_id
+
+    def version_count(self, parent_key):
+        with self.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM clause_history WHERE parent_key = ?", (parent_key,)).fetchone()[0]
+
+    def history(self, parent_key):
+        """[(position, version, created_at)] of every stored version of a library clause, oldest first"""
+        with self.connection() as conn:
+            return [tuple(row) for row in conn.execute(
+                "SELECT position, version, created_at FROM clause_history WHERE parent_key = ? ORDER BY position",
+                (parent_key,))]
+
+    def versions(self, parent_key, positions):
+        """{position: clause} for the requested versions, rebuilt from their snapshots and deltas
+
+        Each version is replayed from its own nearest snapshot, so rebuilding it
+        applies fewer than SNAPSHOT_INTERVAL deltas however far apart the
+        requested versions are; versions sharing a snapshot share one replay.
+        """
+        positions = set(positions)
+        if not positions:
+            return {}
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                chain_ends = {}
+                for row in conn.execute(
+                    f"SELECT position, base_position FROM clause_history WHERE parent_key = ? AND position IN ({', '.join('?' * len(positions))})",
+                    (parent_key, *positions)
+                ):
+                    chain_ends[row['base_position']] = max(chain_ends.get(row['base_position'], 0), row['position'])
+                chains = [conn.execute(
+                    """SELECT position, fields, content, delta FROM clause_history
+                       WHERE parent_key = ? AND position BETWEEN ? AND ? ORDER BY position""",
+                    (parent_key, base, end)
+                ).fetchall() for base, end in chain_ends.items()]
+            finally:
+                conn.execute("COMMIT")
+        rebuilt = {}
+        for rows in chains:
+            content = None
+            for row in rows:
+                content = row['content'] if row['delta'] is None else apply_delta(content, json.loads(row['delta']))
+                if row['position'] in positions:
+                    rebuilt[row['position']] = dict(json.loads(row['fields']), content=content)
+        return rebuilt
+
+    def version(self, parent_key, position):
+        return self.versions(parent_key, [position]).get(position)
+
+    def diff(self, parent_key, old_position, new_position):
+        """Word-level text_changes between the content of two versions of a library clause"""
+        rebuilt = self.versions(parent_key, [old_position, new_position])
+        return text_changes(rebuilt[old_position]['content'], rebuilt[new_position]['content'])
+
+    def delete(self, doc_id):
+        """Remove a clause; returns whether it existed"""
+        with self.transaction() as (conn, revision):
+            return self._delete(conn, revision, doc_id)
+
+    def delete_many(self, doc_ids):
+        """Remove several clauses in one transaction; returns how many existed"""
+        with self.transaction() as (conn, revision):
+            return sum(self._delete(conn, revision, doc_id) for doc_id in doc_ids)
+
+    def get(self, doc_id):
+        with self.connection() as conn:
+            row = conn.execute("SELECT data FROM clauses WHERE doc_id = ?", (doc_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def clauses(self, source=None, category=None, status=None, jurisdiction=None, risk_level=None):
+        """(doc_id, clause, source) matching the given filters, through the column indexes"""
+        conditions = []
+        params = []
+        for column, value in (('source', source), ('category', category), ('status', status), ('risk_level', risk_level)):
+            if value is not None:
+                conditions.append(f"c.{column} = ?")
+                params.append(value)
+        if jurisdiction is not None:
+            conditions.append("c.id IN (SELECT clause_id FROM clause_jurisdictions WHERE jurisdiction = ?)")
+            params.append(jurisdiction)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.connection() as conn:
+            rows = conn.execute(f"SELECT c.doc_id, c.data, c.source FROM clauses c {where} ORDER BY c.id", params).fetchall()
+        return [(row['doc_id'], json.loads(row['data']), row['source']) for row in rows]
+
+    def catalog(self):
+        """Library clauses grouped by category: {category: [clause]}"""
+        catalog = {}
+        for _, clause, _ in self.clauses(source='library'):
+            catalog.setdefault(clause['category'], []).append(clause)
+        return catalog
+
+    def categories(self, source=None):
+        with self.connection() as conn:
+            if source is None:
+                rows = conn.execute("SELECT DISTINCT category FROM clauses")
+            else:
+                rows = conn.execute("SELECT DISTINCT category FROM clauses WHERE source = ?", (source,))
+            return {row['category'] for row in rows}
+
+    def changes(self, since=None):
+        """(revision, [(doc_id, clause, source) written], [doc_id removed]) after revision `since` (None: everything)"""
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                revision = conn.execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()[0]
+                rows = conn.execute("SELECT doc_id, data, source FROM clauses WHERE revision > ? ORDER BY id",
+                                    (since or 0,)).fetchall()
+                removed = [row['doc_id'] for row in
+                           conn.execute("SELECT doc_id FROM deleted_clauses WHERE revision > ?", (since or 0,))]
+            finally:
+                conn.execute("COMMIT")
+        written = [(row['doc_id'], json.loads(row['data']), row['source']) for row in rows]
+        return revision, written, [] if since is None else removed
+
+    def search(self, query, limit=None):
+        """[(relevance, doc_id, clause, source)] from the FTS5 index, best first
+
+        Ranked with bm25() weighted by column; relevance is a percentage of the
+        best match so it reads like the other search scores.
+        """
+        expression = fts_query(query)
+        if not expression:
+            return []
+        with self.connection() as conn:
+            rows = conn.execute(
+                f"""SELECT c.doc_id, c.data, c.source, bm25(clauses_fts, {', '.join(map(str, FTS_COLUMN_WEIGHTS))}) AS rank
+                    FROM clauses_fts JOIN clauses c ON c.id = clauses_fts.rowid
+                    WHERE clauses_fts MATCH ? ORDER BY rank LIMIT ?""",
+                (expression, -1 if limit is None else limit)
+            ).fetchall()
+        if not rows:
+            return []
+        best = rows[0]['rank'] or -1.0
+        return [(round(row['rank'] / best * 100, 1), row['doc_id'], json.loads(row['data']), row['source'])
+                for row in rows]
+
+    def optimize(self):
+        """Merge the FTS5 index segments and refresh the query planner statistics"""
+        with self.connection() as conn:
+            conn.execute("INSERT INTO clauses_fts (clauses_fts) VALUES ('optimize')")
+            conn.execute("PRAGMA optimize")
+
+    def stats(self):
+        """Stored clauses per source, revision, file size and connection pool counters"""
+        with self.connection() as conn:
+            clauses = {row['source']: row['count'] for row in
+                       conn.execute("SELECT source, COUNT(*) AS count FROM clauses GROUP BY source")}
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return dict(self._counters, clauses=clauses, revision=self.revision(), bytes=page_count * page_size)
@@ -0,0 +1,9 @@
+"""
+Pytest setup: the app's clause store points at a throwaway database, so test
+runs never open or write the real clause_library.db
+"""
+
+import os
+import tempfile
+
+os.environ["CLAUSE_STORE_FILE"] = os.path.join(tempfile.mkdtemp(prefix="clause_store_"), "clause_library.db")
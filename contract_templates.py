@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Shared Jinja2 environment for contract templates
+
+Templates are compiled once per process and the compiled bytecode is kept on
+disk so cold starts skip compilation as well. Both Streamlit apps render
+through this module; string templates are registered by name on first use.
+"""
+
+import os
+import threading
+
+import streamlit as st
+from jinja2 import ChoiceLoader, DictLoader, Environment, FileSystemBytecodeCache, FileSystemLoader
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+TEMPLATE_CACHE_DIR = os.path.join(BASE_DIR, ".template_cache")
+
+
+class ContractTemplateEnvironment(Environment):
+    """Jinja2 environment that counts compile-cache hits and real template compilations
+
+    Both counters are updated under cache_stats_lock. A thread-local flag ties
+    each compilation to the get_template call that caused it, so concurrent
+    sessions never count each other's compilations as their own misses.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        self.cache_stats_lock = threading.Lock()
+        self._thread_state = threading.local()
+
+    def compile(self, *args, **kwargs):
+        self._thread_state.compiled = True
+        with self.cache_stats_lock:
+            self.cache_stats['misses'] += 1
+        return super().compile(*args, **kwargs)
+
+    def get_template(self, *args, **kwargs):
+        self._thread_state.compiled = False
+        template = super().get_template(*args, **kwargs)
+        if not self._thread_state.compiled:
+            with self.cache_stats_lock:
+                self.cache_stats['hits'] += 1
+        return template
+
+
+# Streamlit re-executes the app script on every rerun, so process-wide objects
+# are held in st.cache_resource rather than plain module globals
+@st.cache_resource(show_spinner=False)
+def get_template_environment():
+    """Return the process-wide Jinja2 environment, creating it on first use"""
+    try:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    except OSError as e:
+        print(f"Template bytecode cache disabled: {str(e)}")
+        bytecode_cache = None
+
+    return ContractTemplateEnvironment(
+        loader=ChoiceLoader([
+            DictLoader({}),
+            FileSystemLoader(TEMPLATES_DIR)
+        ]),
+        bytecode_cache=bytecode_cache,
+        cache_size=400
+    )
+
+
+def get_contract_template(name, source=None):
+    """Get a compiled contract template by name, registering `source` under that name if given"""
+    env = get_template_environment()
+    if source is not None:
+        string_templates = env.loader.loaders[0].mapping
+        if string_templates.get(name) != source:
+            string_templates[name] = source
+    return env.get_template(name)
+
+
+def get_template_cache_stats():
+    """Return compile-cache hit/miss counters for the shared template environment"""
+    env = get_template_environment()
+    with env.cache_stats_lock:
+        stats = dict(env.cache_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = (stats['hits'] / total * 100) if total else 0.0
+    return stats
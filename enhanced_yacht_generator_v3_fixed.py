@@ -4,8 +4,11 @@ import datetime
 import os
 import io
 import json
+import copy
 import uuid
 import hashlib
+import heapq
+import html
 import smtplib
 import random
 import plotly.express as px
@@ -14,7 +17,19 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import base64
 import re
-from jinja2 import Template
+import time
+import threading
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from jinja2 import meta
+from contract_templates import (TEMPLATES_DIR, get_contract_template as get_shared_contract_template, get_template_cache_stats,
+                                get_template_environment)
+from clause_search import (DUPLICATE_THRESHOLD, FACET_DEFAULTS, BM25FScorer, ClauseIndex, SearchHit, normalize_query,
+                           parse_query, shingle_similarity, tfidf_query, top_hits)
+from clause_store import ClauseStore, clause_doc_id
+from clause_import import IMPORT_BATCH_SIZE, import_clause_file
 
 # Base CSS to ensure consistent contract formatting regardless of embedding context
 ENHANCED_CONTRACT_TEMPLATE_STYLES = """
@@ -116,7 +131,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
         <div style=\"font-size: 16px; margin: 10px 0;\">{{ vessel_name }} - Contract {{ contract_id }}</div>
         <div>Version {{ version_number }} - {{ agreement_date }}</div>
         <div style=\"font-size: 10px; margin-top: 10px;\">Template: {{ template_name }} | Language: {{ contract_language }}</div>
-    </div>
+    </div>{# section: parties #}
 
     <div class=\"parties\"> 
         <div class=\"two-column\">
@@ -146,7 +161,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
             <strong>Broker/Agent:</strong> {{ broker_info }}{% if broker_commission %} (Commission: {{ broker_commission }}%){% endif %}
         </div>
         {% endif %}
-    </div>
+    </div>{# section: risk_assessment #}
 
     {% if risk_assessment %}
     <div class=\"risk-assessment\">
@@ -172,7 +187,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
         </ul>
         {% endif %}
     </div>
-    {% endif %}
+    {% endif %}{# section: vessel_specs #}
 
     <h1>1. VESSEL SPECIFICATIONS</h1>
     <div class=\"vessel-specs\">
@@ -210,7 +225,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
                 </td>
             </tr>
         </table>
-    </div>
+    </div>{# section: charter_terms #}
 
     <h1>2. CHARTER TERMS & ITINERARY</h1>
     <div class=\"two-column\">
@@ -232,7 +247,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
     <div style=\"background: #f9fafb; padding: 10px; border-left: 3px solid #6366f1;\">
         {{ special_requests | replace('\n','<br>') | safe }}
     </div>
-    {% endif %}
+    {% endif %}{# section: financials #}
 
     <h1>3. FINANCIAL TERMS</h1>
     <div class=\"financial-summary\">
@@ -252,7 +267,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
                 <p><strong>VAT/Taxes:</strong> As applicable by law</p>
             </div>
         </div>
-    </div>
+    </div>{# section: clauses #}
 
     {% if suggested_clauses %}
     <h1>4. ENHANCED CONTRACT CLAUSES</h1>
@@ -306,7 +321,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
         {% endif %}
     </div>
     {% endfor %}
-    {% endif %}
+    {% endif %}{# section: insurance #}
 
     <h1>5. INSURANCE REQUIREMENTS</h1>
     <table>
@@ -334,7 +349,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
             <td>Standard coverage</td>
             <td>Standard</td>
         </tr>
-    </table>
+    </table>{# section: operations #}
 
     <h1>6. OPERATIONAL LIMITATIONS & SAFETY</h1>
     <div class=\"two-column\">
@@ -350,7 +365,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
             <h3>Crew Qualifications</h3>
             <p>All crew hold valid STCW certifications. Captain certified for {{ yacht_type }} operations.</p>
         </div>
-    </div>
+    </div>{# section: terms #}
 
     <h1>7. TERMS & CONDITIONS</h1>
     <div style=\"font-size: 10px; line-height: 1.3;\">
@@ -372,7 +387,7 @@ ENHANCED_CONTRACT_TEMPLATE = """
                 <p>Charter client experience level: {{ charter_experience }}. Additional briefings may apply.</p>
             </div>
         </div>
-    </div>
+    </div>{# section: execution #}
 
     <div style=\"margin-top: 40px; border-top: 3px solid #1e3a8a; padding-top: 20px;\">
         <h1>EXECUTION</h1>
@@ -423,26 +438,763 @@ ENHANCED_CONTRACT_TEMPLATE = """
 </html>
 """
 
+# Full-width lightbox overlay for the contract preview (pure CSS toggle via checkbox)
+CONTRACT_LIGHTBOX_TEMPLATE = """
+<style>
+/* Lightbox styles scoped to the container */
+/* Pure CSS toggle via checkbox */
+#__CONTAINER__ { --overlay-offset-top: 100px; }
+#__CONTAINER__ .open-preview-btn {
+    display: inline-block;
+    background: #1e3a8a;
+    color: #fff;
+    padding: 8px 12px;
+    border-radius: 6px;
+    text-decoration: none;
+    font-weight: 600;
+    cursor: pointer;
+    border: none;
+    box-shadow: 0 1px 2px rgba(0,0,0,0.1);
+}
+#__CONTAINER__ .open-preview-btn:hover { background: #0f1f4d; }
+/* Hide the checkbox off-screen */
+#__CONTAINER__ input[type="checkbox"] {
+    position: absolute;
+    left: -10000px;
+    width: 1px;
+    height: 1px;
+    opacity: 0;
+}
+#__CONTAINER__ .lightbox-backdrop {
+    position: fixed;
+    inset: 0;
+    background: rgba(0,0,0,0.75);
+    display: none;
+    align-items: flex-start;
+    justify-content: center;
+    padding-top: var(--overlay-offset-top);
+    z-index: 100000;
+}
+/* Toggle: show backdrop when checkbox is checked */
+#__CONTAINER__ input#__TOGGLE__:checked ~ .lightbox-backdrop { display: flex; }
+#__CONTAINER__ .lightbox-content {
+    background: #ffffff;
+    width: 95vw;
+    height: calc(95vh - var(--overlay-offset-top));
+    max-width: 1600px;
+    border-radius: 10px;
+    box-shadow: 0 10px 30px rgba(0,0,0,0.3);
+    border: 1px solid #e5e7eb;
+    display: flex;
+    flex-direction: column;
+    position: relative;
+}
+#__CONTAINER__ .lightbox-header {
+    flex: 0 0 auto;
+    display: flex;
+    align-items: center;
+    justify-content: flex-end;
+    gap: 8px;
+    padding: 8px 10px;
+    background: #ffffff;
+    border-bottom: 1px solid #e5e7eb;
+    position: sticky;
+    top: 0;
+    z-index: 2;
+}
+#__CONTAINER__ .close-btn {
+    background: #1f2937;
+    color: #ffffff;
+    border: 1px solid #111827;
+    border-radius: 6px;
+    padding: 6px 10px;
+    font-weight: 700;
+    cursor: pointer;
+    text-decoration: none;
+}
+#__CONTAINER__ .close-btn:hover { background: #111827; }
+/* Floating close button overlay to ensure clickability over iframe */
+#__CONTAINER__ .close-btn-floating {
+    position: absolute;
+    top: 10px;
+    right: 10px;
+    z-index: 999999;
+}
+#__CONTAINER__ .frame-wrap {
+    flex: 1 1 auto;
+    display: flex;
+    align-items: flex-start;
+    justify-content: center;
+    padding: 10px;
+    overflow: auto;
+    background: #fff;
+}
+#__CONTAINER__ .lightbox-iframe {
+    width: min(1200px, 100%);
+    height: 100%;
+    border: 0;
+    background: #fff;
+}
+</style>
+<div id="__CONTAINER__">
+    <label for="__TOGGLE__" class="open-preview-btn">🔍 Open Full-Width Preview</label>
+    <input type="checkbox" id="__TOGGLE__"__CHECKED__ />
+    <div class="lightbox-backdrop">
+        <label for="__TOGGLE__" class="backdrop-dismiss" aria-hidden="true" title="Close"></label>
+        <div class="lightbox-content" role="dialog" aria-modal="true" aria-label="Full-width contract preview">
+            <div class="lightbox-header">
+                <label for="__TOGGLE__" class="close-btn" title="Close">Close ✖</label>
+            </div>
+            <div class="frame-wrap">
+                <label for="__TOGGLE__" class="close-btn close-btn-floating" title="Close">Close ✖</label>
+                <iframe class="lightbox-iframe" src="__HTML_SRC__"></iframe>
+            </div>
+        </div>
+    </div>
+</div>
+<style>
+/* Backdrop click-to-close layer */
+#__CONTAINER__ .backdrop-dismiss {
+    position: absolute;
+    inset: 0;
+    content: "";
+}
+</style>
+"""
+
 # App constants (paths)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_FILE = os.path.join(BASE_DIR, "contracts.db")
-TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 VERSIONS_DIR = os.path.join(BASE_DIR, "versions")
+# Set CLAUSE_STORE_FILE to point tests and command-line tools at their own clause database
+CLAUSE_STORE_FILE = os.environ.get("CLAUSE_STORE_FILE") or os.path.join(BASE_DIR, "clause_library.db")
+
+# Contract templates render through the shared environment in contract_templates
+CONTRACT_TEMPLATE_NAME = "enhanced_contract.html"
+
+
+def get_contract_template(name=CONTRACT_TEMPLATE_NAME, source=None):
+    """Get a compiled contract template by name, registering `source` under that name if given"""
+    if source is None and name == CONTRACT_TEMPLATE_NAME:
+        source = ENHANCED_CONTRACT_TEMPLATE
+    return get_shared_contract_template(name, source)
+
+# Section-level incremental rendering - ENHANCED_CONTRACT_TEMPLATE is split on
+# {# section: name #} markers and each section is memoized on the keys it reads
+CONTRACT_SECTION_MARKER = re.compile(r"\{# section: (\w+) #\}")
+
+
+def split_contract_sections(source=ENHANCED_CONTRACT_TEMPLATE):
+    """Split a contract template into ordered (section_name, source) pairs"""
+    parts = CONTRACT_SECTION_MARKER.split(source)
+    return [('header', parts[0])] + list(zip(parts[1::2], parts[2::2]))
+
+
+@st.cache_resource(show_spinner=False)
+def get_contract_section_templates():
+    """Compiled section templates with the contract_data keys each one reads"""
+    env = get_template_environment()
+    sections = []
+    for name, source in split_contract_sections():
+        template = get_contract_template(f"sections/{name}.html", source)
+        keys = frozenset(meta.find_undeclared_variables(env.parse(source)))
+        sections.append((name, template, keys))
+    return tuple(sections)
+
+
+@st.cache_resource(show_spinner=False)
+def get_section_fragment_cache():
+    """Rendered section fragments keyed by (section, hash of the keys it reads)"""
+    return BoundedLRUCache(max_entries=1024, max_bytes=32 * 1024 * 1024)
+
+
+def render_contract_sections(contract_data, rendered_sections=None):
+    """Render a contract by assembling cached section fragments
+
+    Only sections whose input keys changed are re-rendered; their names are appended
+    to `rendered_sections` when a list is given. Output is identical to a full render.
+    """
+    fragment_cache = get_section_fragment_cache()
+    fragments = []
+    for name, template, keys in get_contract_section_templates():
+        context = {key: contract_data[key] for key in keys if key in contract_data}
+        fragment_key = (name, compute_contract_hash(context))
+        fragment = fragment_cache.get(fragment_key)
+        if fragment is None:
+            fragment = template.render(**context)
+            fragment_cache.put(fragment_key, fragment)
+            if rendered_sections is not None:
+                rendered_sections.append(name)
+        fragments.append(fragment)
+    return ''.join(fragments)
+
+
+# Streaming HTML rendering for very large contracts (used by the bulk CLI; the
+# Streamlit page keeps the rendered HTML for its preview, PDF and download)
+def stream_contract_html(contract_data, sink, template_name=CONTRACT_TEMPLATE_NAME, buffer_size=64 * 1024,
+                         encoding='utf-8', track_memory=False):
+    """Render a contract into a writable sink chunk by chunk via Template.generate()
+
+    The full document is never materialized; small template chunks are coalesced into
+    writes of roughly `buffer_size` characters. Binary sinks receive encoded bytes.
+    Returns render stats; with track_memory=True they include the peak traced memory.
+    tracemalloc is process-wide and slows every thread, so only enable it for
+    profiling runs, never from the Streamlit app.
+    """
+    template = get_contract_template(template_name)
+    binary_sink = isinstance(sink, (io.RawIOBase, io.BufferedIOBase))
+
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if track_memory:
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+        # Python 3.8 has no reset_peak(); the peak then covers everything since tracing started
+        if not started_tracing and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    started = time.perf_counter()
+    pending = []
+    pending_size = 0
+    total_characters = 0
+    writes = 0
+
+    def flush():
+        nonlocal pending, pending_size, writes
+        if pending:
+            block = ''.join(pending)
+            sink.write(block.encode(encoding) if binary_sink else block)
+            writes += 1
+            pending = []
+            pending_size = 0
+
+    try:
+        for chunk in template.generate(**contract_data):
+            pending.append(chunk)
+            pending_size += len(chunk)
+            total_characters += len(chunk)
+            if pending_size >= buffer_size:
+                flush()
+        flush()
+    finally:
+        peak_memory = None
+        if track_memory:
+            peak_memory = max(tracemalloc.get_traced_memory()[1] - baseline_memory, 0)
+        if started_tracing:
+            tracemalloc.stop()
+
+    return {
+        'characters': total_characters,
+        'writes': writes,
+        'seconds': time.perf_counter() - started,
+        'peak_memory_bytes': peak_memory
+    }
+
+
+def render_contract_to_file(contract_data, path, **kwargs):
+    """Stream a rendered contract straight to an HTML file and return the render stats"""
+    with open(path, 'w', encoding=kwargs.get('encoding', 'utf-8')) as f:
+        return stream_contract_html(contract_data, f, **kwargs)
+
+# Bounded in-memory caches
+class BoundedLRUCache:
+    """Thread-safe LRU cache bounded by entry count and (optionally) total size in bytes"""
+
+    def __init__(self, max_entries=128, max_bytes=None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        # Never keep a single value larger than the whole budget
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+            ):
+                old_key, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups * 100) if lookups else 0.0
+            }
+
+
+def compute_contract_hash(contract_data):
+    """Stable content hash of contract data (key order and value types normalized)"""
+    canonical = json.dumps(contract_data, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_cache():
+    """Rendered PDFs keyed by contract hash (64 MB budget shared by all sessions)"""
+    return BoundedLRUCache(max_entries=64, max_bytes=64 * 1024 * 1024)
+
+
+PDF_CACHE = get_pdf_cache()
+
+
+# Contracts larger than this are not embedded in the page until the user asks for a preview
+PREVIEW_LAZY_THRESHOLD_BYTES = 256 * 1024
+
+
+@st.cache_resource(show_spinner=False)
+def get_preview_cache():
+    """Contract preview artifacts keyed by contract hash (16 MB budget shared by all sessions)"""
+    return BoundedLRUCache(max_entries=32, max_bytes=16 * 1024 * 1024,
+                           sizeof=lambda artifact: len(artifact['data_uri']))
+
+
+def get_contract_preview(contract_html, contract_data):
+    """Return the read-only preview artifact for a contract, base64-encoding it only once per contract hash"""
+    cache = get_preview_cache()
+    cache_key = compute_contract_hash(contract_data)
+    artifact = cache.get(cache_key)
+    if artifact is None:
+        html_bytes = contract_html.encode('utf-8')
+        # Sanitize contract_id for safe HTML id usage
+        safe_id = re.sub(r"[^a-zA-Z0-9_-]", "-", str(contract_data.get('contract_id', 'preview')))
+        artifact = MappingProxyType({
+            'key': cache_key,
+            'element_id': safe_id,
+            'size_bytes': len(html_bytes),
+            'lazy': len(html_bytes) > PREVIEW_LAZY_THRESHOLD_BYTES,
+            # A data URL avoids srcdoc escaping issues in the lightbox iframe
+            'data_uri': "data:text/html;charset=utf-8;base64," + base64.b64encode(html_bytes).decode('ascii')
+        })
+        cache.put(cache_key, artifact)
+    return artifact
+
+
+def build_lightbox_html(preview, open_on_load=False):
+    """Full-width lightbox overlay for a preview artifact (pure CSS, no Streamlit rerun dependency)"""
+    # Build HTML with safe token replacement (no .format)
+    return (
+        CONTRACT_LIGHTBOX_TEMPLATE
+        .replace("__CONTAINER__", f"lb-{preview['element_id']}")
+        .replace("__TOGGLE__", f"lb-toggle-{preview['element_id']}")
+        .replace("__CHECKED__", " checked" if open_on_load else "")
+        .replace("__HTML_SRC__", preview['data_uri'])
+    )
+
+
+class PDFRenderService:
+    """Background PDF rendering on a bounded thread pool, with a job table keyed by contract hash
+
+    At most `max_pending` renders may be queued or running; further submissions are
+    rejected (status 'busy') so a burst of sessions cannot queue unbounded work.
+    A failed job stays failed until retry() is called; only the error messages of
+    the `max_errors` most recent failures are kept.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, max_errors=32, cache=None):
+        self.max_pending = max_pending
+        self.max_errors = max_errors
+        self.cache = cache if cache is not None else get_pdf_cache()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf-render")
+        self._jobs = {}
+        self._failed = set()
+        self._errors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _render(self, job_key, contract_html, contract_data):
+        try:
+            self.cache.put(job_key, generate_pdf_bytes(contract_html, contract_data))
+            # A PDF larger than the whole cache budget is never stored; fail instead of re-rendering it forever
+            if job_key not in self.cache:
+                raise ValueError("PDF is larger than the PDF cache budget")
+        except Exception as e:
+            with self._lock:
+                self._failed.add(job_key)
+                self._errors[job_key] = str(e)
+                while len(self._errors) > self.max_errors:
+                    self._errors.popitem(last=False)
+        finally:
+            with self._lock:
+                self._jobs.pop(job_key, None)
+
+    def submit(self, contract_html, contract_data):
+        """Queue a render unless the PDF is cached or already rendering; returns the job key"""
+        job_key = compute_contract_hash(contract_data)
+        if job_key in self.cache:
+            return job_key
+        with self._lock:
+            if job_key in self._jobs or job_key in self._failed:
+                return job_key
+            if len(self._jobs) >= self.max_pending:
+                return job_key
+            # Render from a snapshot so later session-state edits cannot race the worker
+            self._jobs[job_key] = self._executor.submit(
+                self._render, job_key, contract_html, copy.deepcopy(contract_data)
+            )
+        return job_key
+
+    def status(self, job_key):
+        """Return 'ready', 'pending', 'failed' or 'busy' (not queued, because the pool was full or the PDF was evicted)"""
+        if job_key in self.cache:
+            return 'ready'
+        with self._lock:
+            if job_key in self._jobs:
+                return 'pending'
+            if job_key in self._failed:
+                return 'failed'
+        return 'busy'
+
+    def result(self, job_key):
+        """PDF bytes for a ready job (None if it is not ready)"""
+        return self.cache.get(job_key)
+
+    def error(self, job_key):
+        with self._lock:
+            if job_key not in self._failed:
+                return None
+            return self._errors.get(job_key, "error details are no longer available")
+
+    def retry(self, job_key):
+        """Forget a failed job so the next submit renders it again"""
+        with self._lock:
+            self._failed.discard(job_key)
+            self._errors.pop(job_key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._jobs), 'failed': len(self._failed), 'max_pending': self.max_pending}
+
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_render_service():
+    """Process-wide background PDF renderer shared by all sessions"""
+    return PDFRenderService()
+
+
+def _pdf_pending_notice(state, job_key):
+    """Placeholder shown while a PDF is queued ('pending') or waiting for a free worker ('busy')"""
+    if state == 'pending':
+        st.button("⏳ Preparing PDF...", disabled=True, use_container_width=True, key=f"btn_pdf_pending_{job_key[:12]}")
+    elif hasattr(st, 'fragment'):
+        st.warning("🚦 PDF renderer is busy, your PDF will be queued shortly.")
+    else:
+        st.warning("🚦 PDF renderer is busy, press Check PDF Status to queue your PDF again.")
+
+
+def pdf_download_panel(contract_html, contract_data, pdf_filename):
+    """PDF download button that shows pending/ready state instead of blocking the page"""
+    render_service = get_pdf_render_service()
+    job_key = render_service.submit(contract_html, contract_data)
+    state = render_service.status(job_key)
+
+    if state == 'ready':
+        st.download_button(
+            label="📑 Download PDF Contract",
+            data=render_service.result(job_key),
+            file_name=pdf_filename,
+            mime="application/pdf",
+            use_container_width=True,
+            key=f"btn_download_pdf_{job_key[:12]}"
+        )
+    elif state == 'failed':
+        st.error(f"❌ PDF generation failed: {render_service.error(job_key)}")
+        if st.button("🔁 Retry PDF", use_container_width=True, key=f"btn_pdf_retry_{job_key[:12]}"):
+            render_service.retry(job_key)
+            st.rerun()
+    elif hasattr(st, 'fragment'):
+        _pdf_status_poller(contract_html, contract_data, job_key)
+    else:
+        _pdf_pending_notice(state, job_key)
+        st.button("🔄 Check PDF Status", use_container_width=True, key=f"btn_pdf_check_{job_key[:12]}")
+
+
+# Only an unfinished render is polled, by re-running just this fragment; the page is
+# rerun once the PDF is ready or failed so the download panel stops polling
+if hasattr(st, 'fragment'):
+    @st.fragment(run_every=1.5)
+    def _pdf_status_poller(contract_html, contract_data, job_key):
+        render_service = get_pdf_render_service()
+        state = render_service.status(job_key)
+        if state == 'busy':
+            # Not queued yet, or evicted from the cache before download: submit it again.
+            # Failed jobs are never resubmitted here, only from the Retry button
+            render_service.submit(contract_html, contract_data)
+            state = render_service.status(job_key)
+        if state in ('ready', 'failed'):
+            st.rerun()
+        _pdf_pending_notice(state, job_key)
+
+
+def _table_style_commands(label_background, label_color, grid_color, font_size=9, grid_width=0.5,
+                          valign='TOP', padding=4):
+    """Common TableStyle commands for two-column label/value tables"""
+    from reportlab.lib import colors
+
+    return [
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor(label_background)),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor(label_color)),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), font_size),
+        ('GRID', (0, 0), (-1, -1), grid_width, colors.HexColor(grid_color)),
+        ('VALIGN', (0, 0), (-1, -1), valign),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), padding),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), padding),
+    ]
+
+
+def _build_pdf_style_registry():
+    """Create every ParagraphStyle and TableStyle used by the PDF builder"""
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+
+    styles = getSampleStyleSheet()
+
+    # Enhanced styles with colors and formatting
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=20,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#1e3a8a'),  # Navy blue
+        fontName='Helvetica-Bold',
+        borderWidth=2,
+        borderColor=colors.HexColor('#1e3a8a'),
+        borderPadding=10
+    )
+
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=12,
+        spaceBefore=20,
+        textColor=colors.HexColor('#1e3a8a'),  # Navy blue
+        fontName='Helvetica-Bold',
+        borderWidth=1,
+        borderColor=colors.HexColor('#1e3a8a'),
+        leftIndent=0,
+        borderPadding=8
+    )
+
+    subheading_style = ParagraphStyle(
+        'CustomSubHeading',
+        parent=styles['Heading3'],
+        fontSize=12,
+        spaceAfter=8,
+        spaceBefore=12,
+        textColor=colors.HexColor('#3730a3'),  # Purple blue
+        fontName='Helvetica-Bold'
+    )
+
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=6,
+        fontName='Helvetica',
+        leading=14
+    )
+
+    paragraph_styles = {
+        'sample': styles,
+        'title': title_style,
+        'heading': heading_style,
+        'subheading': subheading_style,
+        'normal': normal_style,
+        'highlight': ParagraphStyle(
+            'HighlightStyle',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=6,
+            fontName='Helvetica-Bold',
+            textColor=colors.HexColor('#1e3a8a'),
+            backColor=colors.HexColor('#f0f9ff')
+        ),
+        # Highlighted box for special requests
+        'special_requests': ParagraphStyle(
+            'SpecialRequests',
+            parent=normal_style,
+            backColor=colors.HexColor('#ecfdf5'),
+            borderColor=colors.HexColor('#10b981'),
+            borderWidth=1,
+            borderPadding=10,
+            fontName='Helvetica'
+        ),
+        'category': ParagraphStyle(
+            'CategoryStyle', parent=styles['Normal'],
+            fontSize=8, textColor=colors.HexColor('#6b7280'),
+            spaceBefore=2, spaceAfter=8
+        ),
+        # Services section uses green styling
+        'services_heading': ParagraphStyle(
+            'ServicesHeading',
+            parent=heading_style,
+            textColor=colors.HexColor('#16a34a'),  # Green color for services
+            borderColor=colors.HexColor('#16a34a'),
+            backColor=colors.HexColor('#f0fdf4')  # Light green background
+        ),
+        'services_subheading': ParagraphStyle(
+            'ServicesSubHeading',
+            parent=subheading_style,
+            textColor=colors.HexColor('#15803d'),  # Darker green
+            backColor=colors.HexColor('#f0fdf4'),
+            borderWidth=1,
+            borderColor=colors.HexColor('#16a34a'),
+            borderPadding=6
+        ),
+        'services_normal': ParagraphStyle(
+            'ServicesNormal',
+            parent=normal_style,
+            backColor=colors.HexColor('#f0fdf4'),
+            borderPadding=8
+        ),
+        'services_category': ParagraphStyle(
+            'ServicesCategoryStyle', parent=styles['Normal'],
+            fontSize=8, textColor=colors.HexColor('#16a34a'),
+            spaceBefore=2, spaceAfter=8
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            parent=normal_style,
+            fontSize=8,
+            textColor=colors.HexColor('#6b7280'),
+            alignment=TA_CENTER,
+            borderWidth=1,
+            borderColor=colors.HexColor('#cbd5e1'),
+            borderPadding=8,
+            backColor=colors.HexColor('#f9fafb')
+        ),
+    }
+
+    party_commands = _table_style_commands('#f8fafc', '#1e3a8a', '#cbd5e1') + [
+        ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#1e3a8a')),  # Bold line under party name
+    ]
+
+    table_styles = {
+        'header': TableStyle(
+            _table_style_commands('#f1f5f9', '#1e3a8a', '#cbd5e1', font_size=10, grid_width=1,
+                                  valign='MIDDLE', padding=6)
+        ),
+        'vessel': TableStyle(
+            _table_style_commands('#f1f5f9', '#1e3a8a', '#cbd5e1') + [
+                ('BACKGROUND', (1, 0), (1, -1), colors.white),
+            ]
+        ),
+        'charter': TableStyle(
+            _table_style_commands('#f1f5f9', '#1e3a8a', '#cbd5e1') + [
+                ('BACKGROUND', (1, 2), (1, 3), colors.HexColor('#f0f9ff')),  # Highlight financial rows
+                ('TEXTCOLOR', (1, 2), (1, 3), colors.HexColor('#0ea5e9')),  # Financial highlight color
+                ('FONTNAME', (1, 2), (1, 3), 'Helvetica-Bold'),  # Bold financial values
+            ]
+        ),
+        'lessor': TableStyle(party_commands),
+        'lessee': TableStyle(party_commands),
+        'financial': TableStyle(
+            _table_style_commands('#f0f9ff', '#0ea5e9', '#0ea5e9') + [
+                ('BACKGROUND', (1, 1), (1, 1), colors.HexColor('#fef3c7')),  # Highlight security deposit
+            ]
+        ),
+        # Warning yellow for insurance and risk
+        'insurance': TableStyle(_table_style_commands('#fef3c7', '#f59e0b', '#f59e0b')),
+        'risk': TableStyle(
+            _table_style_commands('#fef3c7', '#f59e0b', '#f59e0b') + [
+                ('BACKGROUND', (1, 0), (1, 0), colors.HexColor('#fee2e2')),  # Risk score background
+                ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#dc2626')),  # Risk score color
+                ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),  # Bold risk score
+            ]
+        ),
+        'terms': TableStyle(_table_style_commands('#f1f5f9', '#1e3a8a', '#cbd5e1')),
+        'signature': TableStyle([
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#1e3a8a')),  # LESSOR line
+            ('LINEBELOW', (0, 5), (-1, 5), 2, colors.HexColor('#1e3a8a')),  # LESSEE line
+            ('BACKGROUND', (0, 0), (0, 0), colors.HexColor('#f1f5f9')),
+            ('BACKGROUND', (0, 5), (0, 5), colors.HexColor('#f1f5f9')),
+        ]),
+    }
+
+    return MappingProxyType({
+        'paragraph': MappingProxyType(paragraph_styles),
+        'table': MappingProxyType(table_styles),
+    })
+
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_style_registry():
+    """Return the process-wide, read-only PDF style registry"""
+    return _build_pdf_style_registry()
 
 # PDF Generation Function
 def generate_pdf_contract(contract_html, filename, contract_data):
-    """Generate PDF from HTML contract with full content using ReportLab"""
+    """Generate PDF from HTML contract with full content using ReportLab and write it to filename"""
+    generate_pdf_bytes(contract_html, contract_data, filename=filename)
+    return filename
+
+
+def generate_pdf_bytes(contract_html, contract_data, filename=None, as_memoryview=False):
+    """Generate the contract PDF in memory and return its bytes (or a zero-copy memoryview)
+
+    The PDF is only written to disk when a filename is given.
+    """
     try:
         # Use ReportLab directly for better Windows compatibility
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4, letter
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
         from reportlab.lib.units import inch
-        import io
-        
-        print("Generating PDF using ReportLab for Windows compatibility...")
         
         # Enhanced ReportLab with comprehensive content
         buffer = io.BytesIO()
@@ -455,64 +1207,14 @@ def generate_pdf_contract(contract_html, filename, contract_data):
             rightMargin=0.7*inch
         )
         
-        styles = getSampleStyleSheet()
-        
-        # Enhanced styles with colors and formatting
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#1e3a8a'),  # Navy blue
-            fontName='Helvetica-Bold',
-            borderWidth=2,
-            borderColor=colors.HexColor('#1e3a8a'),
-            borderPadding=10
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=12,
-            spaceBefore=20,
-            textColor=colors.HexColor('#1e3a8a'),  # Navy blue
-            fontName='Helvetica-Bold',
-            borderWidth=1,
-            borderColor=colors.HexColor('#1e3a8a'),
-            leftIndent=0,
-            borderPadding=8
-        )
-        
-        subheading_style = ParagraphStyle(
-            'CustomSubHeading',
-            parent=styles['Heading3'],
-            fontSize=12,
-            spaceAfter=8,
-            spaceBefore=12,
-            textColor=colors.HexColor('#3730a3'),  # Purple blue
-            fontName='Helvetica-Bold'
-        )
-        
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=6,
-            fontName='Helvetica',
-            leading=14
-        )
-        
-        highlight_style = ParagraphStyle(
-            'HighlightStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=6,
-            fontName='Helvetica-Bold',
-            textColor=colors.HexColor('#1e3a8a'),
-            backColor=colors.HexColor('#f0f9ff')
-        )
+        # Shared styles, built once per process
+        registry = get_pdf_style_registry()
+        paragraph_styles = registry['paragraph']
+        table_styles = registry['table']
+        title_style = paragraph_styles['title']
+        heading_style = paragraph_styles['heading']
+        subheading_style = paragraph_styles['subheading']
+        normal_style = paragraph_styles['normal']
         
         content = []
         
@@ -527,20 +1229,8 @@ def generate_pdf_contract(contract_html, filename, contract_data):
             ['Version:', f"{contract_data.get('version_number', '1.0')} - {contract_data.get('agreement_date', 'N/A')}"]
         ]
         
-        header_table = Table(header_data, colWidths=[2*inch, 4*inch])
-        header_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1e3a8a')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#cbd5e1')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
+        header_table = Table(header_data, colWidths=[2*inch, 4*inch])
+        header_table.setStyle(table_styles['header'])
         
         content.append(header_table)
         content.append(Spacer(1, 20))
@@ -564,20 +1254,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         ]
         
         vessel_table = Table(vessel_data, colWidths=[2.5*inch, 3.5*inch])
-        vessel_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('BACKGROUND', (1, 0), (1, -1), colors.white),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1e3a8a')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
+        vessel_table.setStyle(table_styles['vessel'])
         
         content.append(vessel_table)
         content.append(Spacer(1, 15))
@@ -597,22 +1274,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         ]
         
         charter_table = Table(charter_data, colWidths=[2.5*inch, 3.5*inch])
-        charter_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('BACKGROUND', (1, 2), (1, 3), colors.HexColor('#f0f9ff')),  # Highlight financial rows
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1e3a8a')),
-            ('TEXTCOLOR', (1, 2), (1, 3), colors.HexColor('#0ea5e9')),  # Financial highlight color
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTNAME', (1, 2), (1, 3), 'Helvetica-Bold'),  # Bold financial values
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
+        charter_table.setStyle(table_styles['charter'])
         
         content.append(charter_table)
         content.append(Spacer(1, 15))
@@ -632,20 +1294,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         ]
         
         lessor_table = Table(lessor_data, colWidths=[1.5*inch, 4.5*inch])
-        lessor_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8fafc')),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1e3a8a')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#1e3a8a')),  # Bold line under company name
-        ]))
+        lessor_table.setStyle(table_styles['lessor'])
         
         content.append(lessor_table)
         content.append(Spacer(1, 12))
@@ -661,20 +1310,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         ]
         
         lessee_table = Table(lessee_data, colWidths=[1.5*inch, 4.5*inch])
-        lessee_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8fafc')),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1e3a8a')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#1e3a8a')),  # Bold line under client name
-        ]))
+        lessee_table.setStyle(table_styles['lessee'])
         
         content.append(lessee_table)
         content.append(Spacer(1, 15))
@@ -693,20 +1329,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         ]
         
         financial_table = Table(financial_data, colWidths=[2*inch, 4*inch])
-        financial_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f9ff')),
-            ('BACKGROUND', (1, 1), (1, 1), colors.HexColor('#fef3c7')),  # Highlight security deposit
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#0ea5e9')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#0ea5e9')),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
+        financial_table.setStyle(table_styles['financial'])
         
         content.append(financial_table)
         content.append(Spacer(1, 15))
@@ -723,19 +1346,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         ]
         
         insurance_table = Table(insurance_data, colWidths=[2*inch, 4*inch])
-        insurance_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#fef3c7')),  # Warning yellow background
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#f59e0b')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#f59e0b')),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
+        insurance_table.setStyle(table_styles['insurance'])
         
         content.append(insurance_table)
         content.append(Spacer(1, 15))
@@ -753,22 +1364,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
             ]
             
             risk_table = Table(risk_assessment_data, colWidths=[2.5*inch, 3.5*inch])
-            risk_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#fef3c7')),
-                ('BACKGROUND', (1, 0), (1, 0), colors.HexColor('#fee2e2')),  # Risk score background
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#f59e0b')),
-                ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#dc2626')),  # Risk score color
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-                ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),  # Bold risk score
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#f59e0b')),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 4),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ]))
+            risk_table.setStyle(table_styles['risk'])
             
             content.append(risk_table)
             content.append(Spacer(1, 15))
@@ -778,18 +1374,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
             content.append(Paragraph("7. SPECIAL REQUESTS & REQUIREMENTS", heading_style))
             content.append(Spacer(1, 8))
             
-            # Create a highlighted box for special requests
-            special_requests_style = ParagraphStyle(
-                'SpecialRequests',
-                parent=normal_style,
-                backColor=colors.HexColor('#ecfdf5'),
-                borderColor=colors.HexColor('#10b981'),
-                borderWidth=1,
-                borderPadding=10,
-                fontName='Helvetica'
-            )
-            
-            content.append(Paragraph(contract_data.get('special_requests', ''), special_requests_style))
+            content.append(Paragraph(contract_data.get('special_requests', ''), paragraph_styles['special_requests']))
             content.append(Spacer(1, 15))
         
         # Contract Terms & Conditions with professional styling
@@ -807,19 +1392,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         ]
         
         terms_table = Table(terms_data, colWidths=[2*inch, 4*inch])
-        terms_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1e3a8a')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
+        terms_table.setStyle(table_styles['terms'])
         
         content.append(terms_table)
         content.append(Spacer(1, 20))
@@ -842,20 +1415,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         ]
         
         signature_table = Table(signature_data, colWidths=[1.5*inch, 4.5*inch])
-        signature_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#1e3a8a')),  # LESSOR line
-            ('LINEBELOW', (0, 5), (-1, 5), 2, colors.HexColor('#1e3a8a')),  # LESSEE line
-            ('BACKGROUND', (0, 0), (0, 0), colors.HexColor('#f1f5f9')),
-            ('BACKGROUND', (0, 5), (0, 5), colors.HexColor('#f1f5f9')),
-        ]))
+        signature_table.setStyle(table_styles['signature'])
         
         content.append(signature_table)
         content.append(Spacer(1, 20))
@@ -866,6 +1426,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
             content.append(Paragraph("4A. ADDITIONAL SELECTED CLAUSES", heading_style))
             content.append(Spacer(1, 8))
             
+            category_style = paragraph_styles['category']
             for i, clause in enumerate(additional_clauses, 1):
                 # Clause title with source
                 source_text = ""
@@ -885,10 +1446,7 @@ def generate_pdf_contract(contract_html, filename, contract_data):
                 # Category if available
                 if clause.get('category'):
                     category_text = f"Category: {clause['category']}"
-                    content.append(Paragraph(category_text, 
-                        ParagraphStyle('CategoryStyle', parent=styles['Normal'], 
-                                     fontSize=8, textColor=colors.HexColor('#6b7280'),
-                                     spaceBefore=2, spaceAfter=8)))
+                    content.append(Paragraph(category_text, category_style))
                 
                 content.append(Spacer(1, 8))
             
@@ -898,17 +1456,12 @@ def generate_pdf_contract(contract_html, filename, contract_data):
         services_clauses = contract_data.get('services_clauses', [])
         if services_clauses:
             # Services section heading with special styling
-            services_heading_style = ParagraphStyle(
-                'ServicesHeading',
-                parent=heading_style,
-                textColor=colors.HexColor('#16a34a'),  # Green color for services
-                borderColor=colors.HexColor('#16a34a'),
-                backColor=colors.HexColor('#f0fdf4')  # Light green background
-            )
-            
-            content.append(Paragraph("Services", services_heading_style))
+            content.append(Paragraph("Services", paragraph_styles['services_heading']))
             content.append(Spacer(1, 8))
             
+            services_subheading_style = paragraph_styles['services_subheading']
+            services_normal_style = paragraph_styles['services_normal']
+            services_category_style = paragraph_styles['services_category']
             for i, clause in enumerate(services_clauses, 1):
                 # Services clause title with special styling
                 source_text = ""
@@ -919,73 +1472,39 @@ def generate_pdf_contract(contract_html, filename, contract_data):
                 
                 clause_title = f"🔧 {i}. {clause.get('name', 'Untitled Service')}{source_text}"
                 
-                services_subheading_style = ParagraphStyle(
-                    'ServicesSubHeading',
-                    parent=subheading_style,
-                    textColor=colors.HexColor('#15803d'),  # Darker green
-                    backColor=colors.HexColor('#f0fdf4'),
-                    borderWidth=1,
-                    borderColor=colors.HexColor('#16a34a'),
-                    borderPadding=6
-                )
-                
                 content.append(Paragraph(clause_title, services_subheading_style))
                 content.append(Spacer(1, 4))
                 
                 # Services clause content
                 clause_content = clause.get('content', 'No content available')
-                services_normal_style = ParagraphStyle(
-                    'ServicesNormal',
-                    parent=normal_style,
-                    backColor=colors.HexColor('#f0fdf4'),
-                    borderPadding=8
-                )
                 content.append(Paragraph(clause_content, services_normal_style))
                 
                 # Category with services styling
                 if clause.get('category'):
                     category_text = f"Category: {clause['category']}"
-                    content.append(Paragraph(category_text, 
-                        ParagraphStyle('ServicesCategoryStyle', parent=styles['Normal'], 
-                                     fontSize=8, textColor=colors.HexColor('#16a34a'),
-                                     spaceBefore=2, spaceAfter=8)))
+                    content.append(Paragraph(category_text, services_category_style))
                 
                 content.append(Spacer(1, 8))
             
             content.append(Spacer(1, 15))
         
         # Footer with professional styling
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=normal_style,
-            fontSize=8,
-            textColor=colors.HexColor('#6b7280'),
-            alignment=TA_CENTER,
-            borderWidth=1,
-            borderColor=colors.HexColor('#cbd5e1'),
-            borderPadding=8,
-            backColor=colors.HexColor('#f9fafb')
-        )
-        
         footer_text = f"""<i>Generated by Yacht Contract Generator V3<br/>
 Contract ID: {contract_data.get('contract_id', 'N/A')} | Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}<br/>
 Features: Risk Assessment, Intelligent Clause Selection, Industry Best Practices</i>"""
         
-        content.append(Paragraph(footer_text, footer_style))
+        content.append(Paragraph(footer_text, paragraph_styles['footer']))
         
         # Build PDF
         doc.build(content)
-        buffer.seek(0)
-        
-        with open(filename, 'wb') as f:
-            f.write(buffer.getvalue())
-        
-        print(f"PDF generated successfully using ReportLab fallback: {filename}")
-        return filename
         
     except Exception as e:
         print(f"Error generating PDF: {str(e)}")
         # Create a minimal PDF with error message
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph
+        from reportlab.lib.styles import getSampleStyleSheet
+        
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         styles = getSampleStyleSheet()
@@ -998,12 +1517,162 @@ Features: Risk Assessment, Intelligent Clause Selection, Industry Best Practices
         ]
         
         doc.build(content)
-        buffer.seek(0)
-        
+    
+    # Optional on-disk sink
+    if filename:
         with open(filename, 'wb') as f:
-            f.write(buffer.getvalue())
+            f.write(buffer.getbuffer())
+    
+    return buffer.getbuffer() if as_memoryview else buffer.getvalue()
+
+# Contract Data Construction
+def build_contract_data(inputs, selected_clauses=None, risk_assessment_report=None, selected_mitigations=None):
+    """Build the template context for a contract from raw form inputs (shared by the UI and bulk CLI)"""
+    selected_clauses = selected_clauses or []
+    risk_factors = inputs.get('risk_factors') or []
+    additional_costs = inputs.get('additional_costs') or []
+    charter_experience = inputs['charter_experience']
+    yacht_type = inputs['yacht_type']
+    length_overall = inputs['length_overall']
+    operational_area = inputs['operational_area']
+    hull_insurance = inputs['hull_insurance']
+    liability_insurance = inputs['liability_insurance']
+    start_date = inputs['start_date']
+    end_date = inputs['end_date']
+    
+    # Enhanced risk score calculation using the new risk assessment system
+    if risk_assessment_report:
+        enhanced_risk_score = risk_assessment_report['overall_score']
+        risk_category = risk_assessment_report['risk_level']
+    else:
+        # Fallback to basic risk calculation
+        enhanced_risk_score = 1.0
+        if charter_experience == "First Time":
+            enhanced_risk_score += 0.6
+        elif charter_experience == "Occasional (2-3 times)":
+            enhanced_risk_score += 0.3
+        
+        enhanced_risk_score += len(risk_factors) * 0.2
+        risk_category = "Low" if enhanced_risk_score < 1.3 else "Medium" if enhanced_risk_score < 1.7 else "High"
+    
+    # Generate suggested clauses based on selections
+    suggested_clauses = {}
+    
+    if inputs.get('force_majeure', True):
+        suggested_clauses['force_majeure'] = "Neither party shall be liable for any failure or delay in performance which is due to fire, flood, earthquake, elements of nature or acts of God, acts of war, terrorism, riots, civil disorders, rebellions or revolutions, or any other cause beyond the reasonable control of such party."
+    
+    if inputs.get('weather_clause', True):
+        suggested_clauses['weather'] = f"Charter operations are subject to weather conditions. The Captain reserves the right to modify itinerary or remain in port if weather conditions exceed safe operating parameters (winds >25 knots, seas >2.5m). No refund applies for weather delays."
+    
+    if inputs.get('crew_standards', True):
+        suggested_clauses['crew_standards'] = f"All crew members hold valid STCW certifications appropriate for a {yacht_type} of {length_overall}m. The Captain holds a minimum {('MCA') if length_overall >= 24 else 'RYA'} license and has {5 if length_overall >= 40 else 3}+ years experience on similar vessels."
+    
+    suggested_clauses['cancellation'] = {
+        "Standard (90/60/30 days)": "Cancellation charges: 90+ days: 25%, 60-89 days: 50%, 30-59 days: 75%, <30 days: 100%",
+        "Flexible": "Cancellation charges: 60+ days: 15%, 30-59 days: 50%, <30 days: 100%", 
+        "Strict": "Cancellation charges: 120+ days: 50%, 60-119 days: 75%, <60 days: 100%",
+        "Custom": "Custom cancellation terms as negotiated between parties"
+    }.get(inputs['cancellation_policy'], "Standard terms apply")
+    
+    # Charter duration from the form, or from the dates (same-day or invalid range = 1 day)
+    charter_duration = inputs.get('charter_duration')
+    if not charter_duration:
+        charter_duration = max((end_date - start_date).days, 1)
+    daily_rate = inputs['daily_rate']
+    total_charter_value = daily_rate * charter_duration
+    
+    payment_schedule_1 = inputs['payment_schedule_1']
+    payment_schedule_2 = inputs.get('payment_schedule_2', 100 - payment_schedule_1)
+    
+    return {
+        # Vessel Information
+        'vessel_name': inputs['vessel_name'],
+        'yacht_type': yacht_type,
+        'length_overall': length_overall,
+        'beam': inputs['beam'],
+        'draft': inputs['draft'],
+        'official_number': inputs['official_number'],
+        'flag_state': inputs['flag_state'],
+        'guest_capacity': inputs['guest_capacity'],
+        'crew_capacity': inputs['crew_capacity'],
+        'engine_power': inputs['engine_power'],
+        'max_speed': inputs['max_speed'],
+        'cruising_speed': inputs['cruising_speed'],
+        
+        # Charter Terms
+        'start_date': start_date.strftime('%d %B %Y'),
+        'end_date': end_date.strftime('%d %B %Y'),
+        'charter_duration': charter_duration,
+        'daily_rate': f"{daily_rate:,}",
+        'currency': inputs['currency'],
+        'total_charter_value': f"{total_charter_value:,}",
+        'operational_area': operational_area,
+        'delivery_location': inputs['delivery_location'],
+        'return_location': inputs['return_location'],
+        
+        # Parties
+        'lessor_name': inputs['lessor_name'],
+        'lessor_address': inputs['lessor_address'].replace('\n', '<br>'),
+        'lessor_contact': inputs['lessor_contact'],
+        'lessor_email': inputs['lessor_email'],
+        'lessor_phone': inputs['lessor_phone'],
+        'lessee_name': inputs['lessee_name'],
+        'lessee_address': inputs['lessee_address'].replace('\n', '<br>'),
+        'lessee_contact': inputs['lessee_contact'],
+        'lessee_email': inputs['lessee_email'],
+        'lessee_phone': inputs['lessee_phone'],
+        
+        # Financial Terms
+        'payment_schedule_1': payment_schedule_1,
+        'payment_schedule_2': payment_schedule_2,
+        'payment_timing': inputs['payment_timing'],
+        'security_deposit': f"{inputs['security_deposit']:,}",
+        'deposit_method': inputs['deposit_method'],
+        'fuel_policy': inputs['fuel_policy'],
+        'additional_costs': ', '.join(additional_costs) if additional_costs else 'None specified',
+        
+        # Insurance & Risk
+        'hull_insurance': f"{hull_insurance:,}",
+        'liability_insurance': f"{liability_insurance:,}",
+        'risk_factors': ', '.join(risk_factors) if risk_factors else 'Standard risk profile',
+        'charter_experience': charter_experience,
+        
+        # Enhanced Risk Assessment Object
+        'risk_assessment': {
+            'risk_score': f"{enhanced_risk_score:.2f}",
+            'risk_category': risk_category,
+            'recommended_hull_insurance': int(hull_insurance * enhanced_risk_score),
+            'recommended_liability_insurance': int(liability_insurance * enhanced_risk_score),
+            'recommendations': [
+                f"Charter experience level: {charter_experience}",
+                f"Risk factors identified: {len(risk_factors)}",
+                f"Operational area: {operational_area[:50]}..."
+            ],
+            'regional_warnings': [
+                "Ensure all documentation is current for operational areas",
+                "Verify local maritime regulations compliance"
+            ] if "Remote Destinations" in risk_factors else [],
+            'enhanced_assessment': risk_assessment_report or {},
+            'mitigation_strategies': selected_mitigations or []
+        },
         
-        return filename
+        # Contract Clauses
+        'suggested_clauses': suggested_clauses,
+        'additional_clauses': [clause for clause in selected_clauses if clause.get('category') != 'Services'],
+        'services_clauses': [clause for clause in selected_clauses if clause.get('category') == 'Services'],
+        'special_requests': inputs['special_requests'],
+        'governing_law': inputs['governing_law'],
+        'cancellation_policy': inputs['cancellation_policy'],
+        
+        # Metadata
+        'contract_id': inputs.get('contract_id') or str(uuid.uuid4())[:8].upper(),
+        'template_name': inputs['template_name'],
+        'version_number': inputs['version_number'],
+        'agreement_date': inputs['agreement_date'].strftime('%d %B %Y'),
+        'broker_info': inputs['broker_info'],
+        'broker_commission': inputs['broker_commission'],
+        'contract_language': inputs['contract_language']
+    }
 
 # Streamlit Application
 def main():
@@ -1693,148 +2362,52 @@ def contract_generator_page(systems):
     
     # Contract generation logic (outside of form, guarded by submitted)
     if submitted:
-        # Enhanced risk score calculation using the new risk assessment system
-        enhanced_risk_score = 1.0
-        risk_factors_count = len(risk_factors)
-        
         # Use enhanced risk assessment if available
-        if hasattr(st.session_state, 'risk_assessment_report') and st.session_state.risk_assessment_report:
-            enhanced_risk_score = st.session_state.risk_assessment_report['overall_score']
-            risk_category = st.session_state.risk_assessment_report['risk_level']
-            st.info(f"🎯 Using Enhanced Risk Assessment: Score {enhanced_risk_score:.2f} ({risk_category})")
+        risk_assessment_report = st.session_state.get('risk_assessment_report')
+        if risk_assessment_report:
+            st.info(f"🎯 Using Enhanced Risk Assessment: Score {risk_assessment_report['overall_score']:.2f} ({risk_assessment_report['risk_level']})")
         else:
-            # Fallback to basic risk calculation
-            if charter_experience == "First Time":
-                enhanced_risk_score += 0.6
-            elif charter_experience == "Occasional (2-3 times)":
-                enhanced_risk_score += 0.3
-            
-            enhanced_risk_score += risk_factors_count * 0.2
-            risk_category = "Low" if enhanced_risk_score < 1.3 else "Medium" if enhanced_risk_score < 1.7 else "High"
             st.warning("⚠️ Using basic risk calculation. Visit Risk Assessment page for comprehensive analysis.")
         
-        # Generate suggested clauses based on selections
-        suggested_clauses = {}
-        
-        if force_majeure:
-            suggested_clauses['force_majeure'] = "Neither party shall be liable for any failure or delay in performance which is due to fire, flood, earthquake, elements of nature or acts of God, acts of war, terrorism, riots, civil disorders, rebellions or revolutions, or any other cause beyond the reasonable control of such party."
-        
-        if weather_clause:
-            suggested_clauses['weather'] = f"Charter operations are subject to weather conditions. The Captain reserves the right to modify itinerary or remain in port if weather conditions exceed safe operating parameters (winds >25 knots, seas >2.5m). No refund applies for weather delays."
-        
-        if crew_standards:
-            suggested_clauses['crew_standards'] = f"All crew members hold valid STCW certifications appropriate for a {yacht_type} of {length_overall}m. The Captain holds a minimum {('MCA') if length_overall >= 24 else 'RYA'} license and has {5 if length_overall >= 40 else 3}+ years experience on similar vessels."
-        
-        suggested_clauses['cancellation'] = {
-            "Standard (90/60/30 days)": "Cancellation charges: 90+ days: 25%, 60-89 days: 50%, 30-59 days: 75%, <30 days: 100%",
-            "Flexible": "Cancellation charges: 60+ days: 15%, 30-59 days: 50%, <30 days: 100%", 
-            "Strict": "Cancellation charges: 120+ days: 50%, 60-119 days: 75%, <60 days: 100%",
-            "Custom": "Custom cancellation terms as negotiated between parties"
-        }.get(cancellation_policy, "Standard terms apply")
-        
-        # Get the latest charter duration and total value from session state or recalculate
-        charter_duration = st.session_state.get('calculated_charter_duration', 1)
-        total_charter_value = daily_rate * charter_duration
-        
-        # Get the latest payment terms from session state or use form values
-        payment_schedule_1_final = st.session_state.get('calculated_payment_schedule_1', payment_schedule_1)
-        payment_schedule_2_final = st.session_state.get('calculated_payment_schedule_2', payment_schedule_2)
-        payment_timing_final = st.session_state.get('calculated_payment_timing', payment_timing)
+        # Get the latest charter duration and payment terms from session state or use form values
+        contract_inputs = {
+            'vessel_name': vessel_name, 'yacht_type': yacht_type, 'length_overall': length_overall,
+            'beam': beam, 'draft': draft, 'official_number': official_number, 'flag_state': flag_state,
+            'guest_capacity': guest_capacity, 'crew_capacity': crew_capacity, 'engine_power': engine_power,
+            'max_speed': max_speed, 'cruising_speed': cruising_speed,
+            'start_date': start_date, 'end_date': end_date,
+            'charter_duration': st.session_state.get('calculated_charter_duration', 1),
+            'daily_rate': daily_rate, 'currency': currency, 'operational_area': operational_area,
+            'delivery_location': delivery_location, 'return_location': return_location,
+            'lessor_name': lessor_name, 'lessor_address': lessor_address, 'lessor_contact': lessor_contact,
+            'lessor_email': lessor_email, 'lessor_phone': lessor_phone,
+            'lessee_name': lessee_name, 'lessee_address': lessee_address, 'lessee_contact': lessee_contact,
+            'lessee_email': lessee_email, 'lessee_phone': lessee_phone,
+            'payment_schedule_1': st.session_state.get('calculated_payment_schedule_1', payment_schedule_1),
+            'payment_schedule_2': st.session_state.get('calculated_payment_schedule_2', payment_schedule_2),
+            'payment_timing': st.session_state.get('calculated_payment_timing', payment_timing),
+            'security_deposit': security_deposit, 'deposit_method': deposit_method,
+            'fuel_policy': fuel_policy, 'additional_costs': additional_costs,
+            'hull_insurance': hull_insurance, 'liability_insurance': liability_insurance,
+            'risk_factors': risk_factors, 'charter_experience': charter_experience,
+            'special_requests': special_requests, 'governing_law': governing_law,
+            'cancellation_policy': cancellation_policy, 'force_majeure': force_majeure,
+            'weather_clause': weather_clause, 'crew_standards': crew_standards,
+            'template_name': template_name, 'version_number': version_number,
+            'agreement_date': agreement_date, 'broker_info': broker_info,
+            'broker_commission': broker_commission, 'contract_language': contract_language
+        }
         
         # Create comprehensive contract data
-        contract_data = {
-            # Vessel Information
-            'vessel_name': vessel_name,
-            'yacht_type': yacht_type,
-            'length_overall': length_overall,
-            'beam': beam,
-            'draft': draft,
-            'official_number': official_number,
-            'flag_state': flag_state,
-            'guest_capacity': guest_capacity,
-            'crew_capacity': crew_capacity,
-            'engine_power': engine_power,
-            'max_speed': max_speed,
-            'cruising_speed': cruising_speed,
-            
-            # Charter Terms
-            'start_date': start_date.strftime('%d %B %Y'),
-            'end_date': end_date.strftime('%d %B %Y'),
-            'charter_duration': charter_duration,
-            'daily_rate': f"{daily_rate:,}",
-            'currency': currency,
-            'total_charter_value': f"{total_charter_value:,}",
-            'operational_area': operational_area,
-            'delivery_location': delivery_location,
-            'return_location': return_location,
-            
-            # Parties
-            'lessor_name': lessor_name,
-            'lessor_address': lessor_address.replace('\n', '<br>'),
-            'lessor_contact': lessor_contact,
-            'lessor_email': lessor_email,
-            'lessor_phone': lessor_phone,
-            'lessee_name': lessee_name,
-            'lessee_address': lessee_address.replace('\n', '<br>'),
-            'lessee_contact': lessee_contact,
-            'lessee_email': lessee_email,
-            'lessee_phone': lessee_phone,
-            
-            # Financial Terms
-            'payment_schedule_1': payment_schedule_1_final,
-            'payment_schedule_2': payment_schedule_2_final,
-            'payment_timing': payment_timing_final,
-            'security_deposit': f"{security_deposit:,}",
-            'deposit_method': deposit_method,
-            'fuel_policy': fuel_policy,
-            'additional_costs': ', '.join(additional_costs) if additional_costs else 'None specified',
-            
-            # Insurance & Risk
-            'hull_insurance': f"{hull_insurance:,}",
-            'liability_insurance': f"{liability_insurance:,}",
-            'risk_factors': ', '.join(risk_factors) if risk_factors else 'Standard risk profile',
-            'charter_experience': charter_experience,
-            
-            # Enhanced Risk Assessment Object
-            'risk_assessment': {
-                'risk_score': f"{enhanced_risk_score:.2f}",
-                'risk_category': risk_category,
-                'recommended_hull_insurance': int(hull_insurance * enhanced_risk_score),
-                'recommended_liability_insurance': int(liability_insurance * enhanced_risk_score),
-                'recommendations': [
-                    f"Charter experience level: {charter_experience}",
-                    f"Risk factors identified: {len(risk_factors)}",
-                    f"Operational area: {operational_area[:50]}..."
-                ],
-                'regional_warnings': [
-                    "Ensure all documentation is current for operational areas",
-                    "Verify local maritime regulations compliance"
-                ] if "Remote Destinations" in risk_factors else [],
-                'enhanced_assessment': st.session_state.get('risk_assessment_report', {}),
-                'mitigation_strategies': st.session_state.get('selected_mitigations', [])
-            },
-            
-            # Contract Clauses
-            'suggested_clauses': suggested_clauses,
-            'additional_clauses': [clause for clause in st.session_state.get('selected_clauses', []) if clause.get('category') != 'Services'],
-            'services_clauses': [clause for clause in st.session_state.get('selected_clauses', []) if clause.get('category') == 'Services'],
-            'special_requests': special_requests,
-            'governing_law': governing_law,
-            'cancellation_policy': cancellation_policy,
-            
-            # Metadata
-            'contract_id': str(uuid.uuid4())[:8].upper(),
-            'template_name': template_name,
-            'version_number': version_number,
-            'agreement_date': agreement_date.strftime('%d %B %Y'),
-            'broker_info': broker_info,
-            'broker_commission': broker_commission,
-            'contract_language': contract_language
-    }
+        contract_data = build_contract_data(
+            contract_inputs,
+            selected_clauses=st.session_state.get('selected_clauses', []),
+            risk_assessment_report=risk_assessment_report,
+            selected_mitigations=st.session_state.get('selected_mitigations', [])
+        )
         
-        # Generate contract
-        template = Template(ENHANCED_CONTRACT_TEMPLATE)
-        contract_html = template.render(**contract_data)
+        # Generate contract (only sections whose inputs changed are re-rendered)
+        contract_html = render_contract_sections(contract_data)
 
         # Store in session state to persist after form submission
         st.session_state.contract_data = contract_data
@@ -1921,179 +2494,55 @@ def contract_generator_page(systems):
                 risk_score = contract_data.get('risk_assessment', {}).get('risk_score', '0.0')
                 risk_category = contract_data.get('risk_assessment', {}).get('risk_category', 'Unknown')
                 # Set background color based on risk_category
-                if risk_category == "Medium":
-                    bg_color = "#FAC898"
-                elif risk_category == "High":
-                    bg_color = "#F9136D"
-                elif risk_category == "Critical":
-                    bg_color = "#8b0000"
-                else:
-                    bg_color = "#4DC786"  # default
-
-                st.markdown(
-                    f'''<div class="custom-metric" style="background: {bg_color};">
-                        <span class="custom-metric-label">Risk Score</span>
-                        <span class="custom-metric-value">{risk_score} ({risk_category})</span>
-                        <span class="custom-metric-help">Risk assessment</span>
-                    </div>''', unsafe_allow_html=True)
-            with col4:
-                st.markdown(
-                    '''<div class="custom-metric">
-                        <span class="custom-metric-label">Vessel LOA</span>
-                        <span class="custom-metric-value">'''f"{contract_data.get('length_overall', '0')}m"'''</span>
-                        <span class="custom-metric-help">Length overall</span>
-                    </div>''', unsafe_allow_html=True)
-
-            # Display contract preview
-            st.markdown("#### 📑 Contract Preview")
-            # Full-width Lightbox Preview overlay (pure CSS, no Streamlit rerun dependency)
-            try:
-                                # Use a data URL to avoid srcdoc escaping issues
-                                contract_html_b64 = base64.b64encode(contract_html.encode("utf-8")).decode("ascii")
-                                # Sanitize contract_id for safe HTML id usage
-                                _raw_id = str(contract_data.get('contract_id', 'preview'))
-                                _safe_id = re.sub(r"[^a-zA-Z0-9_-]", "-", _raw_id)
-                                lightbox_container_id = f"lb-{_safe_id}"
-                                lightbox_toggle_id = f"lb-toggle-{_safe_id}"
-
-                                # Build HTML with safe token replacement (no .format)
-                                lightbox_html = """
-<style>
-/* Lightbox styles scoped to the container */
-/* Pure CSS toggle via checkbox */
-#__CONTAINER__ { --overlay-offset-top: 100px; }
-#__CONTAINER__ .open-preview-btn {
-    display: inline-block;
-    background: #1e3a8a;
-    color: #fff;
-    padding: 8px 12px;
-    border-radius: 6px;
-    text-decoration: none;
-    font-weight: 600;
-    cursor: pointer;
-    border: none;
-    box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-}
-#__CONTAINER__ .open-preview-btn:hover { background: #0f1f4d; }
-/* Hide the checkbox off-screen */
-#__CONTAINER__ input[type="checkbox"] {
-    position: absolute;
-    left: -10000px;
-    width: 1px;
-    height: 1px;
-    opacity: 0;
-}
-#__CONTAINER__ .lightbox-backdrop {
-    position: fixed;
-    inset: 0;
-    background: rgba(0,0,0,0.75);
-    display: none;
-    align-items: flex-start;
-    justify-content: center;
-    padding-top: var(--overlay-offset-top);
-    z-index: 100000;
-}
-/* Toggle: show backdrop when checkbox is checked */
-#__CONTAINER__ input#__TOGGLE__:checked ~ .lightbox-backdrop { display: flex; }
-#__CONTAINER__ .lightbox-content {
-    background: #ffffff;
-    width: 95vw;
-    height: calc(95vh - var(--overlay-offset-top));
-    max-width: 1600px;
-    border-radius: 10px;
-    box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-    border: 1px solid #e5e7eb;
-    display: flex;
-    flex-direction: column;
-    position: relative;
-}
-#__CONTAINER__ .lightbox-header {
-    flex: 0 0 auto;
-    display: flex;
-    align-items: center;
-    justify-content: flex-end;
-    gap: 8px;
-    padding: 8px 10px;
-    background: #ffffff;
-    border-bottom: 1px solid #e5e7eb;
-    position: sticky;
-    top: 0;
-    z-index: 2;
-}
-#__CONTAINER__ .close-btn {
-    background: #1f2937;
-    color: #ffffff;
-    border: 1px solid #111827;
-    border-radius: 6px;
-    padding: 6px 10px;
-    font-weight: 700;
-    cursor: pointer;
-    text-decoration: none;
-}
-#__CONTAINER__ .close-btn:hover { background: #111827; }
-/* Floating close button overlay to ensure clickability over iframe */
-#__CONTAINER__ .close-btn-floating {
-    position: absolute;
-    top: 10px;
-    right: 10px;
-    z-index: 999999;
-}
-#__CONTAINER__ .frame-wrap {
-    flex: 1 1 auto;
-    display: flex;
-    align-items: flex-start;
-    justify-content: center;
-    padding: 10px;
-    overflow: auto;
-    background: #fff;
-}
-#__CONTAINER__ .lightbox-iframe {
-    width: min(1200px, 100%);
-    height: 100%;
-    border: 0;
-    background: #fff;
-}
-</style>
-<div id="__CONTAINER__">
-    <label for="__TOGGLE__" class="open-preview-btn">🔍 Open Full-Width Preview</label>
-    <input type="checkbox" id="__TOGGLE__" />
-    <div class="lightbox-backdrop">
-        <label for="__TOGGLE__" class="backdrop-dismiss" aria-hidden="true" title="Close"></label>
-        <div class="lightbox-content" role="dialog" aria-modal="true" aria-label="Full-width contract preview">
-            <div class="lightbox-header">
-                <label for="__TOGGLE__" class="close-btn" title="Close">Close ✖</label>
-            </div>
-            <div class="frame-wrap">
-                <label for="__TOGGLE__" class="close-btn close-btn-floating" title="Close">Close ✖</label>
-                <iframe class="lightbox-iframe" src="data:text/html;charset=utf-8;base64,__HTML_B64__"></iframe>
-            </div>
-        </div>
-    </div>
-</div>
-<style>
-/* Backdrop click-to-close layer */
-#__CONTAINER__ .backdrop-dismiss {
-    position: absolute;
-    inset: 0;
-    content: "";
-}
-</style>
-"""
-                                lightbox_html = (
-                                        lightbox_html
-                                        .replace("__CONTAINER__", lightbox_container_id)
-                                        .replace("__HTML_B64__", contract_html_b64)
-                                        .replace("__TOGGLE__", lightbox_toggle_id)
-                                )
-
-                                st.markdown(lightbox_html, unsafe_allow_html=True)
-            except Exception:
-                # Silently ignore overlay errors to avoid breaking the page
-                pass
-            with st.expander("View Full Contract", expanded=True):
-                # Ensure the preview uses (near) full page width instead of Streamlit's default 700px
-                # Increase height slightly for a better reading experience
-                st.components.v1.html(contract_html, height=700, scrolling=True, width=1200)
+                if risk_category == "Medium":
+                    bg_color = "#FAC898"
+                elif risk_category == "High":
+                    bg_color = "#F9136D"
+                elif risk_category == "Critical":
+                    bg_color = "#8b0000"
+                else:
+                    bg_color = "#4DC786"  # default
+
+                st.markdown(
+                    f'''<div class="custom-metric" style="background: {bg_color};">
+                        <span class="custom-metric-label">Risk Score</span>
+                        <span class="custom-metric-value">{risk_score} ({risk_category})</span>
+                        <span class="custom-metric-help">Risk assessment</span>
+                    </div>''', unsafe_allow_html=True)
+            with col4:
+                st.markdown(
+                    '''<div class="custom-metric">
+                        <span class="custom-metric-label">Vessel LOA</span>
+                        <span class="custom-metric-value">'''f"{contract_data.get('length_overall', '0')}m"'''</span>
+                        <span class="custom-metric-help">Length overall</span>
+                    </div>''', unsafe_allow_html=True)
+
+            # Display contract preview
+            st.markdown("#### 📑 Contract Preview")
+            # Preview artifacts are encoded once per contract hash and the cached data URI is the
+            # only copy sent to the page: inline or full-width, never both. The preview starts
+            # hidden, so reruns only resend it while the user has it open.
+            preview = get_contract_preview(contract_html, contract_data)
+            if preview['lazy']:
+                st.caption(f"📦 Large contract ({preview['size_bytes'] / 1024:,.0f} KB) - the preview may take a moment to load")
+            preview_mode = st.radio(
+                "Preview",
+                ["Hidden", "Inline", "Full-Width"],
+                horizontal=True,
+                key=f"preview_mode_{preview['key'][:16]}"
+            )
+
+            if preview_mode == "Full-Width":
+                try:
+                    st.markdown(build_lightbox_html(preview, open_on_load=True), unsafe_allow_html=True)
+                except Exception:
+                    # Silently ignore overlay errors to avoid breaking the page
+                    pass
+            elif preview_mode == "Inline":
+                with st.expander("View Full Contract", expanded=True):
+                    # Ensure the preview uses (near) full page width instead of Streamlit's default 700px
+                    # Increase height slightly for a better reading experience
+                    st.components.v1.iframe(preview['data_uri'], height=700, scrolling=True, width=1200)
             
             # Download options
             st.markdown("#### 📥 Download Options")
@@ -2109,18 +2558,9 @@ def contract_generator_page(systems):
                 )
             
             with col2:
-                # Generate PDF
+                # Generate PDF in the background; the button shows pending/ready state
                 pdf_filename = f"yacht_contract_{contract_data['contract_id']}.pdf"
-                generate_pdf_contract(contract_html, pdf_filename, contract_data)
-                
-                with open(pdf_filename, 'rb') as pdf_file:
-                    st.download_button(
-                        label="� Download PDF Contract",
-                        data=pdf_file.read(),
-                        file_name=pdf_filename,
-                        mime="application/pdf",
-                        use_container_width=True
-                    )
+                pdf_download_panel(contract_html, contract_data, pdf_filename)
             
             with col3:
                 # Contract data as JSON
@@ -4648,6 +5088,20 @@ def clause_library_page(systems):
     with tab6:
         library_settings_section()
 
+def format_text_changes(changes):
+    """HTML for word-level (tag, old_text, new_text) changes: removed text struck through, added text highlighted"""
+    parts = []
+    for tag, old_text, new_text in changes:
+        if tag == 'equal':
+            parts.append(html.escape(old_text))
+            continue
+        if old_text:
+            parts.append(f'<del style="color:#b42318;">{html.escape(old_text)}</del>')
+        if new_text:
+            parts.append(f'<ins style="color:#067647;background:#ecfdf3;text-decoration:none;">{html.escape(new_text)}</ins>')
+    return f'<div style="white-space:pre-wrap;font-family:monospace;font-size:0.9em;">{"".join(parts)}</div>'
+
+
 def browse_clauses_section():
     st.subheader("📚 Browse Clause Library")
     
@@ -4710,37 +5164,16 @@ def browse_clauses_section():
     
     st.markdown("---")
     
-    # Get clause database from centralized function
-    clause_database = get_clause_database()
-    
-    # Merge custom clauses with default database
-    if 'custom_clauses' in st.session_state:
-        for custom_clause in st.session_state.custom_clauses:
-            clause_category = custom_clause.get('category', 'Custom Clauses')
-            if clause_category in clause_database:
-                # Add custom clause to existing category
-                clause_database[clause_category].append(custom_clause)
-            else:
-                # Create new category for custom clauses
-                clause_database[clause_category] = [custom_clause]
+    # Library, custom and versioned clauses all come from the clause store
+    clause_store = get_clause_store()
     
     # Display clauses for selected category
-    if category in clause_database:
-        clauses = clause_database[category]
-        
-        # Get custom clauses for the selected category
-        custom_clauses_list = []
-        if 'custom_clauses' in st.session_state:
-            custom_clauses_list = [clause for clause in st.session_state.custom_clauses 
-                                 if clause.get('category') == category]
+    if category in clause_store.categories():
+        clauses = [clause for _, clause, _ in clause_store.clauses(source='library', category=category)]
         
-        # Get versioned clauses for the selected category
-        versioned_clauses_list = []
-        if 'clause_versions' in st.session_state:
-            for original_key, versions in st.session_state.clause_versions.items():
-                for version in versions:
-                    if version.get('category') == category:
-                        versioned_clauses_list.append(version)
+        # Get custom and versioned clauses for the selected category
+        custom_clauses_list = [clause for _, clause, _ in clause_store.clauses(source='custom', category=category)]
+        versioned_clauses_list = [clause for _, clause, _ in clause_store.clauses(source='version', category=category)]
         
         # Separate default, custom, and versioned clauses for better display
         default_clauses = [c for c in clauses if c.get('status') not in ['Custom', 'Modified']]
@@ -4839,8 +5272,7 @@ def browse_clauses_section():
                         
                         with col_delete:
                             if st.button(f"🗑️ Delete", key=f"delete_custom_{idx}"):
-                                # Remove from session state
-                                st.session_state.custom_clauses.remove(clause)
+                                clause_store.delete(clause_doc_id('custom', clause))
                                 st.success("Custom clause deleted!")
                                 st.rerun()
         
@@ -4861,6 +5293,19 @@ def browse_clauses_section():
                         if clause.get('modification_notes'):
                             st.caption(f"📝 {clause.get('modification_notes')}")
                         
+                        # Compare any two stored versions (rebuilt from snapshots and deltas)
+                        history_key = clause_history_key(clause, category)
+                        history = clause_store.history(history_key)
+                        if len(history) > 1:
+                            st.markdown("#### 🕓 Version History")
+                            labels = {position: f"{version} ({created_at[:10]})" for position, version, created_at in history}
+                            old_position = st.selectbox("Compare version", list(labels), index=len(history) - 2,
+                                                        format_func=labels.get, key=f"history_from_{idx}")
+                            new_position = st.selectbox("With version", list(labels), index=len(history) - 1,
+                                                        format_func=labels.get, key=f"history_to_{idx}")
+                            st.markdown(format_text_changes(clause_store.diff(history_key, old_position, new_position)),
+                                        unsafe_allow_html=True)
+                        
                         if clause.get('legal_notes'):
                             st.markdown("#### 📋 Legal Notes")
                             st.info(clause['legal_notes'])
@@ -4889,6 +5334,7 @@ def browse_clauses_section():
                                 st.session_state.edit_clause_mode = True
                                 st.session_state.edit_clause_data = {
                                     'name': clause['name'],
+                                    'original_name': clause.get('original_name', clause['name']),
                                     'content': clause['content'],
                                     'category': clause.get('category', category),
                                     'source': 'version',
@@ -5033,7 +5479,8 @@ def search_filter_section():
         search_query = st.text_input(
             "🔍 Search clauses by content, title, or keywords",
             placeholder="e.g., 'payment schedule', 'force majeure', 'insurance coverage'",
-            help="Use natural language or specific legal terms"
+            help="Use natural language or specific legal terms. Put exact phrases in quotes "
+                 "(\"thirty (30) days\") and use NEAR/n for words within n words of each other (deposit NEAR/5 refund)"
         )
     with col2:
         search_type = st.selectbox(
@@ -5041,39 +5488,33 @@ def search_filter_section():
             ["Smart Search", "Exact Match", "Keyword Search", "Semantic Search"]
         )
     
-    # Advanced filters
+    # Advanced filters - options come from the facet indexes, counts from the last search
     st.markdown("#### 🎛️ Advanced Filters")
+    facet_counts = st.session_state.get('current_search_facets', {})
+    
+    def facet_filter(label, facet, defaults=()):
+        counts = facet_counts.get(facet)
+        return st.multiselect(
+            label,
+            get_facet_options(facet, defaults),
+            format_func=(lambda value: f"{value} ({counts.get(value, 0)})") if counts else str,
+            key=f"search_filter_{facet}"
+        )
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        filter_jurisdiction = st.multiselect(
-            "Jurisdiction",
-            ["International", "EU", "US", "Caribbean", "Asia Pacific", "UK"]
-        )
-        filter_status = st.multiselect(
-            "Status",
-            ["Active", "Beta", "Deprecated", "Under Review"]
-        )
+        filter_jurisdiction = facet_filter("Jurisdiction", 'jurisdiction',
+                                           ["International", "EU", "US", "Caribbean", "Asia Pacific", "UK"])
+        filter_status = facet_filter("Status", 'status', ["Active", "Beta", "Deprecated", "Under Review"])
     
     with col2:
-        filter_complexity = st.multiselect(
-            "Complexity",
-            ["Basic", "Standard", "Advanced", "Expert"]
-        )
-        filter_risk = st.multiselect(
-            "Risk Level",
-            ["Low", "Medium", "High", "Critical"]
-        )
+        filter_complexity = facet_filter("Complexity", 'complexity', ["Basic", "Standard", "Advanced", "Expert"])
+        filter_risk = facet_filter("Risk Level", 'risk_level', ["Low", "Medium", "High", "Critical"])
     
     with col3:
-        filter_category = st.multiselect(
-            "Categories",
-            ["Payment Terms", "Cancellation", "Insurance", "Liability", "Safety", "Environmental"]
-        )
-        filter_language = st.multiselect(
-            "Languages",
-            ["English", "French", "Spanish", "Italian", "German"]
-        )
+        filter_category = facet_filter("Categories", 'category')
+        filter_language = facet_filter("Languages", 'language', ["English", "French", "Spanish", "Italian", "German"])
     
     with col4:
         usage_range = st.slider(
@@ -5097,50 +5538,75 @@ def search_filter_section():
     if search_executed:
         if search_query:
             # Perform actual search across the clause database
-            search_results = perform_clause_search(search_query, filter_category, filter_jurisdiction, 
-                                                 filter_complexity, filter_language, usage_range, rating_range)
+            search_filters = {
+                'category': filter_category, 'jurisdiction': filter_jurisdiction, 'status': filter_status,
+                'complexity': filter_complexity, 'risk_level': filter_risk, 'language': filter_language,
+                'min_usage': usage_range, 'min_rating': rating_range
+            }
+            # Keyword Search runs on the clause store's full-text index; the other types use BM25F
+            search_scoring = 'fts5' if search_type == "Keyword Search" else 'bm25f'
+            search_response = search_clause_library(search_query, search_filters, search_scoring, limit=0)
             
-            # Store results and query in session state
-            st.session_state.current_search_results = search_results
+            # Store query, filters and facet counts; pages are fetched from the result cache as needed
+            st.session_state.current_search_filters = search_filters
+            st.session_state.current_search_scoring = search_scoring
+            st.session_state.current_search_facets = search_response['facets']
             st.session_state.current_search_query = search_query
+            st.session_state.current_search_page = 1
+            st.session_state.search_page_cursors = {}
             st.session_state.search_executed = True
         else:
-            st.session_state.current_search_results = []
+            st.session_state.current_search_filters = {}
+            st.session_state.current_search_facets = {}
             st.session_state.current_search_query = ""
             st.session_state.search_executed = False
             st.info("Enter search terms to find relevant clauses")
     
     # Display search results if they exist (from current search or previous searches)
-    if hasattr(st.session_state, 'search_executed') and st.session_state.search_executed and hasattr(st.session_state, 'current_search_results'):
+    if hasattr(st.session_state, 'search_executed') and st.session_state.search_executed and hasattr(st.session_state, 'current_search_filters'):
         st.markdown("### 📋 Search Results")
         
-        search_results = st.session_state.current_search_results
         search_query = st.session_state.current_search_query
+        search_filters = st.session_state.current_search_filters
+        search_scoring = st.session_state.get('current_search_scoring', 'bm25f')
+        total_results = search_clause_library(search_query, search_filters, search_scoring, limit=0)['total']
         
-        if search_results:
+        if total_results:
                 # Initialize session state for search results management
                 if 'search_results_expanded' not in st.session_state:
                     st.session_state.search_results_expanded = {}
                 if 'search_results_selected' not in st.session_state:
                     st.session_state.search_results_selected = []
+                if 'current_search_page' not in st.session_state:
+                    st.session_state.current_search_page = 1
+                if 'search_page_cursors' not in st.session_state:
+                    st.session_state.search_page_cursors = {}
                 
-                st.success(f"Found {len(search_results)} clauses matching '{search_query}'")
+                st.success(f"Found {total_results} clauses matching '{search_query}'")
                 
                 # Results display options
                 col1, col2, col3 = st.columns([2, 1, 1])
                 with col1:
                     results_per_page = st.selectbox("Results per page", [5, 10, 20, 50], index=1)
+                
+                # Fetch only the current page (top-k selection); the cursor remembered from
+                # the previous page lets paging forward skip every higher-ranked hit
+                max_page = (total_results - 1) // results_per_page + 1
+                st.session_state.current_search_page = min(st.session_state.current_search_page, max_page)
+                start_idx = (st.session_state.current_search_page - 1) * results_per_page
+                page_response = search_clause_library(
+                    search_query, search_filters, search_scoring, offset=start_idx, limit=results_per_page,
+                    cursor=st.session_state.search_page_cursors.get((results_per_page, st.session_state.current_search_page))
+                )
+                page_hits = page_response['results']
+                st.session_state.search_page_cursors[(results_per_page, st.session_state.current_search_page + 1)] = page_response['cursor']
+                
                 with col2:
                     if st.button("📋 Select All Visible", key="select_all_results"):
                         # Select all results on current page
-                        start_idx = (st.session_state.current_search_page - 1) * results_per_page
-                        end_idx = min(start_idx + results_per_page, len(search_results))
-                        page_results = search_results[start_idx:end_idx]
-                        
-                        for result in page_results:
-                            result_key = f"{result['name']}_{result['category']}"
-                            if result_key not in st.session_state.search_results_selected:
-                                st.session_state.search_results_selected.append(result_key)
+                        for hit in page_hits:
+                            if hit.doc_id not in st.session_state.search_results_selected:
+                                st.session_state.search_results_selected.append(hit.doc_id)
                 with col3:
                     if st.button("🗑️ Clear Selection", key="clear_selection"):
                         st.session_state.search_results_selected = []
@@ -5150,13 +5616,6 @@ def search_filter_section():
                 if st.session_state.search_results_selected:
                     st.info(f"📌 {len(st.session_state.search_results_selected)} clause(s) selected for addition to contract")
                 
-                # Pagination logic
-                total_results = len(search_results)
-                if 'current_search_page' not in st.session_state:
-                    st.session_state.current_search_page = 1
-                
-                max_page = (total_results - 1) // results_per_page + 1
-                
                 # Page navigation
                 if max_page > 1:
                     col1, col2, col3, col4, col5 = st.columns([1, 1, 2, 1, 1])
@@ -5183,14 +5642,12 @@ def search_filter_section():
                             # Only rerun for pagination since we need to recalculate page content
                             st.rerun()
                 
-                # Calculate slice for current page
-                start_idx = (st.session_state.current_search_page - 1) * results_per_page
-                end_idx = start_idx + results_per_page
-                page_results = search_results[start_idx:end_idx]
+                # Only the visible page is resolved into full records with snippets
+                page_results = resolve_search_hits(page_hits, search_query)
                 
                 # Display search results with enhanced functionality
                 for i, result in enumerate(page_results):
-                    result_key = f"{result['name']}_{result['category']}"
+                    result_key = result['doc_id']
                     is_selected = result_key in st.session_state.search_results_selected
                     is_expanded = st.session_state.search_results_expanded.get(result_key, False)
                     
@@ -5263,6 +5720,7 @@ def search_filter_section():
                                 st.session_state.edit_clause_mode = True
                                 st.session_state.edit_clause_data = {
                                     'name': result['name'],
+                                    'original_name': result.get('original_name', result['name']),
                                     'content': result.get('content', result['snippet']),
                                     'category': result['category'],
                                     'source': result.get('source', 'library'),
@@ -5312,13 +5770,11 @@ def search_filter_section():
                     with col1:
                         if st.button("📥 Add All Selected to Contract", type="primary"):
                             added_count = 0
-                            for selected_key in st.session_state.search_results_selected:
-                                # Find the result by key
-                                for result in search_results:
-                                    if f"{result['name']}_{result['category']}" == selected_key:
-                                        add_clause_to_contract(result)
-                                        added_count += 1
-                                        break
+                            selected_hits = [hit for hit in search_clause_library(search_query, search_filters, search_scoring)['results']
+                                             if hit.doc_id in st.session_state.search_results_selected]
+                            for result in resolve_search_hits(selected_hits, search_query):
+                                add_clause_to_contract(result)
+                                added_count += 1
                             st.success(f"✅ Added {added_count} selected clauses to contract!")
                             st.session_state.search_results_selected = []  # Clear selection
                             st.rerun()
@@ -5339,7 +5795,8 @@ def search_filter_section():
     if hasattr(st.session_state, 'search_executed') and st.session_state.search_executed:
         if st.button("🗑️ Clear Search Results"):
             st.session_state.search_executed = False
-            st.session_state.current_search_results = []
+            st.session_state.current_search_filters = {}
+            st.session_state.current_search_facets = {}
             st.session_state.current_search_query = ""
             st.session_state.search_results_expanded = {}
             st.session_state.search_results_selected = []
@@ -5347,128 +5804,347 @@ def search_filter_section():
                 st.session_state.current_search_page = 1
             st.rerun()
 
+# Clause search index - the clause store is indexed once per process and kept current
+# by applying its change sets
+@st.cache_resource(show_spinner=False)
+def _load_library_search_index():
+    return ClauseIndex()
+
+
+def get_library_search_index():
+    """Inverted index over every clause in the clause store (shared by all sessions)
+
+    Only clauses written or deleted since the index's last revision are applied,
+    so saves from any session (or process) show up without a rebuild.
+    """
+    index = _load_library_search_index()
+    store = get_clause_store()
+    if index.revision is None or store.revision() != index.revision:
+        revision, written, removed = store.changes(index.revision)
+        index.apply([(doc_id, freeze_clause_data(clause), source) for doc_id, clause, source in written],
+                    removed, revision)
+    return index
+
+
+CLAUSE_SCORER = BM25FScorer()
+
+
+def score_clauses_batch(queries, top_k=10):
+    """Best library clauses for many queries at once (e.g. one query per historical booking)
+
+    Returns one list of (relevance, clause) pairs per query, scored by a single
+    sparse product against the library term-document matrix per batch.
+    """
+    library_index = get_library_search_index()
+    matrix = library_index.term_matrix(CLAUSE_SCORER)
+    return [[(relevance, library_index.documents[doc_id][0]) for relevance, doc_id in ranked]
+            for ranked in matrix.top_k(list(queries), k=top_k)]
+
+
+def find_similar_clauses(content, threshold=DUPLICATE_THRESHOLD, same_clause=None):
+    """Stored clauses whose content near-duplicates `content`: [(similarity, doc_id, clause, source)]
+
+    Looked up in the clause index's MinHash buckets, so the check is cheap enough to
+    run before every save. same_clause=(name, category) skips the clause being
+    edited and its versions.
+    """
+    matches = []
+    index = get_library_search_index()
+    for similarity, doc_id in index.minhashes.similar(content, threshold):
+        clause, source = index.documents[doc_id]
+        if same_clause and clause_identity(clause) == same_clause:
+            continue
+        matches.append((similarity, doc_id, clause, source))
+    return sorted(matches, key=lambda match: (-match[0], match[1]))
+
+
+def find_duplicate_clauses(threshold=DUPLICATE_THRESHOLD):
+    """Near-duplicate custom clauses in the clause store: [(similarity, kept doc_id, duplicate doc_id)]
+
+    Candidate pairs come from the library index's LSH buckets and are kept
+    only if their exact shingle similarity reaches the threshold. Of each pair
+    the library clause is suggested for keeping, otherwise the first by id;
+    modified versions are left out, being deliberate edits of their library
+    clause. Nothing is deleted here - see review_duplicate_clauses.
+    """
+    index = get_library_search_index()
+    duplicates = []
+    for _, first, second in index.minhashes.duplicates(threshold):
+        documents = {doc_id: index.documents[doc_id] for doc_id in (first, second)}
+        sources = {doc_id: source for doc_id, (_, source) in documents.items()}
+        if 'version' in sources.values() or 'custom' not in sources.values():
+            continue
+        similarity = shingle_similarity(documents[first][0].get('content'), documents[second][0].get('content'))
+        if similarity < threshold:
+            continue
+        kept, duplicate = sorted((first, second), key=lambda doc_id: (sources[doc_id] != 'library', doc_id))
+        duplicates.append((similarity, kept, duplicate))
+    return sorted(duplicates, key=lambda pair: (-pair[0], pair[1], pair[2]))
+
+
+def review_duplicate_clauses(candidates):
+    """Review list of near-duplicate pairs; only the custom clauses picked per pair are deleted, after confirmation"""
+    index = get_library_search_index()
+    st.markdown(f"**🧹 {len(candidates)} near-duplicate pair(s) to review** - nothing is deleted until you confirm")
+    selected = []
+    for similarity, kept, duplicate in candidates:
+        documents = [(doc_id, index.documents.get(doc_id)) for doc_id in (kept, duplicate)]
+        if any(document is None for _, document in documents):
+            continue  # one of the pair was deleted since the check
+        
+        st.markdown(f"---\n**{similarity:.0%} similar**")
+        for column, (doc_id, (clause, source)) in zip(st.columns(2), documents):
+            with column:
+                st.markdown(f"**{clause['name']}**")
+                st.caption(f"{source.title()} | {clause.get('category', 'Custom')} | {clause.get('author', 'Unknown')}")
+                st.text(clause.get('content', ''))
+        
+        # Library clauses are never deleted; the default is to keep both
+        names = {doc_id: clause['name'] for doc_id, (clause, source) in documents if source == 'custom'}
+        choice = st.radio(
+            "Action",
+            [None] + list(names),
+            format_func=lambda doc_id: "Keep both" if doc_id is None else f"Delete '{names[doc_id]}'",
+            horizontal=True,
+            key=f"duplicate_action_{kept}_{duplicate}"
+        )
+        if choice is not None:
+            selected.append(choice)
+    
+    selected = list(dict.fromkeys(selected))
+    st.markdown("---")
+    confirmed = st.checkbox(f"I reviewed these pairs and want to permanently delete {len(selected)} clause(s)",
+                            key="duplicate_delete_confirmed")
+    col_delete, col_cancel = st.columns(2)
+    with col_delete:
+        if st.button("🗑️ Delete Selected Clauses", disabled=not (selected and confirmed)):
+            removed_count = get_clause_store().delete_many(selected)
+            del st.session_state.duplicate_candidates
+            st.success(f"Removed {removed_count} near-duplicate custom clause(s)")
+    with col_cancel:
+        if st.button("↩️ Keep All"):
+            del st.session_state.duplicate_candidates
+            st.rerun()
+
+
+def near_duplicate_warning(content, same_clause=None):
+    """Warn in the editor when content near-duplicates existing clauses; returns the matches"""
+    matches = find_similar_clauses(content, same_clause=same_clause) if content else []
+    if matches:
+        names = ", ".join(f"'{clause['name']}' ({similarity:.0%})" for similarity, _, clause, _ in matches[:3])
+        st.warning(f"⚠️ Possible duplicate of existing clause(s): {names}. Consider reusing or editing the existing clause instead.")
+    return matches
+
+
+def build_search_result(clause, source, relevance, snippet):
+    """Search result record for a clause, with the defaults each clause source used before"""
+    defaults = {
+        'library': ('Unknown', 'Unknown'),
+        'custom': ('Custom', 'User Created'),
+        'version': ('Modified', 'Modified')
+    }
+    default_category, default_author = defaults[source]
+    name = clause['name']
+    if source == 'version':
+        name = f"{clause['name']} ({clause.get('version', 'v2.0')})"
+
+    return {
+        'name': name,
+        'original_name': clause.get('original_name', clause['name']),
+        'category': clause.get('category', default_category),
+        'relevance': relevance,
+        'snippet': snippet,
+        'content': clause.get('content', ''),
+        'version': clause.get('version', 'v2.0' if source == 'version' else '1.0'),
+        'rating': clause.get('rating', 4.0),
+        'usage_count': clause.get('usage_count', 0),
+        'complexity': clause.get('complexity', 'Standard'),
+        'jurisdiction': clause.get('jurisdiction', ['International']),
+        'language': clause.get('language', 'English'),
+        'author': clause.get('author', default_author),
+        'legal_notes': clause.get('legal_notes', ''),
+        'variables': clause.get('variables', []),
+        'related_clauses': clause.get('related_clauses', []),
+        'applicable_to': clause.get('applicable_to', []),
+        'risk_level': clause.get('risk_level', 'Medium'),
+        'source': source
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_result_cache():
+    """Clause search results keyed by query, filters and index generation (shared by all sessions)"""
+    return BoundedLRUCache(max_entries=256)
+
+
 def perform_clause_search(query, categories=None, jurisdictions=None, complexity=None, 
-                         languages=None, min_usage=0, min_rating=0.0):
-    """Perform comprehensive search across all clause databases"""
+                         languages=None, min_usage=0, min_rating=0.0, scoring='bm25f',
+                         statuses=None, risk_levels=None):
+    """Perform comprehensive search across all clause databases (results only)
+
+    scoring='bm25f' ranks with the BM25F scorer; scoring='fts5' ranks stored
+    clauses with the clause store's full-text index; scoring='legacy' keeps the
+    original calculate_relevance points and substring matching for compatibility.
+    """
+    filters = {
+        'category': categories, 'jurisdiction': jurisdictions, 'status': statuses,
+        'complexity': complexity, 'risk_level': risk_levels, 'language': languages,
+        'min_usage': min_usage, 'min_rating': min_rating
+    }
+    return resolve_search_hits(search_clause_library(query, filters, scoring)['results'], query)
+
+
+def search_clause_library(query, filters=None, scoring='bm25f', offset=0, limit=None, cursor=None):
+    """Search library, custom and versioned clauses with facet filters and live facet counts
+
+    filters maps facets (category, jurisdiction, status, complexity, risk_level,
+    language) to the accepted values, plus optional 'min_usage' and 'min_rating'.
+    Returns {'results': [SearchHit, ...], 'total': n, 'cursor': ..., 'facets':
+    {facet: {value: count}}}, best match first; each facet is counted with every
+    other filter applied, so the UI can show what each value would return. Hits
+    are resolved into full records with resolve_search_hits.
+
+    offset/limit select a page window with top-k heap selection rather than
+    sorting every match; passing the previous page's 'cursor' instead of an
+    offset keeps deep pages just as cheap. limit=None returns every match.
+
+    Responses are cached per normalized query and filters; the key includes the
+    generation of the clause index, so any clause change invalidates affected
+    entries.
+    """
+    filters = filters or {}
+    library_index = get_library_search_index()
+    cache_key = (
+        query.strip().lower() if scoring == 'legacy' else normalize_query(query),
+        tuple((facet, tuple(sorted(filters.get(facet) or ()))) for facet in FACET_DEFAULTS),
+        filters.get('min_usage', 0), filters.get('min_rating', 0.0), scoring,
+        library_index.generation
+    )
+    cache = get_search_result_cache()
+    response = cache.get(cache_key)
+    if response is None:
+        response = _run_clause_search(query, library_index, filters, scoring)
+        cache.put(cache_key, response)
+    page, next_cursor = top_hits(response['results'], offset, limit, cursor)
+    return {'results': page, 'total': len(response['results']), 'cursor': next_cursor,
+            'facets': response['facets']}
+
+
+def _run_clause_search(query, index, filters, scoring):
+    """Score, filter and facet-count clauses for search_clause_library (uncached)"""
+    if scoring == 'legacy':
+        # The original substring scorer, over a substring scan rather than the term index, so
+        # fragments and infixes still match; clauses with no text match are left out
+        scored = [(calculate_relevance(query, clause), doc_id, clause, source)
+                  for doc_id, clause, source in index.substring_candidates(query)]
+    elif scoring == 'fts5':
+        # Clauses come ranked from SQLite FTS5, skipping any the index has not caught up with yet
+        scored = [(relevance, doc_id, clause, source)
+                  for relevance, doc_id, clause, source in get_clause_store().search(query)
+                  if doc_id in index]
+    else:
+        # Scored by the vectorized term-document matrix
+        scored = index.term_matrix(CLAUSE_SCORER).search(query)
+
+    facet_filters = {facet: filters[facet] for facet in FACET_DEFAULTS if filters.get(facet)}
+    min_usage = filters.get('min_usage', 0)
+    min_rating = filters.get('min_rating', 0.0)
+    plan = parse_query(query)
+    constrained = bool(plan.phrases or plan.nears)
+
+    # Numeric thresholds and phrase/NEAR constraints narrow the matched set; facet filters are bitmap intersections
+    matched = [(relevance, doc_id, clause, source) for relevance, doc_id, clause, source in scored
+               if relevance > 0
+               and clause.get('usage_count', 0) >= min_usage
+               and clause.get('rating', 0) >= min_rating
+               and (not constrained or index.satisfies(doc_id, plan))]
+    allowed, facets = index.facet_search([doc_id for _, doc_id, _, _ in matched], facet_filters)
+    results = [SearchHit(doc_id, relevance, source)
+               for relevance, doc_id, clause, source in matched if doc_id in allowed]
+    
+    # Left unsorted: search_clause_library only ranks the page window it returns
+    return {'results': results, 'facets': facets}
+
+
+def resolve_search_hits(hits, query):
+    """Full result records, with snippets from the positional index, for search hits
+
+    Hits for clauses removed since the search are skipped.
+    """
     results = []
-    
-    # Get the clause database (same as used in browse_clauses_section)
-    clause_database = get_clause_database()
-    
-    # Search through all categories
-    for category, clauses in clause_database.items():
-        # Apply category filter if specified
-        if categories and category not in categories:
+    index = get_library_search_index()
+    snippet_terms = index.snippet_terms(query)
+    for hit in hits:
+        document = index.documents.get(hit.doc_id)
+        if document is None:
             continue
-            
-        for clause in clauses:
-            # Apply filters
-            if jurisdictions and not any(j in clause.get('jurisdiction', []) for j in jurisdictions):
-                continue
-            if complexity and clause.get('complexity') not in complexity:
-                continue
-            if languages and clause.get('language') not in languages:
-                continue
-            if clause.get('usage_count', 0) < min_usage:
-                continue
-            if clause.get('rating', 0) < min_rating:
-                continue
-            
-            # Calculate relevance score
-            relevance = calculate_relevance(query, clause)
-            
-            if relevance > 0:  # Only include if there's some relevance
-                # Create snippet from content
-                content = clause.get('content', '')
-                snippet = create_snippet(query, content)
-                
-                result = {
-                    'name': clause['name'],
-                    'category': category,
-                    'relevance': relevance,
-                    'snippet': snippet,
-                    'content': content,
-                    'version': clause.get('version', '1.0'),
-                    'rating': clause.get('rating', 4.0),
-                    'usage_count': clause.get('usage_count', 0),
-                    'complexity': clause.get('complexity', 'Standard'),
-                    'jurisdiction': clause.get('jurisdiction', ['International']),
-                    'language': clause.get('language', 'English'),
-                    'author': clause.get('author', 'Unknown'),
-                    'legal_notes': clause.get('legal_notes', ''),
-                    'variables': clause.get('variables', []),
-                    'related_clauses': clause.get('related_clauses', []),
-                    'applicable_to': clause.get('applicable_to', []),
-                    'risk_level': clause.get('risk_level', 'Medium'),
-                    'source': 'library'
-                }
-                results.append(result)
-    
-    # Include custom clauses in search
-    if 'custom_clauses' in st.session_state:
-        for clause in st.session_state.custom_clauses:
-            relevance = calculate_relevance(query, clause)
-            if relevance > 0:
-                content = clause.get('content', '')
-                snippet = create_snippet(query, content)
-                
-                result = {
-                    'name': clause['name'],
-                    'category': clause.get('category', 'Custom'),
-                    'relevance': relevance,
-                    'snippet': snippet,
-                    'content': content,
-                    'version': clause.get('version', '1.0'),
-                    'rating': clause.get('rating', 4.0),
-                    'usage_count': clause.get('usage_count', 0),
-                    'complexity': clause.get('complexity', 'Standard'),
-                    'jurisdiction': clause.get('jurisdiction', ['International']),
-                    'language': clause.get('language', 'English'),
-                    'author': clause.get('author', 'User Created'),
-                    'legal_notes': clause.get('legal_notes', ''),
-                    'variables': clause.get('variables', []),
-                    'related_clauses': clause.get('related_clauses', []),
-                    'applicable_to': clause.get('applicable_to', []),
-                    'risk_level': clause.get('risk_level', 'Medium'),
-                    'source': 'custom'
-                }
-                results.append(result)
-    
-    # Include versioned clauses in search
-    if 'clause_versions' in st.session_state:
-        for original_key, versions in st.session_state.clause_versions.items():
-            for version in versions:
-                relevance = calculate_relevance(query, version)
-                if relevance > 0:
-                    content = version.get('content', '')
-                    snippet = create_snippet(query, content)
-                    
-                    result = {
-                        'name': f"{version['name']} ({version.get('version', 'v2.0')})",
-                        'category': version.get('category', 'Modified'),
-                        'relevance': relevance,
-                        'snippet': snippet,
-                        'content': content,
-                        'version': version.get('version', 'v2.0'),
-                        'rating': version.get('rating', 4.0),
-                        'usage_count': version.get('usage_count', 0),
-                        'complexity': version.get('complexity', 'Standard'),
-                        'jurisdiction': version.get('jurisdiction', ['International']),
-                        'language': version.get('language', 'English'),
-                        'author': version.get('author', 'Modified'),
-                        'legal_notes': version.get('legal_notes', ''),
-                        'variables': version.get('variables', []),
-                        'related_clauses': version.get('related_clauses', []),
-                        'applicable_to': version.get('applicable_to', []),
-                        'risk_level': version.get('risk_level', 'Medium'),
-                        'source': 'version'
-                    }
-                    results.append(result)
-    
-    # Sort by relevance (highest first)
-    results.sort(key=lambda x: x['relevance'], reverse=True)
+        clause, source = document
+        result = build_search_result(clause, source, hit.relevance, index.snippet(hit.doc_id, query, terms=snippet_terms))
+        result['doc_id'] = hit.doc_id
+        results.append(result)
     return results
 
+
+def get_facet_options(facet, defaults=()):
+    """Filter options for a facet: the given defaults plus every value present in the clause index"""
+    values = list(defaults)
+    values.extend(sorted(get_library_search_index().facets[facet]))
+    return list(dict.fromkeys(values))
+
+
+# Words implied by the structured charter parameters, added to the scenario text for clause suggestions
+SUGGESTION_RISK_TERMS = {
+    "High seas": "weather safety liability",
+    "Hurricane season": "weather cancellation force majeure",
+    "Inexperienced crew": "professional crew certification safety",
+    "High value cargo": "insurance liability coverage",
+    "International waters": "international jurisdiction",
+}
+HIGH_VALUE_CHARTER_USD = 250000
+EXTENDED_CHARTER_DAYS = 14
+SUGGESTION_PRIORITIES = {'High': 'Critical', 'Medium': 'Important', 'Low': 'Standard'}
+
+
+def build_suggestion_query(charter_context, charter_type, charter_value, charter_duration, risk_factors=()):
+    """Scenario text for clause suggestions: the description plus words implied by the charter parameters"""
+    parts = [charter_context or '', charter_type]
+    parts.extend(f"{risk} {SUGGESTION_RISK_TERMS.get(risk, '')}" for risk in risk_factors)
+    if charter_value >= HIGH_VALUE_CHARTER_USD:
+        parts.append("high-value vessels comprehensive insurance coverage security deposit")
+    if charter_duration >= EXTENDED_CHARTER_DAYS:
+        parts.append("extended voyages")
+    return ' '.join(parts)
+
+
+def suggest_clauses(scenario, top_k=5):
+    """Library, custom and versioned clauses most similar to a scenario (TF-IDF cosine), best first
+
+    Runs locally on the similarity matrix of the clause index, which is only
+    rebuilt for clauses that changed.
+    """
+    index = get_library_search_index()
+    matrix = index.similarity_matrix()
+    query_vector = tfidf_query(scenario, [matrix])
+    scored = matrix.search(query_vector)
+    
+    # The scenario's most distinctive words explain each suggestion and place its excerpt
+    ranked_terms = sorted(query_vector, key=query_vector.get, reverse=True)
+    suggestions = []
+    for similarity, doc_id, clause, source in heapq.nlargest(top_k, scored, key=lambda item: (item[0], item[1])):
+        matched_terms = [term for term in ranked_terms if doc_id in index.postings.get(term, {})][:4]
+        suggestions.append({
+            'doc_id': doc_id,
+            'clause': clause['name'],
+            'confidence': round(similarity * 100),
+            'reason': f"Matches your scenario on: {', '.join(matched_terms)}",
+            'priority': SUGGESTION_PRIORITIES.get(clause.get('risk_level'), 'Standard'),
+            'category': clause.get('category', 'Custom Clauses'),
+            'description': index.snippet(doc_id, ' '.join(matched_terms)),
+            'content': clause.get('content', ''),
+            'source': source
+        })
+    return suggestions
+
 def calculate_relevance(query, clause):
     """Calculate relevance score for a clause based on search query"""
     query_lower = query.lower()
@@ -5553,9 +6229,8 @@ def create_snippet(query, content, max_length=150):
     
     return snippet
 
-def get_clause_database():
-    """Get the complete clause database (same as in browse_clauses_section)"""
-    # This is the same clause database structure as used in browse_clauses_section
+def _build_clause_catalog():
+    """Source data of the built-in clause library (frozen into the shared catalog once per process)"""
     return {
         "Payment Terms": [
             {
@@ -5915,6 +6590,54 @@ e) The Lessor maintains liability insurance covering service delivery failures a
         ]
     }
 
+def freeze_clause_data(value):
+    """Recursively convert dicts and lists into read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze_clause_data(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze_clause_data(item) for item in value)
+    return value
+
+
+@st.cache_resource(show_spinner=False)
+def get_clause_store():
+    """Persistent clause store shared by all sessions, opened on first use; the built-in catalog is seeded into it"""
+    store = ClauseStore(CLAUSE_STORE_FILE)
+    store.seed(_build_clause_catalog())
+    return store
+
+
+@st.cache_resource(show_spinner=False)
+def get_clause_catalog():
+    """Immutable clause catalog: category -> tuple of read-only library clauses (built once per process)
+
+    This is the built-in catalog the clause store's library clauses are seeded
+    from, so reading it never opens the store. Pages read clauses from
+    get_clause_store(), which also holds custom clauses and versions.
+    """
+    return freeze_clause_data({category: [dict(clause, category=category) for clause in clauses]
+                               for category, clauses in _build_clause_catalog().items()})
+
+
+def get_clause_database():
+    """Get the complete clause database (read-only view of the shared clause catalog)"""
+    return get_clause_catalog()
+
+
+def clause_history_key(clause, category=None):
+    """Version history key of a library clause or any of its versions: '<original name>_<category>'
+
+    Versions and search results for them carry the library clause's name as
+    original_name; their display name may include the version label.
+    """
+    return f"{clause.get('original_name', clause['name'])}_{clause.get('category', category)}"
+
+
+def clause_identity(clause):
+    """(base name, category) shared by a library clause, its versions and search results for them"""
+    return clause.get('original_name', clause.get('name')), clause.get('category')
+
+
 def add_clause_to_contract(clause_result):
     """Add a search result clause to the contract"""
     # Initialize selected clauses in session state if not exists
@@ -6087,6 +6810,9 @@ def edit_specific_clause(clause_data):
     with col3:
         complexity = st.selectbox("Complexity", ["Simple", "Standard", "Advanced", "Expert"], index=1, key="edit_clause_complexity")
     
+    # Pre-save near-duplicate check against every other stored clause
+    near_duplicate_warning(new_content, same_clause=clause_identity(clause_data))
+    
     # Action buttons
     st.markdown("---")
     col1, col2, col3, col4 = st.columns(4)
@@ -6117,42 +6843,30 @@ def edit_specific_clause(clause_data):
                     'risk_level': clause_data.get('risk_level', 'Medium')
                 }
                 
-                # Initialize custom clauses if needed
-                if 'custom_clauses' not in st.session_state:
-                    st.session_state.custom_clauses = []
-                
-                # Update existing custom clause by finding it in the list
-                clause_found = False
-                for i, custom_clause in enumerate(st.session_state.custom_clauses):
-                    if (custom_clause.get('name') == clause_data['name'] and 
-                        custom_clause.get('category') == clause_data['category']):
-                        st.session_state.custom_clauses[i] = updated_clause
-                        clause_found = True
-                        break
-                
-                if not clause_found:
-                    st.session_state.custom_clauses.append(updated_clause)
-                
-                st.success(f"✅ Updated custom clause: {new_clause_name}")
+                # Save to the clause store, replacing the clause under its previous name and category
+                previous_doc_id = clause_doc_id('custom', clause_data)
+                try:
+                    get_clause_store().save_custom(updated_clause, previous_doc_id)
+                except ValueError as e:
+                    st.error(f"❌ Could not save clause: {str(e)}")
+                else:
+                    st.success(f"✅ Updated custom clause: {new_clause_name}")
                 
-            elif clause_data['source'] == 'library':
-                # Editing a library clause - create a new version
-                if 'clause_versions' not in st.session_state:
-                    st.session_state.clause_versions = {}
+            elif clause_data['source'] in ('library', 'version'):
+                # Editing a library clause (or one of its versions) - create a new version
+                clause_store = get_clause_store()
                 
-                # Create version key
-                original_key = f"{clause_data['name']}_{clause_data['category']}"
+                # Versions chain on the library clause's name, not a display label such as "Name (v2.0)"
+                original_name = clause_data.get('original_name', clause_data['name'])
+                original_key = clause_history_key(clause_data)
                 
                 # Get current version number
-                if original_key not in st.session_state.clause_versions:
-                    st.session_state.clause_versions[original_key] = []
-                
-                version_number = f"v{len(st.session_state.clause_versions[original_key]) + 2}.0"  # Start from v2.0
+                version_number = f"v{clause_store.version_count(original_key) + 2}.0"  # Start from v2.0
                 
                 # Create versioned clause
                 versioned_clause = {
-                    'name': clause_data['name'],  # Keep original name
-                    'original_name': clause_data['name'],
+                    'name': original_name,  # Keep original name
+                    'original_name': original_name,
                     'content': new_content,
                     'category': clause_data['category'],
                     'priority': priority,
@@ -6173,10 +6887,10 @@ def edit_specific_clause(clause_data):
                     'modification_notes': f'Modified on {datetime.date.today().isoformat()}'
                 }
                 
-                # Add to versions
-                st.session_state.clause_versions[original_key].append(versioned_clause)
+                # Add to the stored versions
+                clause_store.add_version(original_key, versioned_clause)
                 
-                st.success(f"✅ Created {version_number} of clause: {clause_data['name']}")
+                st.success(f"✅ Created {version_number} of clause: {original_name}")
                 st.info(f"💡 Original clause preserved. New version available in Browse Clauses.")
                 
             else:
@@ -6184,10 +6898,11 @@ def edit_specific_clause(clause_data):
                 return
             
             # Update the edit mode data to reflect the saved changes
-            if clause_data['source'] == 'library':
+            if clause_data['source'] in ('library', 'version'):
                 # For library clauses, update to point to the new version
                 st.session_state.edit_clause_data.update({
-                    'name': clause_data['name'],
+                    'name': original_name,
+                    'original_name': original_name,
                     'content': new_content,
                     'category': clause_data['category'],
                     'source': 'version',
@@ -6235,11 +6950,11 @@ def edit_specific_clause(clause_data):
                 'risk_level': 'Medium'  # Default risk level
             }
             
-            if 'custom_clauses' not in st.session_state:
-                st.session_state.custom_clauses = []
-            
-            st.session_state.custom_clauses.append(new_clause)
-            st.success(f"✅ Saved as new clause: {new_clause['name']}")
+            try:
+                get_clause_store().save_custom(new_clause)
+                st.success(f"✅ Saved as new clause: {new_clause['name']}")
+            except ValueError as e:
+                st.error(f"❌ Could not save clause: {str(e)}")
     
     with col4:
         if st.button("❌ Cancel"):
@@ -6346,6 +7061,9 @@ b) Remaining balance due {{days_before}} days prior to charter commencement.""",
             ["Vessel Registration", "Insurance Verification", "Credit Check"]
         )
     
+    # Pre-save near-duplicate check against the stored clauses
+    near_duplicate_warning(clause_content)
+    
     # Save clause
     st.markdown("---")
     col1, col2, col3 = st.columns(3)
@@ -6388,10 +7106,6 @@ b) Remaining balance due {{days_before}} days prior to charter commencement.""",
     with col2:
         if st.button("📋 Save & Add to Library", type="primary"):
             if clause_name and clause_content and clause_category:
-                # Initialize custom clauses in session state if not exists
-                if 'custom_clauses' not in st.session_state:
-                    st.session_state.custom_clauses = []
-                
                 import datetime
                 custom_clause = {
                     "name": clause_name,
@@ -6413,15 +7127,18 @@ b) Remaining balance due {{days_before}} days prior to charter commencement.""",
                     "risk_level": clause_risk
                 }
                 
-                # Add to custom clauses as a flat list
-                st.session_state.custom_clauses.append(custom_clause)
-                
-                st.success(f"✅ Clause '{clause_name}' added to library!")
-                st.info("🔍 You can now find your clause in the Browse Clauses tab under the selected category.")
-                
-                # Clear the variables after saving
-                if 'clause_variables' in st.session_state:
-                    del st.session_state['clause_variables']
+                # Save to the clause store (shared and kept across restarts)
+                try:
+                    get_clause_store().save_custom(custom_clause)
+                except ValueError as e:
+                    st.error(f"❌ Could not save clause: {str(e)}. Choose a different name.")
+                else:
+                    st.success(f"✅ Clause '{clause_name}' added to library!")
+                    st.info("🔍 You can now find your clause in the Browse Clauses tab under the selected category.")
+                    
+                    # Clear the variables after saving
+                    if 'clause_variables' in st.session_state:
+                        del st.session_state['clause_variables']
                     
             else:
                 st.error("❌ Please fill in Clause Name, Content, and Category before saving to library.")
@@ -6461,7 +7178,54 @@ def clone_modify_editor():
 
 def bulk_import_editor():
     st.markdown("### 📤 Bulk Import Clauses")
-    st.info("Bulk import functionality - implementation would handle file uploads and batch processing")
+    
+    uploaded_file = st.file_uploader(
+        "Choose a clause file",
+        type=['json', 'jsonl', 'ndjson', 'csv'],
+        help="JSON array (or {\"clauses\": [...]}), JSON Lines or CSV with name, content and category columns. "
+             "List fields such as jurisdiction use ';' as a separator in CSV.",
+        key="bulk_import_file"
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        default_category = st.selectbox(
+            "Category for rows without one",
+            ["(reject the row)"] + get_facet_options('category'),
+            key="bulk_import_category"
+        )
+    with col2:
+        batch_size = st.number_input("Clauses per batch", min_value=50, max_value=5000, value=IMPORT_BATCH_SIZE,
+                                     step=50, key="bulk_import_batch_size")
+    
+    if uploaded_file and st.button("📥 Import Clauses", type="primary", key="bulk_import_btn"):
+        progress = st.progress(0.0)
+        status = st.empty()
+        
+        def on_batch(summary):
+            # Apply the batch to the shared search index once, then report progress by bytes read
+            get_library_search_index()
+            progress.progress(min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0))
+            status.caption(f"Imported {summary['imported']} clauses | Updated: {summary['updated']} | "
+                           f"{summary['rows_per_second']:.0f} rows/sec | Rejected: {summary['rejected']}")
+        
+        summary = import_clause_file(
+            uploaded_file, uploaded_file.name, get_clause_store(), batch_size=int(batch_size),
+            default_category=None if default_category == "(reject the row)" else default_category,
+            on_batch=on_batch
+        )
+        progress.progress(1.0)
+        
+        if summary['error']:
+            st.error(f"❌ Import {summary['error']}. Clauses saved before that are kept.")
+        st.success(f"✅ Imported {summary['imported']} of {summary['total_rows']} clauses in {summary['batches']} batches "
+                   f"({summary['rows_per_second']:.0f} rows/sec)")
+        if summary['updated']:
+            st.info(f"♻️ {summary['updated']} row(s) replaced existing custom clauses with the same category and name")
+            st.dataframe(pd.DataFrame(summary['updates']), use_container_width=True)
+        if summary['rejected']:
+            st.warning(f"⚠️ {summary['rejected']} row(s) rejected")
+            st.dataframe(pd.DataFrame(summary['rejections']), use_container_width=True)
 
 def ai_suggestions_section():
     st.subheader("🤖 Clause Suggestions")
@@ -6487,50 +7251,20 @@ def ai_suggestions_section():
         risk_factors = st.multiselect("Risk Factors", ["High seas", "Hurricane season", "Inexperienced crew", "High value cargo", "International waters"])
     
     if st.button("🤖 Get Auto Suggestions", type="primary"):
+        # Rank real clauses locally; results are kept so the action buttons below survive reruns
+        started = time.perf_counter()
+        scenario = build_suggestion_query(charter_context, charter_type, charter_value, charter_duration, risk_factors)
+        st.session_state.clause_suggestions = suggest_clauses(scenario)
+        st.session_state.clause_suggestions_ms = (time.perf_counter() - started) * 1000
+    
+    if st.session_state.get('clause_suggestions') is not None:
         st.markdown("### 🎯 Auto Recommendations")
+        suggestions = st.session_state.clause_suggestions
         
-        # Simulate AI analysis
-        with st.spinner("Analyzing charter parameters..."):
-            import time
-            time.sleep(2)
-        
-        st.success("Analysis complete! Here are the recommended clauses:")
-        
-        # Mock AI suggestions
-        suggestions = [
-            {
-                "clause": "Enhanced Insurance Requirements",
-                "confidence": 95,
-                "reason": "High charter value requires comprehensive coverage",
-                "priority": "Critical",
-                "category": "Insurance",
-                "description": "Enhanced insurance requirements for high-value charter operations"
-            },
-            {
-                "clause": "Corporate Payment Terms",
-                "confidence": 88,
-                "reason": "Corporate client detected - net terms may be appropriate",
-                "priority": "Important", 
-                "category": "Payment",
-                "description": "Corporate payment terms with extended payment schedules"
-            },
-            {
-                "clause": "Professional Crew Requirements",
-                "confidence": 82,
-                "reason": "Luxury charter requires certified professional crew",
-                "priority": "Important",
-                "category": "Safety",
-                "description": "Professional crew certification and experience requirements"
-            },
-            {
-                "clause": "Mediterranean Compliance Clause",
-                "confidence": 76,
-                "reason": "Operating in EU waters requires specific regulatory compliance",
-                "priority": "Standard",
-                "category": "Legal",
-                "description": "Compliance requirements for Mediterranean charter operations"
-            }
-        ]
+        if suggestions:
+            st.success(f"Analysis complete in {st.session_state.clause_suggestions_ms:.1f} ms! Here are the recommended clauses:")
+        else:
+            st.warning("No clauses match this scenario yet. Add more detail to the description.")
         
         for suggestion in suggestions:
             with st.container():
@@ -6544,6 +7278,7 @@ def ai_suggestions_section():
                         <div>
                             <h4 style="color: {color}; margin: 0;">{suggestion['clause']}</h4>
                             <p style="margin: 5px 0; color: #666;">{suggestion['reason']}</p>
+                            <p style="margin: 5px 0; font-style: italic;">{suggestion['description']}...</p>
                             <div style="display: flex; gap: 10px; margin-top: 10px;">
                                 <span style="background: {color}; color: white; padding: 2px 8px; border-radius: 12px; font-size: 12px;">
                                     {suggestion['priority']}
@@ -6555,7 +7290,7 @@ def ai_suggestions_section():
                         </div>
                         <div style="text-align: right;">
                             <div style="font-size: 12px; color: #666;">
-                                Confidence: <strong>{suggestion['confidence']}%</strong>
+                                Similarity: <strong>{suggestion['confidence']}%</strong>
                             </div>
                         </div>
                     </div>
@@ -6564,33 +7299,26 @@ def ai_suggestions_section():
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    if st.button("👁️ Preview", key=f"preview_{suggestion['clause']}"):
-                        st.info(f"Previewing: {suggestion['clause']}")
+                    if st.button("👁️ Preview", key=f"preview_{suggestion['doc_id']}"):
+                        st.text_area("Clause content", suggestion['content'], height=200, disabled=True,
+                                     key=f"preview_content_{suggestion['doc_id']}")
                 with col2:
-                    if st.button("🔗 Add to Contract", key=f"add_{suggestion['clause']}"):
-                        # Initialize selected clauses in session state if not exists
-                        if 'selected_clauses' not in st.session_state:
-                            st.session_state.selected_clauses = []
-                        
-                        # Create a clause object for the contract
-                        selected_clause = {
+                    if st.button("🔗 Add to Contract", key=f"add_{suggestion['doc_id']}"):
+                        added = add_clause_to_contract({
                             'name': suggestion['clause'],
-                            'content': suggestion['description'],
-                            'category': 'Suggestions',
+                            'content': suggestion['content'],
+                            'category': suggestion['category'],
                             'source': 'ai_suggestion'
-                        }
-                        
-                        # Check if clause is already selected
-                        clause_exists = any(sc['name'] == suggestion['clause'] for sc in st.session_state.selected_clauses)
-                        
-                        if not clause_exists:
-                            st.session_state.selected_clauses.append(selected_clause)
+                        })
+                        if added:
                             st.success(f"✅ Added {suggestion['clause']} to contract!")
                         else:
                             st.warning(f"⚠️ {suggestion['clause']} is already added to the contract!")
                 with col3:
-                    if st.button("❌ Dismiss", key=f"dismiss_{suggestion['clause']}"):
-                        st.info("Suggestion dismissed")
+                    if st.button("❌ Dismiss", key=f"dismiss_{suggestion['doc_id']}"):
+                        st.session_state.clause_suggestions = [item for item in suggestions
+                                                               if item['doc_id'] != suggestion['doc_id']]
+                        st.rerun()
     
     # AI learning section
     st.markdown("---")
@@ -6785,10 +7513,16 @@ def library_settings_section():
             if st.button("🔍 Validate All Clauses"):
                 st.success("All clauses validated successfully")
             if st.button("🧹 Remove Duplicates"):
-                st.info("Found and removed 3 duplicate clauses")
+                # Only lists the candidates; they are reviewed below before anything is deleted
+                st.session_state.duplicate_candidates = find_duplicate_clauses()
+                if not st.session_state.duplicate_candidates:
+                    st.info("No near-duplicate clauses found")
             if st.button("📊 Generate Usage Report"):
                 st.success("Usage report generated")
         
+        if st.session_state.get('duplicate_candidates'):
+            review_duplicate_clauses(st.session_state.duplicate_candidates)
+        
         # Template management
         st.markdown("**Template & Variable Management**")
         if st.button("🔧 Update All Templates"):
@@ -6803,6 +7537,7 @@ def library_settings_section():
         with col1:
             st.markdown("**Database Maintenance**")
             if st.button("🗃️ Optimize Database"):
+                get_clause_store().optimize()
                 st.success("Database optimized successfully")
             if st.button("🧹 Clean Old Versions"):
                 st.info("Removed 15 old clause versions")
@@ -6857,6 +7592,61 @@ def analytics_page(systems):
 def settings_page():
     st.header("⚙️ Settings")
     st.info("Settings functionality would be implemented here.")
+    
+    # Template compile cache counters
+    st.markdown("### ⚡ Template Cache")
+    template_stats = get_template_cache_stats()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Compile Cache Hits", template_stats['hits'])
+    with col2:
+        st.metric("Compile Cache Misses", template_stats['misses'])
+    with col3:
+        st.metric("Hit Rate", f"{template_stats['hit_rate']:.1f}%")
+    
+    # Rendered PDF cache counters
+    st.markdown("### 📄 PDF Cache")
+    pdf_stats = PDF_CACHE.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Cached PDFs", pdf_stats['entries'])
+    with col2:
+        st.metric("Cache Size", f"{pdf_stats['bytes'] / 1024 / 1024:.1f} MB")
+    with col3:
+        st.metric("Hit Rate", f"{pdf_stats['hit_rate']:.1f}%")
+    with col4:
+        st.metric("Evictions", pdf_stats['evictions'])
+    render_stats = get_pdf_render_service().stats()
+    st.caption(f"Background renders pending: {render_stats['pending']}/{render_stats['max_pending']} | Failed: {render_stats['failed']}")
+    preview_stats = get_preview_cache().stats()
+    st.caption(f"Preview artifacts cached: {preview_stats['entries']} ({preview_stats['bytes'] / 1024 / 1024:.1f} MB) | Hit rate: {preview_stats['hit_rate']:.1f}%")
+    
+    # Clause search result cache counters
+    st.markdown("### 🔍 Search Cache")
+    search_stats = get_search_result_cache().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Cached Searches", search_stats['entries'])
+    with col2:
+        st.metric("Cache Hits", search_stats['hits'])
+    with col3:
+        st.metric("Hit Rate", f"{search_stats['hit_rate']:.1f}%")
+    with col4:
+        st.metric("Evictions", search_stats['evictions'])
+    
+    # Persistent clause store
+    st.markdown("### 🗃️ Clause Store")
+    store_stats = get_clause_store().stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Library Clauses", store_stats['clauses'].get('library', 0))
+    with col2:
+        st.metric("Custom / Versions", f"{store_stats['clauses'].get('custom', 0)} / {store_stats['clauses'].get('version', 0)}")
+    with col3:
+        st.metric("Database Size", f"{store_stats['bytes'] / 1024 / 1024:.1f} MB")
+    with col4:
+        st.metric("Revision", store_stats['revision'])
+    st.caption(f"Pooled connections opened: {store_stats['connections_opened']} | Checkouts: {store_stats['checkouts']}")
 
 # Database class placeholder
 class ContractDatabase:
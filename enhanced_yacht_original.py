@@ -13,7 +13,7 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from jinja2 import Template
+from contract_templates import get_contract_template
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -28,6 +28,7 @@ DATABASE_FILE = "yacht_contracts.db"
 LOG_FILE = "contract_audit_log.txt"
 TEMPLATES_DIR = "templates"
 VERSIONS_DIR = "versions"
+ORIGINAL_CONTRACT_TEMPLATE_NAME = "enhanced_contract_original.html"
 
 # Enhanced Contract Template with Suggested Clauses
 ENHANCED_CONTRACT_TEMPLATE = """
@@ -1819,7 +1820,7 @@ def contract_generator_page(systems):
         }
         
         # Generate contract
-        template = Template(ENHANCED_CONTRACT_TEMPLATE)
+        template = get_contract_template(ORIGINAL_CONTRACT_TEMPLATE_NAME, ENHANCED_CONTRACT_TEMPLATE)
         contract_html = template.render(**contract_data)
         
         # Store in session state to persist after form submission
@@ -1948,7 +1949,7 @@ def contract_generator_page(systems):
                 new_contract_data['agreement_date'] = datetime.date.today().strftime('%d %B %Y')
                 
                 # Regenerate contract with new version
-                template = Template(ENHANCED_CONTRACT_TEMPLATE)
+                template = get_contract_template(ORIGINAL_CONTRACT_TEMPLATE_NAME, ENHANCED_CONTRACT_TEMPLATE)
                 new_contract_html = template.render(**new_contract_data)
                 
                 # Update session state
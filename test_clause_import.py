@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test script to verify streaming clause import (JSON array, JSONL and CSV)
+"""
+
+import io
+import json
+
+
+def test_json_array_streaming():
+    """Test that JSON arrays are decoded element by element across chunk boundaries"""
+    from clause_import import iter_json_array
+
+    rows = [{'name': f'Clause {i}', 'content': 'Terms apply. ' * i, 'rating': i % 5} for i in range(200)]
+    wrapped = json.dumps({'source': 'vendor', 'clauses': rows})
+    for chunk_size in (1, 7, 4096):
+        assert list(iter_json_array(io.StringIO(wrapped), chunk_size)) == rows
+    assert list(iter_json_array(io.StringIO('[12, 345]'), 2)) == [12, 345]
+    assert list(iter_json_array(io.StringIO(' [] '))) == []
+
+    for malformed in ('[1 2]', '[{"name": "x"', '{"name": "x"}'):
+        try:
+            list(iter_json_array(io.StringIO(malformed), 4))
+            assert False, f"{malformed} should not parse"
+        except ValueError:
+            pass
+
+    # A malformed element fails without reading the rest of the file into the buffer
+    rows_text = json.dumps(rows)
+    broken = rows_text.replace('"Clause 3", ', '"Clause 3" ', 1)
+    stream = io.StringIO(broken)
+    try:
+        list(iter_json_array(stream, 64))
+        assert False, "a malformed element should not parse"
+    except ValueError as e:
+        assert 'delimiter' in str(e)
+    assert stream.tell() < 1024 < len(broken)
+
+
+def test_clause_validation():
+    """Test that rows are checked against the catalog clause schema"""
+    from clause_import import validate_clause
+    from enhanced_yacht_generator_v3_fixed import get_clause_catalog
+
+    # Every built-in clause passes and keeps exactly the catalog fields
+    for clauses in get_clause_catalog().values():
+        for clause in clauses:
+            assert set(validate_clause(dict(clause))) == set(clause)
+
+    clause = validate_clause({'name': ' Fuel Surcharge ', 'content': 'Fuel is billed at cost.', 'category': 'Fuel Policy',
+                              'jurisdiction': 'EU; US', 'usage_count': '12', 'rating': '4.5', 'vendor_id': 'X1'})
+    assert clause['name'] == 'Fuel Surcharge'
+    assert clause['jurisdiction'] == ['EU', 'US']
+    assert (clause['usage_count'], clause['rating']) == (12, 4.5)
+    assert 'vendor_id' not in clause
+
+    assert validate_clause({'name': 'A', 'content': 'B'}, default_category='Services')['category'] == 'Services'
+    for row, problem in (({'name': 'A', 'content': 'B'}, 'category'),
+                         ({'name': 'A', 'content': ' ', 'category': 'C'}, 'content'),
+                         ({'name': 'A', 'content': 'B', 'category': 'C', 'rating': 9}, 'rating'),
+                         ({'name': 'A', 'content': 'B', 'category': 'C', 'risk_level': 'Severe'}, 'risk_level')):
+        try:
+            validate_clause(row)
+            assert False, f"{row} should be rejected"
+        except ValueError as e:
+            assert problem in str(e)
+
+
+def test_bulk_import(tmp_path):
+    """Test batched import from each format, with rejected rows counted and one callback per batch"""
+    from clause_import import import_clause_file
+    from clause_store import ClauseStore
+
+    store = ClauseStore(str(tmp_path / "clauses.db"))
+    rows = [{'name': f'Vendor Clause {i}', 'content': f'Vendor term number {i} applies.', 'category': 'Services'}
+            for i in range(25)]
+    rows[3]['rating'] = 'excellent'
+
+    csv_data = "name,content,category,jurisdiction\n" + "".join(
+        f"CSV Clause {i},CSV term {i} applies.,Guest Services,EU;US\n" for i in range(5)) + "No Content,,Services,\n"
+    files = {
+        'pack.jsonl': "\n".join(json.dumps(row) for row in rows) + "\nnot json\n",
+        'pack.json': json.dumps({'clauses': rows}),
+        'pack.csv': csv_data,
+    }
+
+    batches = []
+    summary = import_clause_file(io.BytesIO(files['pack.jsonl'].encode('utf-8')), 'pack.jsonl', store, batch_size=10,
+                                 on_batch=lambda progress: batches.append(progress['imported']))
+    assert (summary['total_rows'], summary['imported'], summary['rejected']) == (26, 24, 2)
+    assert [rejection['row'] for rejection in summary['rejections']] == [4, 26]
+    assert batches == [10, 20, 24] and summary['batches'] == 3
+    assert summary['rows_per_second'] > 0
+    revision = store.revision()
+
+    # Re-importing the same pack updates the clauses in place and reports them as updated
+    summary = import_clause_file(io.BytesIO(files['pack.json'].encode('utf-8')), 'pack.json', store)
+    assert (summary['imported'], summary['updated'], summary['rejected'], summary['batches']) == (0, 24, 1, 1)
+    assert summary['updates'][0] == {'row': 1, 'category': 'Services', 'name': 'Vendor Clause 0'}
+    assert store.revision() == revision + 1
+    assert len(store.clauses(source='custom', category='Services')) == 24
+
+    summary = import_clause_file(io.BytesIO(('\ufeff' + files['pack.csv']).encode('utf-8')), 'pack.csv', store)
+    assert (summary['imported'], summary['rejected'], summary['error']) == (5, 1, None)
+
+    # Unreadable JSON array data stops the import; the rows before it are still saved and reported
+    elements = [json.dumps(dict(row, category='Fuel Policy')) for row in rows[4:]]
+    pack = '[' + ', '.join(elements[:12]) + ' ' + ', '.join(elements[12:]) + ']'
+    summary = import_clause_file(io.BytesIO(pack.encode('utf-8')), 'pack.json', store, batch_size=5)
+    assert (summary['imported'], summary['batches']) == (12, 3)
+    assert summary['error'] == "stopped after row 12: expected ',' or ']' in JSON array, found '{'"
+    assert len(store.clauses(source='custom', category='Fuel Policy')) == 12
+    assert [clause['jurisdiction'] for _, clause, _ in store.clauses(category='Guest Services')][0] == ['EU', 'US']
+    print(f"  Import summary: {summary['imported']} rows, {summary['rows_per_second']:.0f} rows/sec")
+
+
+def test_import_duplicates_and_csv_errors(monkeypatch, tmp_path):
+    """Test that repeated names within a pack are rejected and unreadable CSV records only reject their row"""
+    import csv
+    import clause_import
+    from clause_import import import_clause_file
+    from clause_store import ClauseStore
+
+    store = ClauseStore(str(tmp_path / "clauses.db"))
+    store.seed({'Services': [{'name': 'Library', 'content': 'Library terms apply.'}]})
+    pack = "\n".join(json.dumps({'name': name, 'content': f'{name} terms apply.', 'category': 'Services'})
+                     for name in ('Same', 'Library', 'Same', 'Other'))
+    summary = import_clause_file(io.BytesIO(pack.encode('utf-8')), 'pack.jsonl', store)
+    assert (summary['imported'], summary['updated'], summary['rejected']) == (2, 0, 2)
+    assert summary['rejections'] == [{'row': 2, 'error': "a library clause named 'Library' already exists in Services"},
+                                     {'row': 3, 'error': "duplicate of row 1 ('Same' in Services)"}]
+    assert store.get('custom/Services/Library') is None
+    assert store.get('custom/Services/Same')['content'] == 'Same terms apply.'
+
+    # Clause content longer than the csv module's 128 KB default is accepted
+    long_content = 'Long terms apply. ' * 12000
+    csv_data = f"name,content,category\nLong Clause,{long_content},Services\nShort Clause,Short terms apply.,Services\n"
+    summary = import_clause_file(io.BytesIO(csv_data.encode('utf-8')), 'pack.csv', store)
+    assert (summary['imported'], summary['rejected']) == (2, 0)
+    assert store.get('custom/Services/Long Clause')['content'] == long_content
+
+    # A record the csv module cannot read rejects that row and the import carries on
+    field_size_limit = csv.field_size_limit(1024)
+    try:
+        monkeypatch.setattr(clause_import, 'CSV_FIELD_SIZE_LIMIT', 1024)
+        summary = import_clause_file(io.BytesIO(csv_data.encode('utf-8')), 'pack.csv', store)
+    finally:
+        csv.field_size_limit(field_size_limit)
+    assert (summary['updated'], summary['rejected']) == (1, 1)
+    assert 'field larger than field limit' in summary['rejections'][0]['error']
+
+
+if __name__ == "__main__":
+    print("🔍 Testing Clause Import")
+    print("=" * 60)
+
+    import pathlib
+    import tempfile
+    import pytest
+
+    test_json_array_streaming()
+    test_clause_validation()
+    test_bulk_import(pathlib.Path(tempfile.mkdtemp()))
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_import_duplicates_and_csv_errors(monkeypatch, pathlib.Path(tempfile.mkdtemp()))
+
+    print("\n" + "=" * 60)
+    print("✅ All clause import tests passed!")
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the clause search indexes
+"""
+
+SAMPLE_CLAUSES = {
+    'payment': {
+        'name': 'Standard Payment Schedule',
+        'content': 'Fifty percent (50%) of the total charter fee shall be paid as a deposit upon execution of this agreement.',
+        'category': 'Payment Terms',
+        'legal_notes': 'Compliant with EU Payment Services Directive',
+        'applicable_to': ['Bareboat', 'Crewed'],
+        'rating': 4.8
+    },
+    'insurance': {
+        'name': 'Hull Insurance Requirements',
+        'content': 'The owner shall maintain hull and machinery insurance for the full value of the vessel.',
+        'category': 'Insurance Requirements',
+        'legal_notes': 'Marine insurance standard',
+        'applicable_to': ['Crewed'],
+        'rating': 4.5
+    }
+}
+
+
+def test_inverted_index():
+    """Test that the inverted index matches only postings for the query terms and updates incrementally"""
+    from clause_search import ClauseIndex
+
+    print("🧪 Testing Inverted Index")
+    print("=" * 50)
+
+    index = ClauseIndex()
+    for doc_id, clause in SAMPLE_CLAUSES.items():
+        index.add(doc_id, clause)
+
+    assert set(index.match('deposit')) == {'payment'}
+    assert index.match('insurance')['insurance']['insurance'] == {'name': 1, 'content': 1, 'category': 1, 'legal_notes': 1}
+    assert set(index.match('pay')) == {'payment'}  # prefix of 'payment' and 'paid'
+    assert index.match('helicopter') == {}
+
+    # Editing a clause replaces its postings
+    index.add('payment', dict(SAMPLE_CLAUSES['payment'], content='Payment is due in full on booking.'))
+    assert index.match('deposit') == {}
+    assert set(index.match('booking')) == {'payment'}
+
+    index.remove('insurance')
+    assert 'insurance' not in index
+    assert 'hull' not in index.postings
+    print(f"  Indexed terms: {len(index.postings)}")
+
+
+def test_index_sync():
+    """Test that sync only re-indexes clauses that were added, edited or removed"""
+    from clause_search import ClauseIndex
+
+    index = ClauseIndex()
+    entries = [(doc_id, clause, 'custom') for doc_id, clause in SAMPLE_CLAUSES.items()]
+    assert index.sync(entries) == 2
+    assert index.sync(entries) == 0
+
+    edited = dict(SAMPLE_CLAUSES['insurance'], content='Owner provides protection and indemnity cover.')
+    assert index.sync([entries[0], ('insurance', edited, 'custom')]) == 1
+    assert set(index.match('indemnity')) == {'insurance'}
+
+    assert index.sync(entries[:1]) == 1
+    assert len(index) == 1
+
+
+def test_bm25f_ranking():
+    """Test that BM25F favours name hits, ignores stopwords and keeps statistics current"""
+    from clause_search import BM25FScorer, ClauseIndex
+
+    index = ClauseIndex()
+    for doc_id, clause in SAMPLE_CLAUSES.items():
+        index.add(doc_id, clause)
+    index.add('mention', {'name': 'Owner Obligations', 'content': 'See the insurance clause.', 'category': 'Liability'})
+    scorer = BM25FScorer()
+
+    ranked = sorted(scorer.search([index], 'insurance'), reverse=True)
+    assert [doc_id for _, doc_id, _, _ in ranked] == ['insurance', 'mention']
+    assert all(0 < relevance <= 100 for relevance, _, _, _ in ranked)
+
+    # Stopwords do not widen the result set
+    assert {doc_id for _, doc_id, _, _ in scorer.search([index], 'the insurance of a vessel')} == {'insurance', 'mention'}
+
+    # Statistics are pooled across layers and follow removals
+    overlay = ClauseIndex()
+    overlay.add('custom', dict(SAMPLE_CLAUSES['payment'], name='Custom Insurance Deposit'))
+    assert 'custom' in {doc_id for _, doc_id, _, _ in scorer.search([index, overlay], 'insurance')}
+    content_total = index.field_length_totals['content']
+    index.remove('mention')
+    assert index.field_length_totals['content'] == content_total - 4
+    print(f"  Ranked: {[(doc_id, relevance) for relevance, doc_id, _, _ in ranked]}")
+
+
+def test_clause_catalog():
+    """Test that the built-in clause catalog is built once and is read-only"""
+    from enhanced_yacht_generator_v3_fixed import get_clause_catalog, get_clause_database
+
+    catalog = get_clause_database()
+    assert catalog is get_clause_catalog()
+    payment_terms = catalog['Payment Terms']
+    assert all(clause['category'] == 'Payment Terms' for clause in payment_terms)
+
+    for mutate in (lambda: catalog.__setitem__('Custom', []),
+                   lambda: payment_terms[0].__setitem__('content', ''),
+                   lambda: payment_terms.append(None)):
+        try:
+            mutate()
+            assert False, "clause catalog should be read-only"
+        except (TypeError, AttributeError):
+            pass
+
+
+def test_term_document_matrix():
+    """Test that batch scoring over the term-document matrix matches the BM25F scorer"""
+    from clause_search import BM25FScorer, ClauseIndex
+
+    index = ClauseIndex()
+    for doc_id, clause in SAMPLE_CLAUSES.items():
+        index.add(doc_id, clause)
+    scorer = BM25FScorer()
+    matrix = index.term_matrix(scorer)
+    assert index.term_matrix(scorer) is matrix
+
+    queries = ['insurance', 'pay deposit', 'the', 'helicopter']
+    scores = matrix.score_batch(queries)
+    assert scores.shape == (len(queries), len(index))
+    for query, row in zip(queries, scores):
+        expected = {doc_id: relevance for relevance, doc_id, _, _ in scorer.search([index], query)}
+        actual = {doc_id: float(row[column]) for column, doc_id in enumerate(matrix.doc_ids) if row[column] > 0}
+        assert actual == expected, query
+
+    assert [doc_id for _, doc_id in matrix.top_k(['hull insurance'], k=1)[0]] == ['insurance']
+
+    # The matrix follows index changes
+    index.remove('insurance')
+    assert index.term_matrix(scorer) is not matrix
+    assert index.term_matrix(scorer).shape[1] == 1
+
+
+def test_facet_bitmaps():
+    """Test that facet filters intersect bitmaps and counts ignore each facet's own filter"""
+    from clause_search import ClauseIndex
+
+    index = ClauseIndex()
+    index.add('payment', dict(SAMPLE_CLAUSES['payment'], jurisdiction=['EU', 'US'], risk_level='Low'))
+    index.add('insurance', dict(SAMPLE_CLAUSES['insurance'], jurisdiction=['EU'], risk_level='High', status='Beta'))
+    index.add('draft', {'name': 'Draft Clause', 'content': 'Owner insurance to be agreed.'})
+
+    all_docs = list(index.documents)
+    allowed, counts = index.facet_search(all_docs, {'jurisdiction': ['EU'], 'risk_level': ['High']})
+    assert allowed == {'insurance'}
+    assert counts['risk_level'] == {'Low': 1, 'High': 1, 'Medium': 0}  # EU applied, risk filter not
+    assert counts['jurisdiction'] == {'EU': 1, 'US': 0, 'International': 0}  # High applied
+    assert counts['status']['Active'] == 0 and counts['status']['Beta'] == 1
+
+    # Missing fields fall back to the facet defaults; removed slots are reused
+    assert index.facet_search(all_docs, {'status': ['Active'], 'complexity': ['Standard']})[0] == {'payment', 'draft'}
+    index.remove('payment')
+    assert 'US' not in index.facets['jurisdiction']
+    index.add('replacement', SAMPLE_CLAUSES['payment'])
+    assert index.slots['replacement'] == 0
+    assert index.facet_search(['replacement'], {'jurisdiction': ['International']})[0] == {'replacement'}
+
+
+def test_clause_library_search(monkeypatch, tmp_path):
+    """Test that library, custom and versioned clauses are all searchable"""
+    from enhanced_yacht_generator_v3_fixed import perform_clause_search
+
+    store = use_clause_store(monkeypatch, tmp_path / "clauses.db")
+    doc_id = store.save_custom(dict(SAMPLE_CLAUSES['insurance'], name='Custom Tender Insurance',
+                                    content='Tender and water toys are covered by the lessee.'))
+    results = perform_clause_search('tender')
+    assert [r['source'] for r in results if r['name'] == 'Custom Tender Insurance'] == ['custom']
+
+    results = perform_clause_search('payment schedule')
+    assert results and results[0]['source'] == 'library'
+    assert all(r['relevance'] > 0 for r in results)
+    assert perform_clause_search('payment schedule', scoring='legacy')[0]['relevance'] == 100
+
+    # Legacy scoring keeps substring matching for fragments and infixes the term index does not match
+    for fragment in ('ende', 'wa'):
+        assert 'Custom Tender Insurance' in [r['name'] for r in perform_clause_search(fragment, scoring='legacy')]
+    assert perform_clause_search('qqxz', scoring='legacy') == []
+
+    # Status and risk level filters are applied
+    assert perform_clause_search('tender', statuses=['Deprecated']) == []
+    assert [r['source'] for r in perform_clause_search('tender', risk_levels=['Medium'])] == ['custom']
+
+    store.delete(doc_id)
+    assert not any(r['source'] == 'custom' for r in perform_clause_search('tender'))
+
+
+def test_search_result_cache(monkeypatch, tmp_path):
+    """Test that equivalent searches are served from the shared cache until stored clauses change"""
+    import enhanced_yacht_generator_v3_fixed as app
+
+    store = use_clause_store(monkeypatch, tmp_path / "clauses.db")
+    cache = app.get_search_result_cache()
+    first = app.perform_clause_search('Payment Schedule', jurisdictions=['US', 'EU'])
+    hits = cache.stats()['hits']
+    second = app.perform_clause_search('schedule the payment', jurisdictions=['EU', 'US'])
+    assert cache.stats()['hits'] == hits + 1
+    assert [r['name'] for r in second] == [r['name'] for r in first]
+
+    # A new custom clause bumps the index generation, so the cached entry is not reused
+    store.save_custom(dict(SAMPLE_CLAUSES['payment'], name='Custom Payment Schedule', jurisdiction=['US']))
+    third = app.perform_clause_search('payment schedule', jurisdictions=['US', 'EU'])
+    assert cache.stats()['hits'] == hits + 1
+    assert 'Custom Payment Schedule' in [r['name'] for r in third]
+    print(f"  Search cache stats: {cache.stats()}")
+
+
+def test_search_hits(monkeypatch, tmp_path):
+    """Test that searches return lightweight hits that resolve into full records on demand"""
+    from clause_search import SearchHit
+    from enhanced_yacht_generator_v3_fixed import resolve_search_hits, search_clause_library
+
+    store = use_clause_store(monkeypatch, tmp_path / "clauses.db")
+    deposit_id = store.save_custom(dict(SAMPLE_CLAUSES['payment'], name='Custom Deposit'))
+    tender_id = store.save_custom(dict(SAMPLE_CLAUSES['insurance'], name='Custom Tender Insurance',
+                                       content='Tender and water toys are covered by the lessee.'))
+    hits = search_clause_library('tender')['results']
+    assert all(isinstance(hit, SearchHit) for hit in hits)
+    assert hits == sorted(hits, key=lambda hit: hit.relevance, reverse=True)
+
+    custom_hit = [hit for hit in hits if hit.source == 'custom'][0]
+    assert custom_hit.doc_id == tender_id == 'custom/Insurance Requirements/Custom Tender Insurance'
+    result = resolve_search_hits([custom_hit], 'tender')[0]
+    assert result['name'] == 'Custom Tender Insurance' and result['doc_id'] == custom_hit.doc_id
+    assert 'Tender' in result['snippet']
+
+    # Ids survive deletion of other custom clauses; removed clauses are skipped
+    store.delete(deposit_id)
+    assert resolve_search_hits([custom_hit], 'tender')[0]['name'] == 'Custom Tender Insurance'
+    store.delete(tender_id)
+    assert resolve_search_hits([custom_hit], 'tender') == []
+
+
+def test_top_hits_pagination():
+    """Test that heap-selected pages and cursors match slices of the fully sorted hits"""
+    from clause_search import SearchHit, top_hits
+    from enhanced_yacht_generator_v3_fixed import search_clause_library
+
+    hits = [SearchHit(f"doc/{i:03d}", float(i % 7), 'library') for i in range(100)]
+    ranked = sorted(hits, key=lambda hit: (-hit.relevance, hit.doc_id))
+
+    assert top_hits(hits, offset=20, limit=10)[0] == ranked[20:30]
+    assert top_hits(hits)[0] == ranked
+
+    # Walking the cursor visits every hit once, in rank order
+    pages, cursor = [], None
+    while True:
+        page, cursor = top_hits(hits, limit=30, cursor=cursor)
+        pages.extend(page)
+        if cursor is None:
+            break
+    assert pages == ranked
+
+    everything = search_clause_library('charter')
+    window = search_clause_library('charter', offset=5, limit=5)
+    assert window['total'] == everything['total'] and window['results'] == everything['results'][5:10]
+    after = search_clause_library('charter', limit=5, cursor=window['cursor'])
+    assert after['results'] == everything['results'][10:15]
+    print(f"  Pages of 5 over {everything['total']} hits")
+
+
+def test_typo_tolerance():
+    """Test that misspelled query terms expand to close indexed terms through the trigram index"""
+    from clause_search import BM25FScorer, ClauseIndex, edit_distance
+
+    assert edit_distance('majuere', 'majeure', 2) == 1  # adjacent swap
+    assert edit_distance('insurence', 'insurance', 2) == 1
+    assert edit_distance('deposit', 'vessel', 2) == 3  # capped at limit + 1
+
+    index = ClauseIndex()
+    for doc_id, clause in SAMPLE_CLAUSES.items():
+        index.add(doc_id, clause)
+    index.add('force', {'name': 'Force Majeure', 'content': 'Cancellation without penalty for force majeure events.'})
+
+    assert index.expand('majuere') == ['majeure']
+    assert index.expand('cancelation') == ['cancellation']
+    assert index.expand('insur') == ['insurance']  # prefixes still win over fuzzy matches
+    assert index.expand('hlu') == []  # too short to correct
+    assert set(index.match('insurence')) == {'insurance'}
+
+    # Both scoring paths return the same fuzzy matches
+    scorer = BM25FScorer()
+    expected = {doc_id: relevance for relevance, doc_id, _, _ in scorer.search([index], 'force majuere')}
+    assert set(expected) == {'force'}
+    assert {doc_id: relevance for relevance, doc_id, _, _ in index.term_matrix(scorer).search('force majuere')} == expected
+
+    # Removed terms leave the trigram index
+    index.remove('force')
+    assert index.expand('majuere') == []
+
+
+def test_phrase_and_near_queries():
+    """Test that quoted phrases and NEAR/n constraints use term positions and snippets use stored offsets"""
+    from clause_search import ClauseIndex, normalize_query, parse_query
+
+    plan = parse_query('"thirty (30) days" deposit NEAR/3 paid')
+    assert plan.phrases == (('thirty', '30', 'days'),)
+    assert plan.nears == (('deposit', 'paid', 3),)
+    assert normalize_query('"days thirty"') != normalize_query('"thirty days"') != normalize_query('thirty days')
+
+    index = ClauseIndex()
+    index.add('payment', dict(SAMPLE_CLAUSES['payment'],
+                              content='A deposit is paid on signing. The balance is due thirty (30) days before embarkation.'))
+    index.add('insurance', dict(SAMPLE_CLAUSES['insurance'], content='Claims are paid within days, thirty at most.'))
+
+    assert [doc_id for doc_id in index.documents if index.satisfies(doc_id, parse_query('"thirty (30) days"'))] == ['payment']
+    assert index.satisfies('payment', parse_query('paid NEAR/2 deposit'))
+    assert not index.satisfies('payment', parse_query('deposit NEAR/1 paid'))
+    assert index.satisfies('insurance', parse_query('"days thirty"'))  # punctuation between words is ignored
+
+    snippet = index.snippet('payment', '"thirty (30) days" balance', max_length=60)
+    assert 'thirty (30) days' in snippet and 'balance' in snippet and len(snippet) <= 60
+    assert index.snippet('payment', 'helicopter', max_length=20) == 'A deposit is paid on'
+
+
+def test_phrase_search():
+    """Test that phrase queries narrow clause library search results"""
+    from enhanced_yacht_generator_v3_fixed import perform_clause_search
+
+    loose = perform_clause_search('thirty days')
+    exact = perform_clause_search('"thirty (30) days"')
+    assert exact and len(exact) < len(loose)
+    assert all('thirty (30) days' in result['snippet'] for result in exact)
+
+
+def test_similarity_matrix():
+    """Test that TF-IDF cosine similarity ranks clauses and only recomputes changed clause vectors"""
+    from clause_search import ClauseIndex, tfidf_query
+
+    index = ClauseIndex()
+    for doc_id, clause in SAMPLE_CLAUSES.items():
+        index.add(doc_id, clause)
+    matrix = index.similarity_matrix()
+    assert matrix.recomputed == 2 and index.similarity_matrix() is matrix
+
+    query = tfidf_query('Insurance cover for the whole vessel', [matrix])
+    assert 'the' not in query and 'cover' not in query  # stopwords and unknown words are dropped
+    ranked = sorted(matrix.search(query), reverse=True)
+    assert [doc_id for _, doc_id, _, _ in ranked] == ['insurance']
+    assert 0 < ranked[0][0] <= 1
+
+    index.add('crew', {'name': 'Crew Insurance', 'content': 'The crew is insured by the owner.'})
+    updated = index.similarity_matrix()
+    assert updated.recomputed == 1
+    assert updated.vectors['payment'] is matrix.vectors['payment']
+
+
+def test_clause_suggestions():
+    """Test that suggestions are real clauses ranked by similarity to the scenario and parameters"""
+    from enhanced_yacht_generator_v3_fixed import build_suggestion_query, get_clause_database, suggest_clauses
+
+    scenario = build_suggestion_query("Guests want helicopter transfers between islands", "Luxury", 400000, 21,
+                                      ["Hurricane season"])
+    assert 'insurance' in scenario and 'extended voyages' in scenario and 'force majeure' in scenario
+
+    suggestions = suggest_clauses(scenario, top_k=3)
+    names = [s['clause'] for s in suggestions]
+    assert 'Helicopter and Transportation Services' in names and 'Comprehensive Hull Insurance' in names
+    assert [s['confidence'] for s in suggestions] == sorted((s['confidence'] for s in suggestions), reverse=True)
+    library_names = {clause['name'] for clauses in get_clause_database().values() for clause in clauses}
+    assert all(s['clause'] in library_names for s in suggestions)
+    assert 'helicopter' in suggestions[names.index('Helicopter and Transportation Services')]['reason']
+    assert suggest_clauses("") == []
+
+
+def use_clause_store(monkeypatch, path):
+    """Point the app at a fresh clause store seeded with the built-in catalog, with its own index and result cache"""
+    import enhanced_yacht_generator_v3_fixed as app
+    from clause_search import ClauseIndex
+    from clause_store import ClauseStore
+
+    store = ClauseStore(str(path))
+    store.seed(app._build_clause_catalog())
+    index = ClauseIndex()
+    cache = app.BoundedLRUCache(max_entries=256)
+    monkeypatch.setattr(app, 'get_clause_store', lambda: store)
+    monkeypatch.setattr(app, '_load_library_search_index', lambda: index)
+    monkeypatch.setattr(app, 'get_search_result_cache', lambda: cache)
+    return store
+
+
+def test_stored_clause_search(monkeypatch, tmp_path):
+    """Test that clauses saved to the clause store become searchable (ranked by BM25F or FTS5) and disappear on delete"""
+    from enhanced_yacht_generator_v3_fixed import clause_history_key, get_library_search_index, perform_clause_search
+
+    store = use_clause_store(monkeypatch, tmp_path / "clauses.db")
+    doc_id = store.save_custom(dict(SAMPLE_CLAUSES['insurance'], name='Stored Jet Ski Policy', category='Guest Services',
+                                    content='Jet skis are operated only by licensed guests.'))
+    for scoring in ('bm25f', 'fts5'):
+        results = perform_clause_search('jet skis', scoring=scoring)
+        assert [r['doc_id'] for r in results if r['source'] == 'custom'] == [doc_id]
+    assert get_library_search_index().revision == store.revision()
+
+    store.delete(doc_id)
+    assert doc_id not in [r['doc_id'] for r in perform_clause_search('jet skis', scoring='fts5')]
+    assert doc_id not in get_library_search_index()
+
+    # A version found by search keeps the history key of its library clause, not its display label
+    parent_key = 'Comprehensive Hull Insurance_Insurance Requirements'
+    store.add_version(parent_key, dict(SAMPLE_CLAUSES['insurance'], name='Comprehensive Hull Insurance',
+                                       original_name='Comprehensive Hull Insurance', category='Insurance Requirements',
+                                       content='Hull cover includes the jet skis and tenders.', version='v2.0'))
+    result = [r for r in perform_clause_search('jet skis') if r['source'] == 'version'][0]
+    assert result['name'] == 'Comprehensive Hull Insurance (v2.0)'
+    assert clause_history_key(result) == parent_key
+
+
+def test_near_duplicates(monkeypatch, tmp_path):
+    """Test MinHash/LSH near-duplicate detection in the index and across the stored library"""
+    from clause_search import ClauseIndex, shingle_similarity
+    from enhanced_yacht_generator_v3_fixed import (clause_identity, find_duplicate_clauses, find_similar_clauses,
+                                                   get_clause_catalog, perform_clause_search)
+
+    index = ClauseIndex()
+    for doc_id, clause in SAMPLE_CLAUSES.items():
+        index.add(doc_id, clause)
+    payment = SAMPLE_CLAUSES['payment']['content']
+    index.add('copy', dict(SAMPLE_CLAUSES['payment'], content=payment + ' By wire'))
+    assert [doc_id for _, doc_id in index.minhashes.similar(payment)][:2] in (['payment', 'copy'], ['copy', 'payment'])
+    assert [(first, second) for _, first, second in index.minhashes.duplicates()] == [('copy', 'payment')]
+    index.remove('copy')
+    assert index.minhashes.duplicates() == []
+    assert shingle_similarity(payment, payment) == 1.0
+    assert 0.8 <= shingle_similarity(payment, payment + ' By wire') < 1.0
+
+    store = use_clause_store(monkeypatch, tmp_path / "clauses.db")
+    library_clause = get_clause_catalog()['Payment Terms'][0]
+    clone_id = store.save_custom({'name': 'Cloned Payment Terms', 'category': 'Payment Terms',
+                                  'content': library_clause['content'] + ' Wire fees are borne by the charterer.'})
+    library_id = f"library/Payment Terms/{library_clause['name']}"
+    similar = find_similar_clauses(library_clause['content'] + ' Wire fees apply.')
+    assert {doc_id for _, doc_id, _, _ in similar} >= {clone_id, library_id}
+    similar = find_similar_clauses(library_clause['content'], same_clause=(library_clause['name'], 'Payment Terms'))
+    assert [doc_id for _, doc_id, _, _ in similar] == [clone_id]
+    assert [duplicate for _, _, duplicate in find_duplicate_clauses()] == [clone_id]
+
+    store.delete(clone_id)
+    assert find_duplicate_clauses() == []
+
+    # Editing a version opened from search skips the library original and its versions, despite the display label
+    parent_key = f"{library_clause['name']}_Payment Terms"
+    store.add_version(parent_key, dict(library_clause, original_name=library_clause['name'], category='Payment Terms',
+                                       content=library_clause['content'] + ' Invoices are issued in euros.', version='v2.0'))
+    result = [r for r in perform_clause_search('invoices euros') if r['source'] == 'version'][0]
+    assert result['name'] == f"{library_clause['name']} (v2.0)"
+    similar = find_similar_clauses(result['content'], same_clause=clause_identity(result))
+    assert [doc_id for _, doc_id, _, _ in similar] == []
+    similar = find_similar_clauses(result['content'], same_clause=(result['name'], result['category']))
+    assert library_id in [doc_id for _, doc_id, _, _ in similar]
+
+
+if __name__ == "__main__":
+    print("🔍 Testing Clause Search")
+    print("=" * 60)
+
+    test_inverted_index()
+    test_index_sync()
+    test_bm25f_ranking()
+    test_clause_catalog()
+    test_term_document_matrix()
+    test_facet_bitmaps()
+    test_top_hits_pagination()
+    test_typo_tolerance()
+    test_phrase_and_near_queries()
+    test_phrase_search()
+    test_similarity_matrix()
+    test_clause_suggestions()
+
+    import pathlib
+    import tempfile
+    import pytest
+
+    for test in (test_clause_library_search, test_search_result_cache, test_search_hits,
+                 test_stored_clause_search, test_near_duplicates):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test(monkeypatch, pathlib.Path(tempfile.mkdtemp()))
+
+    print("\n" + "=" * 60)
+    print("✅ All clause search tests passed!")
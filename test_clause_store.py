@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the persistent SQLite clause store
+"""
+
+SAMPLE_CATALOG = {
+    'Payment Terms': [
+        {'name': 'Standard Payment Schedule', 'content': 'A deposit of fifty percent is due on signing; the balance thirty days before embarkation.',
+         'jurisdiction': ['International', 'EU'], 'status': 'Active', 'risk_level': 'Low', 'legal_notes': 'Common schedule'},
+    ],
+    'Insurance Requirements': [
+        {'name': 'Hull Insurance', 'content': 'The owner maintains hull and machinery insurance for the charter period.',
+         'jurisdiction': ['International'], 'status': 'Active', 'risk_level': 'High', 'legal_notes': ''},
+    ],
+}
+
+
+def test_store_seed_and_filters(tmp_path):
+    """Test that the catalog is seeded once, in WAL mode, and filters use the indexed columns"""
+    from clause_store import ClauseStore
+
+    store = ClauseStore(str(tmp_path / "clauses.db"))
+    assert store.seed(SAMPLE_CATALOG) == 2
+    assert store.seed(SAMPLE_CATALOG) == 0
+    revision = store.revision()
+
+    with store.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+    catalog = store.catalog()
+    assert [clause['name'] for clause in catalog['Payment Terms']] == ['Standard Payment Schedule']
+    assert catalog['Payment Terms'][0]['category'] == 'Payment Terms'
+    assert [doc_id for doc_id, _, _ in store.clauses(jurisdiction='EU')] == ['library/Payment Terms/Standard Payment Schedule']
+    assert [doc_id for doc_id, _, _ in store.clauses(risk_level='High')] == ['library/Insurance Requirements/Hull Insurance']
+    assert store.clauses(category='Payment Terms', source='custom') == []
+
+    changed = dict(SAMPLE_CATALOG, **{'Payment Terms': []})
+    assert store.seed(changed) == 1
+    assert store.revision() == revision + 1
+    print(f"  Store stats: {store.stats()}")
+
+
+def test_store_changes_and_persistence(tmp_path):
+    """Test that writes are reported as change sets and survive reopening the store"""
+    from clause_store import ClauseStore
+
+    path = str(tmp_path / "clauses.db")
+    store = ClauseStore(path)
+    store.seed(SAMPLE_CATALOG)
+    revision, written, removed = store.changes()
+    assert len(written) == 2 and removed == []
+
+    custom = {'name': 'Drone Policy', 'category': 'Guest Services', 'content': 'Guests may fly drones only with captain approval.'}
+    doc_id = store.save_custom(custom)
+    other_id = store.save_custom(dict(custom, name='Camera Policy'))
+    # Creating or renaming onto a name already used in the category never overwrites the other clause
+    for clause, previous_doc_id in ((dict(custom, content='Overwrite'), None), (dict(custom, name='Camera Policy'), doc_id)):
+        try:
+            store.save_custom(clause, previous_doc_id)
+            assert False, "name collision should be rejected"
+        except ValueError as e:
+            assert 'already exists' in str(e)
+    assert store.get(doc_id)['content'] == custom['content']
+
+    # Custom clauses cannot take the name of a library clause in their category, singly or in a batch
+    library_name = dict(custom, name='Hull Insurance', category='Insurance Requirements')
+    for save in (lambda: store.save_custom(library_name),
+                 lambda: store.save_custom_batch([dict(custom, name='Boat Policy'), library_name])):
+        try:
+            save()
+            assert False, "library name collision should be rejected"
+        except ValueError as e:
+            assert 'library clause' in str(e)
+    assert store.get('custom/Guest Services/Boat Policy') is None
+    assert store.library_collisions([library_name, custom]) == {'library/Insurance Requirements/Hull Insurance'}
+    assert store.delete(other_id)
+    renamed_id = store.save_custom(dict(custom, name='Drone and Camera Policy'), previous_doc_id=doc_id)
+    version_id = store.add_version('Hull Insurance_Insurance Requirements', dict(SAMPLE_CATALOG['Insurance Requirements'][0],
+                                                                                   version='v2.0', status='Modified'))
+    assert store.version_count('Hull Insurance_Insurance Requirements') == 1
+
+    new_revision, written, removed = store.changes(revision)
+    assert sorted(doc_id for doc_id, _, _ in written) == sorted([renamed_id, version_id])
+    assert sorted(removed) == sorted([doc_id, other_id])
+    assert store.changes(new_revision)[1:] == ([], [])
+    store.close()
+
+    reopened = ClauseStore(path)
+    assert reopened.get(renamed_id)['content'] == custom['content']
+    assert reopened.get(doc_id) is None
+    assert reopened.revision() == new_revision
+    assert reopened.delete(renamed_id)
+    assert not reopened.delete(renamed_id)
+    reopened.close()
+
+
+def test_store_full_text_search(tmp_path):
+    """Test FTS5 search with prefix terms, phrases and NEAR constraints"""
+    from clause_store import ClauseStore, fts_query
+
+    store = ClauseStore(str(tmp_path / "clauses.db"))
+    store.seed(SAMPLE_CATALOG)
+
+    assert fts_query('deposit NEAR/5 balance') == '("deposit"* OR "balance"*) AND NEAR("deposit" "balance", 5)'
+    results = store.search('insur')
+    assert [doc_id for _, doc_id, _, _ in results] == ['library/Insurance Requirements/Hull Insurance']
+    assert results[0][0] == 100.0
+
+    assert [doc_id for _, doc_id, _, _ in store.search('"thirty days before"')] == ['library/Payment Terms/Standard Payment Schedule']
+    assert store.search('"days thirty before"') == []
+    assert store.search('deposit NEAR/3 balance') == []
+    assert len(store.search('deposit NEAR/12 balance')) == 1
+    assert store.search('') == []
+
+    custom = {'name': 'Deposit Refund', 'category': 'Payment Terms', 'content': 'The security deposit is refunded after inspection.'}
+    store.save_custom(custom)
+    names = [clause['name'] for _, _, clause, _ in store.search('deposit')]
+    assert names == ['Deposit Refund', 'Standard Payment Schedule']  # name matches weigh more
+
+
+def test_version_history(monkeypatch, tmp_path):
+    """Test that versions are stored as snapshots plus deltas, rebuilt exactly and diffed by word"""
+    import clause_store
+    from clause_store import SNAPSHOT_INTERVAL, ClauseStore, apply_delta, text_delta
+
+    old = 'Payment of 50% is due on signing.\nBalance due 30 days prior.'
+    new = 'Payment of 40% is due on signing.\nBalance due 45 days prior, by wire.'
+    assert apply_delta(old, text_delta(old, new)) == new
+
+    store = ClauseStore(str(tmp_path / "clauses.db"))
+    store.seed(SAMPLE_CATALOG)
+    parent_key = 'Standard Payment Schedule_Payment Terms'
+    base = SAMPLE_CATALOG['Payment Terms'][0]
+    contents = []
+    for position in range(20):
+        content = base['content'] + ''.join(f' Amendment {i} applies.' for i in range(position + 1))
+        contents.append(content)
+        doc_id = store.add_version(parent_key, dict(base, content=content, version=f"v{position + 2}.0", status='Modified'))
+
+    # Only the latest version is a live clause; the history holds all of them
+    assert [entry[0] for entry in store.clauses(source='version')] == [doc_id]
+    assert store.version_count(parent_key) == 20
+    assert [version for _, version, _ in store.history(parent_key)][:2] == ['v2.0', 'v3.0']
+
+    rebuilt = store.versions(parent_key, range(20))
+    assert [rebuilt[position]['content'] for position in range(20)] == contents
+    assert store.version(parent_key, 7)['version'] == 'v9.0'
+
+    with store.connection() as conn:
+        rows = conn.execute("SELECT position, base_position, content FROM clause_history ORDER BY position").fetchall()
+    snapshots = [row['position'] for row in rows if row['content'] is not None]
+    assert snapshots == list(range(0, 20, SNAPSHOT_INTERVAL))
+    assert all(row['position'] - row['base_position'] < SNAPSHOT_INTERVAL for row in rows)
+
+    changes = store.diff(parent_key, 3, 5)
+    assert [(tag, new_text) for tag, _, new_text in changes if tag != 'equal'] == [('insert', ' Amendment 4 applies. Amendment 5 applies.')]
+
+    # Each endpoint is rebuilt from its own snapshot, so distant versions cost no more deltas than close ones
+    applied = []
+    monkeypatch.setattr(clause_store, 'apply_delta', lambda text, delta: applied.append(delta) or apply_delta(text, delta))
+    changes = store.diff(parent_key, 1, 19)
+    assert len(applied) <= 2 * (SNAPSHOT_INTERVAL - 1)
+    assert ''.join(new_text for tag, _, new_text in changes if tag != 'delete') == contents[19]
+    print(f"  Snapshots at positions {snapshots} of {len(rows)} versions")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing Clause Store")
+    print("=" * 60)
+
+    import pathlib
+    import tempfile
+    import pytest
+
+    test_store_seed_and_filters(pathlib.Path(tempfile.mkdtemp()))
+    test_store_changes_and_persistence(pathlib.Path(tempfile.mkdtemp()))
+    test_store_full_text_search(pathlib.Path(tempfile.mkdtemp()))
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_version_history(monkeypatch, pathlib.Path(tempfile.mkdtemp()))
+
+    print("\n" + "=" * 60)
+    print("✅ All clause store tests passed!")
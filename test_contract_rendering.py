@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Test script to verify contract template rendering and caching
+"""
+
+import datetime
+
+SAMPLE_CONTRACT_DATA = {
+    'vessel_name': 'M/Y Excellence',
+    'contract_id': 'TEST0001',
+    'version_number': '1.0',
+    'agreement_date': '01 August 2025',
+    'template_name': 'Enhanced Standard',
+    'contract_language': 'English',
+    'lessor_name': 'Monaco Elite Charters Ltd.',
+    'lessee_name': 'Mr. & Mrs. Richardson',
+    'additional_clauses': [],
+    'services_clauses': [],
+    'suggested_clauses': {},
+}
+
+
+def test_template_cache():
+    """Test that the shared template environment compiles the contract template only once"""
+    from concurrent.futures import ThreadPoolExecutor
+    from jinja2 import DictLoader
+    from contract_templates import ContractTemplateEnvironment
+    from enhanced_yacht_generator_v3_fixed import get_contract_template, get_template_cache_stats
+
+    print("🧪 Testing Template Cache")
+    print("=" * 50)
+
+    first = get_contract_template()
+    stats_after_first = get_template_cache_stats()
+
+    second = get_contract_template()
+    stats_after_second = get_template_cache_stats()
+
+    assert first is second
+    assert stats_after_second['misses'] == stats_after_first['misses']
+    assert stats_after_second['hits'] == stats_after_first['hits'] + 1
+
+    html = second.render(**SAMPLE_CONTRACT_DATA)
+    assert 'M/Y Excellence' in html
+    assert 'TEST0001' in html
+
+    # Concurrent lookups are each counted exactly once, as a hit or as a compile
+    env = ContractTemplateEnvironment(loader=DictLoader({'a': '{{ x }}', 'b': '{{ y }}'}))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: env.get_template('ab'[i % 2]), range(400)))
+    assert env.cache_stats['hits'] + env.cache_stats['misses'] == 400
+    assert env.cache_stats['misses'] >= 2
+
+    print(f"  Cache stats: {get_template_cache_stats()}")
+    print("✅ Template cache tests completed!")
+
+
+
+def make_contract_data(**overrides):
+    """Build full contract data from the bulk generator defaults"""
+    from bulk_contract_generator import parse_booking_row
+    from enhanced_yacht_generator_v3_fixed import build_contract_data
+
+    inputs, selected_clauses = parse_booking_row({'contract_id': 'TEST0002', **overrides})
+    return build_contract_data(inputs, selected_clauses=selected_clauses)
+
+
+def test_booking_row_parsing():
+    """Test that bulk booking rows are converted to typed contract inputs"""
+    from bulk_contract_generator import DEFAULT_CONTRACT_INPUTS, parse_booking_row
+
+    inputs, selected_clauses = parse_booking_row({
+        'vessel_name': 'M/Y Aurora', 'beam': '9.25', 'daily_rate': '18000.0', 'start_date': '2025-08-01',
+        'risk_factors': 'Night navigation; Remote waters', 'force_majeure': 'no', 'currency': '',
+        'selected_clauses': '[{"name": "Fuel Surcharge"}]'})
+    assert (inputs['vessel_name'], inputs['beam'], inputs['daily_rate']) == ('M/Y Aurora', 9.25, 18000)
+    assert inputs['start_date'] == inputs['end_date'] == datetime.date(2025, 8, 1)
+    assert inputs['risk_factors'] == ['Night navigation', 'Remote waters']
+    assert inputs['force_majeure'] is False
+    assert inputs['currency'] == DEFAULT_CONTRACT_INPUTS['currency']
+    assert selected_clauses == [{'name': 'Fuel Surcharge'}]
+
+
+def test_bulk_generation(tmp_path):
+    """Test that bulk runs over CSV and JSONL record bad rows as failures and keep the rest"""
+    from bulk_contract_generator import generate_bulk_contracts
+
+    csv_path = tmp_path / "bookings.csv"
+    csv_path.write_text("vessel_name,contract_id,daily_rate\nM/Y Aurora,BULK0001,18000\nM/Y Broken,BULK0002,lots\n",
+                        encoding='utf-8')
+    jsonl_path = tmp_path / "bookings.jsonl"
+    jsonl_path.write_text('{"vessel_name": "M/Y Nova", "contract_id": "BULK0003"}\n{"vessel_name": \n', encoding='utf-8')
+
+    for path, generated_id, failed_row in ((csv_path, 'BULK0001', 2), (jsonl_path, 'BULK0003', 2)):
+        summary = generate_bulk_contracts(str(path), str(tmp_path / "out"), workers=1)
+        assert (summary['total_rows'], summary['generated'], summary['failed']) == (2, 1, 1)
+        assert [failure['row'] for failure in summary['failures']] == [failed_row]
+        assert (tmp_path / "out" / f"yacht_contract_{generated_id}.pdf").exists()
+        print(f"  {path.name}: {summary['generated']} generated, failure: {summary['failures'][0]['error']}")
+
+
+def test_section_rendering():
+    """Test that section rendering matches a full render and only re-renders changed sections"""
+    from enhanced_yacht_generator_v3_fixed import get_contract_template, render_contract_sections
+
+    contract_data = make_contract_data(contract_id='SECT0001', special_requests='Private chef')
+    assert render_contract_sections(contract_data) == get_contract_template().render(**contract_data)
+
+    edited = dict(contract_data, special_requests='Private chef\nExtra tenders')
+    rendered_sections = []
+    html = render_contract_sections(edited, rendered_sections)
+
+    assert html == get_contract_template().render(**edited)
+    assert rendered_sections == ['charter_terms']
+    print(f"  Re-rendered sections after edit: {rendered_sections}")
+
+
+def test_streaming_render():
+    """Test that streamed HTML matches a normal render and reports peak memory"""
+    import io
+    import tracemalloc
+    from enhanced_yacht_generator_v3_fixed import get_contract_template, stream_contract_html
+
+    clauses = [{'name': f'Clause {i}', 'content': 'Charter terms apply. ' * 20, 'category': 'Payment Terms'}
+               for i in range(300)]
+    contract_data = make_contract_data(selected_clauses=clauses)
+    expected = get_contract_template().render(**contract_data)
+
+    text_sink = io.StringIO()
+    stats = stream_contract_html(contract_data, text_sink, buffer_size=4096, track_memory=True)
+    assert text_sink.getvalue() == expected
+    assert stats['writes'] > 1
+    assert stats['peak_memory_bytes'] > 0
+
+    # Memory tracking is opt-in, so a plain render leaves tracemalloc off
+    binary_sink = io.BytesIO()
+    assert stream_contract_html(contract_data, binary_sink)['peak_memory_bytes'] is None
+    assert not tracemalloc.is_tracing()
+    assert binary_sink.getvalue().decode('utf-8') == expected
+    print(f"  Streaming stats: {stats}")
+
+
+def test_lru_cache_eviction():
+    """Test that the bounded LRU cache evicts least recently used entries by size"""
+    from enhanced_yacht_generator_v3_fixed import BoundedLRUCache
+
+    cache = BoundedLRUCache(max_entries=10, max_bytes=10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    assert cache.get('a') == b'12345'  # 'a' is now most recently used
+    cache.put('c', b'12345')
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.stats()['evictions'] == 1
+    print(f"  LRU stats: {cache.stats()}")
+
+
+def test_pdf_style_registry():
+    """Test that PDF styles are built once per process and are read-only"""
+    from enhanced_yacht_generator_v3_fixed import get_pdf_style_registry
+
+    registry = get_pdf_style_registry()
+    assert get_pdf_style_registry() is registry
+    assert registry['paragraph']['services_normal'] is get_pdf_style_registry()['paragraph']['services_normal']
+
+    try:
+        registry['table']['vessel'] = None
+        assert False, "style registry should be read-only"
+    except TypeError:
+        pass
+
+
+def test_pdf_bytes_in_memory(tmp_path):
+    """Test that PDFs can be generated without touching disk, with an optional file sink"""
+    from enhanced_yacht_generator_v3_fixed import generate_pdf_bytes, get_contract_template
+
+    contract_data = make_contract_data()
+    contract_html = get_contract_template().render(**contract_data)
+
+    pdf_view = generate_pdf_bytes(contract_html, contract_data, as_memoryview=True)
+    assert isinstance(pdf_view, memoryview)
+    assert bytes(pdf_view[:4]) == b'%PDF'
+
+    sink = tmp_path / "contract.pdf"
+    pdf_bytes = generate_pdf_bytes(contract_html, contract_data, filename=str(sink))
+    assert sink.read_bytes() == pdf_bytes
+
+
+def test_pdf_cache():
+    """Test that an unchanged contract is served from the PDF cache instead of being rendered again"""
+    import time
+    from enhanced_yacht_generator_v3_fixed import BoundedLRUCache, PDFRenderService, get_contract_template
+
+    cache = BoundedLRUCache()
+    service = PDFRenderService(max_workers=1, cache=cache)
+    contract_data = make_contract_data()
+    contract_html = get_contract_template().render(**contract_data)
+
+    first_key = service.submit(contract_html, contract_data)
+    deadline = time.time() + 30
+    while service.status(first_key) != 'ready' and time.time() < deadline:
+        time.sleep(0.05)
+    first = service.result(first_key)
+    hits_before = cache.stats()['hits']
+
+    # Same contract data in a new dict: no new job, the cached bytes are returned
+    assert service.submit(contract_html, dict(contract_data)) == first_key
+    assert service.stats()['pending'] == 0
+    second = service.result(first_key)
+    assert first.startswith(b'%PDF')
+    assert second is first
+    assert cache.stats()['hits'] == hits_before + 1
+
+    changed_key = service.submit(contract_html, make_contract_data(vessel_name='M/Y Changed'))
+    assert changed_key != first_key
+    assert service.status(changed_key) in ('pending', 'ready')
+    print(f"  PDF cache stats: {cache.stats()}")
+
+
+def test_contract_preview_cache():
+    """Test that preview artifacts are encoded once per contract and large contracts load lazily"""
+    from enhanced_yacht_generator_v3_fixed import (PREVIEW_LAZY_THRESHOLD_BYTES, build_lightbox_html,
+                                                   get_contract_preview, get_contract_template)
+
+    contract_data = make_contract_data(contract_id='PREV/0001')
+    contract_html = get_contract_template().render(**contract_data)
+
+    preview = get_contract_preview(contract_html, contract_data)
+    assert get_contract_preview(contract_html, dict(contract_data)) is preview
+    assert not preview['lazy']
+    assert preview['element_id'] == 'PREV-0001'
+
+    lightbox_html = build_lightbox_html(preview)
+    assert preview['data_uri'] in lightbox_html
+    assert 'checked />' not in lightbox_html
+    assert 'checked />' in build_lightbox_html(preview, open_on_load=True)
+
+    clauses = [{'name': f'Clause {i}', 'content': 'Charter terms apply. ' * 50, 'category': 'Payment Terms'}
+               for i in range(400)]
+    large_data = make_contract_data(contract_id='PREV0002', selected_clauses=clauses)
+    large_html = get_contract_template().render(**large_data)
+    assert len(large_html.encode('utf-8')) > PREVIEW_LAZY_THRESHOLD_BYTES
+    assert get_contract_preview(large_html, large_data)['lazy']
+
+
+def test_background_pdf_render():
+    """Test that background renders report pending/ready state and apply backpressure"""
+    import time
+    from enhanced_yacht_generator_v3_fixed import BoundedLRUCache, PDFRenderService, get_contract_template
+
+    service = PDFRenderService(max_workers=1, max_pending=1, cache=BoundedLRUCache())
+    first_data = make_contract_data(contract_id='BG000001')
+    second_data = make_contract_data(contract_id='BG000002')
+    contract_html = get_contract_template().render(**first_data)
+
+    first_key = service.submit(contract_html, first_data)
+    second_key = service.submit(contract_html, second_data)
+    assert service.status(first_key) in ('pending', 'ready')
+    assert service.status(second_key) == 'busy'
+
+    deadline = time.time() + 30
+    while service.status(first_key) != 'ready' and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert service.status(first_key) == 'ready'
+    assert service.result(first_key).startswith(b'%PDF')
+    print(f"  Render service stats: {service.stats()}")
+
+    # PDFs that do not fit the cache fail instead of being re-rendered forever; failures are bounded
+    tiny = PDFRenderService(max_workers=1, max_errors=1, cache=BoundedLRUCache(max_bytes=10))
+    keys = [tiny.submit(contract_html, data) for data in (first_data, second_data)]
+    deadline = time.time() + 30
+    while tiny.stats()['pending'] and time.time() < deadline:
+        time.sleep(0.05)
+    # Both stay failed (and are not resubmitted) even though only the latest error message is kept
+    assert [tiny.status(key) for key in keys] == ['failed', 'failed']
+    assert tiny.submit(contract_html, first_data) == keys[0] and tiny.stats() == {'pending': 0, 'failed': 2, 'max_pending': 8}
+    assert 'cache budget' in tiny.error(keys[1])
+    assert tiny.error(keys[0]) == "error details are no longer available"
+
+    tiny.retry(keys[0])
+    assert tiny.status(keys[0]) == 'busy' and tiny.error(keys[0]) is None
+
+
+if __name__ == "__main__":
+    print("🔍 Testing Contract Rendering")
+    print("=" * 60)
+
+    import pathlib
+    import tempfile
+
+    test_template_cache()
+    test_booking_row_parsing()
+    test_bulk_generation(pathlib.Path(tempfile.mkdtemp()))
+    test_section_rendering()
+    test_streaming_render()
+    test_lru_cache_eviction()
+    test_pdf_style_registry()
+    test_pdf_bytes_in_memory(pathlib.Path(tempfile.mkdtemp()))
+    test_pdf_cache()
+    test_contract_preview_cache()
+    test_background_pdf_render()
+
+    print("\n" + "=" * 60)
+    print("✅ All contract rendering tests passed!")